@@ -1,19 +1,46 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context
 import os
+import io
+import json
 import time
 import threading
-from ocr_service import extract_text_from_file
-from text_utils import clean_text, correct_spelling
-from pdf_parser import parse_exam_file
-from scoring import SemanticScorer
-from question_paper import parse_question_paper_file
+import uuid
+from collections import OrderedDict
+import low_memory
+import metrics
+import events
+import pipeline
+import result_store
+import uploads
 
 app = Flask(__name__)
+# Uploads stream straight to uniquely named files (see uploads.py)
+app.request_class = uploads.UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = uploads.MAX_CONTENT_LENGTH
 
-UPLOAD_FOLDER = "uploads"
+UPLOAD_FOLDER = uploads.UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+uploads.sweep_stale(UPLOAD_FOLDER)
 
-scorer = SemanticScorer()
+# Number of worker processes used to score questions in parallel (1 = serial)
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", "1"))
+
+# Created (and the sentence model loaded) by the first request that scores;
+# serve.py creates it in the master before forking
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer():
+    global _scorer
+    with _scorer_lock:
+        if _scorer is None:
+            from scoring import SemanticScorer
+            _scorer = SemanticScorer()
+    return _scorer
+
+# Completed evaluations survive restarts and are looked up by job/student/exam
+store = result_store.ResultStore()
 
 # --- Global State ---
 # Using globals for simplicity (single-user app).
@@ -31,6 +58,17 @@ latest_result = {
     "error": None
 }
 
+# Timing profiles of recent jobs (job_id -> metrics.JobProfile), oldest evicted first
+MAX_JOB_PROFILES = 50
+job_profiles = OrderedDict()
+
+# Progress event logs of recent jobs (job_id -> events.JobEvents), same eviction
+job_events = OrderedDict()
+
+# SSE keep-alive interval and the longest a long-poll request is held open (seconds)
+SSE_HEARTBEAT_SECONDS = 15
+LONG_POLL_MAX_SECONDS = 30
+
 
 def update_progress(step, message):
     """Update the global progress state."""
@@ -38,6 +76,7 @@ def update_progress(step, message):
     progress["step"] = step
     progress["message"] = message
     progress["status"] = "processing"
+    events.emit("stage", step=step, total_steps=progress["total_steps"], message=message)
     print(f"[Progress {step}/{progress['total_steps']}] {message}")
 
 
@@ -52,6 +91,74 @@ def get_progress():
     return jsonify(progress)
 
 
+@app.route("/jobs/<job_id>/profile")
+def job_profile(job_id):
+    """Per-stage / per-page / per-question timings of one evaluation as JSON."""
+    profile = job_profiles.get(job_id)
+    if profile is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(profile.to_dict())
+
+
+def _job_events(job_id):
+    """The job's event log: the live one if this process runs the job, else its shared log (serve.py)."""
+    return job_events.get(job_id) or events.open_log(job_id)
+
+
+@app.route("/jobs/<job_id>/events")
+def job_event_stream(job_id):
+    """
+    Server-Sent Events stream of one job's progress (stage / page / question /
+    done / failed). Reconnecting clients send Last-Event-ID and resume after it.
+    """
+    job = _job_events(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    last_id = request.headers.get("Last-Event-ID", request.args.get("after", "0"))
+    last_id = int(last_id) if str(last_id).isdigit() else 0
+
+    def stream():
+        after = last_id
+        yield "retry: 2000\n\n"
+        while True:
+            batch, finished = job.wait(after, SSE_HEARTBEAT_SECONDS)
+            if not batch and not finished:
+                yield ": keep-alive\n\n"
+                continue
+            for event in batch:
+                after = event["id"]
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+            if finished and after >= job.last_id:
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/jobs/<job_id>/events/poll")
+def job_event_poll(job_id):
+    """Long-poll fallback: waits up to `timeout` seconds for events after `after`."""
+    job = _job_events(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    after = request.args.get("after", 0, type=int)
+    timeout = min(request.args.get("timeout", 25, type=float), LONG_POLL_MAX_SECONDS)
+    batch, finished = job.wait(after, timeout)
+    return jsonify({"events": batch, "finished": finished, "last_id": job.last_id})
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Cumulative pipeline metrics in Prometheus text format."""
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit_mb = uploads.MAX_UPLOAD_BYTES // (1024 * 1024)
+    return jsonify({"error": f"Upload too large. Each file must be under {limit_mb} MB."}), 413
+
+
 @app.route("/results")
 def results():
     """Renders the result page. Called by the client after processing is done."""
@@ -61,16 +168,115 @@ def results():
     
     if latest_result["exam_data"]:
         return render_template("result.html", exam_data=latest_result["exam_data"])
+
+    # After a restart: show the most recent stored evaluation
+    job_id = store.latest_job_id()
+    if job_id:
+        return render_template("result.html", exam_data=store.get_result(job_id))
     
     return "No results available. Please submit an evaluation first.", 400
 
 
+@app.route("/results/<job_id>")
+def stored_result(job_id):
+    """Renders a stored evaluation without re-running the pipeline."""
+    job = store.get_job(job_id)
+    if job is None:
+        return "Unknown job.", 404
+    if job["status"] == "error":
+        return job["error"] or "Evaluation failed.", 400
+    exam_data = store.get_result(job_id)
+    if exam_data is None:
+        return "Evaluation still in progress.", 409
+    return render_template("result.html", exam_data=exam_data)
+
+
+def _job_filters():
+    return {
+        "student_id": request.args.get("student_id"),
+        "exam_id": request.args.get("exam_id"),
+        "model_hash": request.args.get("model_hash"),
+        "status": request.args.get("status"),
+        "limit": min(request.args.get("limit", 100, type=int), 10000),
+    }
+
+
+@app.route("/api/jobs")
+def list_stored_jobs():
+    """Stored jobs, newest first. Filters: student_id, exam_id, model_hash, status, limit."""
+    return jsonify(store.list_jobs(**_job_filters()))
+
+
+@app.route("/api/jobs/<job_id>")
+def stored_job(job_id):
+    """One stored job with its result; ?include=pages,segments adds OCR text / parsed answers."""
+    job = store.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job["result"] = store.get_result(job_id)
+    include = request.args.get("include", "").split(",")
+    if "pages" in include:
+        job["pages"] = store.pages(job_id)
+    if "segments" in include:
+        job["segments"] = {doc: store.segments(job_id, doc) for doc in ("student", "model")}
+    return jsonify(job)
+
+
+@app.route("/results/export.csv")
+def export_results():
+    """CSV of stored jobs (same filters as /api/jobs), one row per job, one column per question."""
+    out = io.StringIO()
+    store.export_csv(out, store.list_jobs(**_job_filters()))
+    return Response(out.getvalue(), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=results.csv"})
+
+
+@app.route("/jobs/<job_id>/regrade", methods=["POST"])
+def regrade(job_id):
+    """
+    Re-scores a stored job from its saved segments and schema (no OCR), e.g.
+    after a scoring change. The new result is stored as a new job.
+    """
+    job = store.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    student_segments = store.segments(job_id, "student")
+    model_segments = store.segments(job_id, "model")
+    if not model_segments:
+        return jsonify({"error": "No stored segments for this job"}), 409
+
+    new_id = uuid.uuid4().hex
+    store.start_job(new_id, student_id=job["student_id"], exam_id=job["exam_id"], model_hash=job["model_hash"],
+                    student_hash=job["student_hash"], question_hash=job["question_hash"], regrade_of=job_id)
+    try:
+        q_schema = store.get_schema(job_id)
+        ocr_noise = store.segment_noise(job_id, "student")
+        store.save_documents(new_id, segments={"student": student_segments, "model": model_segments},
+                             ocr_noise={"student": ocr_noise})
+        key = result_store.exam_id_for(job["model_hash"], job["question_hash"]) if job["model_hash"] else None
+        scorer = get_scorer()
+        reference = pipeline.stored_reference(scorer, model_segments, q_schema, key)
+        exam_results = pipeline.score_student(scorer, student_segments, reference, workers=SCORING_WORKERS,
+                                              ocr_noise=ocr_noise or None)
+        store.finish_job(new_id, exam_results, q_schema)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        error = f"An error occurred during re-grading: {e}"
+        metrics.count("jobs_failed_total")
+        store.fail_job(new_id, error)
+        return jsonify({"job_id": new_id, "regrade_of": job_id, "error": error}), 500
+    return jsonify({"job_id": new_id, "regrade_of": job_id, "total_score": exam_results["total_score"],
+                    "max_score": exam_results["max_score"]})
+
+
 @app.route("/evaluate", methods=["POST"])
 def evaluate():
     """
     Accepts file uploads, saves them, starts background processing,
     and returns immediately with 202 Accepted.
-    The client polls /progress and then navigates to /results when done.
+    The client follows /jobs/<job_id>/events (or its long-poll fallback) and
+    then navigates to /results when done.
     """
     global progress, latest_result
     print("\n" + "="*50)
@@ -93,18 +299,38 @@ def evaluate():
         print("ERROR: Empty filename")
         return jsonify({"error": "No file selected"}), 400
 
-    # Save Files
+    job_id = uuid.uuid4().hex
+    progress["job_id"] = job_id
+    job = events.JobEvents(job_id)
+    job_events[job_id] = job
+    while len(job_events) > MAX_JOB_PROFILES:
+        job_events.popitem(last=False)[1].discard()
+
+    # Files were streamed to disk (and hashed) while the request was parsed;
+    # the job owns them from here and deletes them when it finishes.
     update_progress(1, "Saving uploaded files...")
-    s_path = os.path.join(UPLOAD_FOLDER, "student_" + student_file.filename)
-    m_path = os.path.join(UPLOAD_FOLDER, "model_" + model_file.filename)
-    
-    student_file.save(s_path)
-    model_file.save(m_path)
-    
-    q_path = None
+    job.publish("stage", step=1, total_steps=progress["total_steps"], message="Saving uploaded files...")
+    student_upload = uploads.claim_upload(student_file)
+    model_upload = uploads.claim_upload(model_file)
+    question_upload = None
     if question_file and question_file.filename != "":
-        q_path = os.path.join(UPLOAD_FOLDER, "question_" + question_file.filename)
-        question_file.save(q_path)
+        question_upload = uploads.claim_upload(question_file)
+    job_uploads = [student_upload, model_upload, question_upload]
+    for u in job_uploads:
+        if u is not None:
+            print(f"[Uploads] {u.filename}: {u.size} bytes, sha256 {u.sha256[:12]}... -> {u.path}")
+
+    student_id = request.form.get("student_id") or os.path.splitext(student_file.filename)[0]
+    exam_id = request.form.get("exam_id") or None
+    store.start_job(job_id, student_id=student_id, exam_id=exam_id, model_hash=model_upload.sha256,
+                    student_hash=student_upload.sha256,
+                    question_hash=question_upload.sha256 if question_upload else None)
+
+    # Same model answer + question paper files: the resident exam context is reused
+    exam_key = result_store.exam_id_for(model_upload.sha256, question_upload.sha256 if question_upload else None)
+    s_path = student_upload.path
+    m_path = model_upload.path
+    q_path = question_upload.path if question_upload else None
 
     # Reset result holder
     latest_result["exam_data"] = None
@@ -113,93 +339,20 @@ def evaluate():
     # --- Run processing in a background thread ---
     def process_evaluation():
         global progress, latest_result
-        q_schema = {}
         overall_start = time.time()
+        profile = metrics.start_job(job_id, track_rss=low_memory.track_rss())
+        job_profiles[job_id] = profile
+        events.bind(job)
+        while len(job_profiles) > MAX_JOB_PROFILES:
+            job_profiles.popitem(last=False)
+        artifacts = {}
         try:
-            # 0. Question Paper OCR (if provided)
-            if q_path:
-                update_progress(2, "Reading question paper with OCR... (this may take a minute)")
-                step_start = time.time()
-                q_schema = parse_question_paper_file(q_path)
-                print(f"Question Paper Schema: {q_schema} ({time.time()-step_start:.1f}s)")
-
-            # 1. OCR (Extract raw text)
-            update_progress(3, "Running OCR on student answer... (this may take a few minutes)")
-            step_start = time.time()
-            student_raw = extract_text_from_file(s_path)
-            print(f"Student OCR completed in {time.time()-step_start:.1f}s")
-            
-            update_progress(4, "Running OCR on model answer...")
-            step_start = time.time()
-            model_raw = extract_text_from_file(m_path)
-            print(f"Model OCR completed in {time.time()-step_start:.1f}s")
-            
-            if not student_raw or not model_raw:
-                which = "student" if not student_raw else "model"
-                latest_result["error"] = f"OCR failed to read the {which} answer file. Ensure it is clear and not corrupted."
-                progress["status"] = "error"
-                progress["message"] = latest_result["error"]
-                return
+            exam_results = pipeline.run_pipeline(get_scorer(), s_path, m_path, q_path,
+                                                 workers=SCORING_WORKERS, progress=update_progress,
+                                                 artifacts=artifacts, exam=exam_key)
+            store.save_documents(job_id, artifacts.get("ocr"), artifacts.get("segments"), artifacts.get("ocr_noise"))
+            store.finish_job(job_id, exam_results, artifacts.get("q_schema"))
 
-            # 2. Parsing (Split into Q1, Q2, etc.)
-            update_progress(5, "Processing text and correcting OCR errors...")
-            
-            # Parse model answer FIRST to get expected question keys
-            # Use QP schema as hint if available to prevent ghost parts in model answer
-            model_expected = list(q_schema.keys()) if q_schema else None
-            model_segments = parse_exam_file(model_raw, expected_keys=model_expected)
-            
-            if not model_segments:
-                latest_result["error"] = "Could not detect Question Numbers (e.g., '1.', 'Q1') in the Model Answer PDF. Please ensure standard formatting."
-                progress["status"] = "error"
-                progress["message"] = latest_result["error"]
-                return
-            
-            # Parse student with model keys as hint for page-aware fallback
-            expected_keys = list(model_segments.keys())
-            # Also include schema keys if available
-            if q_schema:
-                for k in q_schema:
-                    if k not in expected_keys and not k.startswith("_"):
-                        expected_keys.append(k)
-            
-            student_segments = parse_exam_file(student_raw, expected_keys=expected_keys)
-            print(f"\n[Parsing] Model keys: {sorted(model_segments.keys())}")
-            print(f"[Parsing] Student keys: {sorted(student_segments.keys())}")
-            print(f"[Parsing] Expected keys hint: {sorted(expected_keys)}")
-
-            # Clean individual segments
-            all_model_text = ""
-            for k in model_segments:
-                m_clean = clean_text(model_segments[k])
-                model_segments[k] = m_clean
-                all_model_text += " " + m_clean
-                
-            # Build vocabulary from model answer for context-aware correction
-            model_vocab = set(all_model_text.split())
-            print(f"Built Model Vocabulary: {len(model_vocab)} unique words.")
-
-            # Process Student Answer with Spell Correction
-            for k in student_segments:
-                s_clean = clean_text(student_segments[k])
-                s_corrected = correct_spelling(s_clean, custom_dictionary=model_vocab)
-                student_segments[k] = s_corrected
-                
-                if len(s_clean) > 0:
-                    print(f"Q{k} Original: {s_clean[:30]}... -> Corrected: {s_corrected[:30]}...")
-
-            # 3. Scoring
-            update_progress(6, "Scoring answers with semantic analysis...")
-            print("\n--- DEBUG: Parsed Student Data ---")
-            for k, v in student_segments.items():
-                preview = v[:50].replace('\n', ' ') + "..."
-                print(f"Q{k}: {preview}")
-            print("------------------------------------\n")
-
-            step_start = time.time()
-            exam_results = scorer.evaluate_exam(student_segments, model_segments, question_schema=q_schema)
-            print(f"Scoring completed in {time.time()-step_start:.1f}s")
-            
             total_time = time.time() - overall_start
             print(f"\n=== TOTAL PROCESSING TIME: {total_time:.1f}s ===")
             
@@ -207,7 +360,16 @@ def evaluate():
             latest_result["exam_data"] = exam_results
             progress["status"] = "done"
             progress["message"] = "Complete!"
+            job.publish("done", total_score=exam_results.get("total_score"),
+                        max_score=exam_results.get("max_score"), seconds=round(total_time, 1))
 
+        except pipeline.PipelineError as e:
+            latest_result["error"] = str(e)
+            progress["status"] = "error"
+            progress["message"] = latest_result["error"]
+            metrics.count("jobs_failed_total")
+            store.fail_job(job_id, latest_result["error"])
+            job.publish("failed", message=latest_result["error"])
         except Exception as e:
             total_time = time.time() - overall_start
             print(f"Error in processing thread after {total_time:.1f}s: {e}")
@@ -216,14 +378,25 @@ def evaluate():
             latest_result["error"] = f"An error occurred during evaluation: {e}"
             progress["status"] = "error"
             progress["message"] = str(e)
+            metrics.count("jobs_failed_total")
+            store.fail_job(job_id, latest_result["error"])
+            job.publish("failed", message=latest_result["error"])
+        finally:
+            metrics.record("job", time.time() - overall_start)
+            metrics.end_job()
+            events.bind(None)
+            uploads.release(job_uploads)
 
     # Start processing in background -- return immediately
     worker = threading.Thread(target=process_evaluation, daemon=True)
     worker.start()
     
-    # Return 202 Accepted immediately -- client will poll /progress
-    return jsonify({"status": "accepted", "message": "Processing started"}), 202
+    # Return 202 Accepted immediately -- client follows /jobs/<job_id>/events
+    return jsonify({"status": "accepted", "message": "Processing started", "job_id": job_id,
+                    "uploads": {name: u.to_dict() for name, u in
+                                zip(("student", "model", "question"), job_uploads) if u is not None}}), 202
 
 
 if __name__ == "__main__":
+    # Development server (reloader, one process); see serve.py for production
     app.run(debug=True, threaded=True)
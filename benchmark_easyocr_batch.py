@@ -0,0 +1,101 @@
+"""
+CPU throughput of batched EasyOCR (easyocr_batch.BatchedReader) at different
+page / recognizer batch sizes, against the per-page reader.readtext() path.
+
+Pages come from synthetic_sheets.py (fixed seed) and go through the same
+red-ink removal + light preprocessing as ocr_service. Every batched
+configuration is also checked for identical text to the per-page path.
+Results use benchmark_pipeline's JSON format (stage "easyocr", size
+"p<pages>_r<crops>") so compare_benchmarks.py can diff two runs.
+
+Run:
+    python benchmark_easyocr_batch.py
+    python benchmark_easyocr_batch.py --pages 8 --page-batches 1,2,4,8 --recog-batches 8,32,128 --runs 2
+"""
+import argparse
+import datetime
+import json
+import platform
+
+import numpy as np
+
+from benchmark_pipeline import summarize, time_runs, _git_commit
+from easyocr_batch import BatchedReader
+from ocr_service import get_reader, preprocess_light, remove_red_ink
+from synthetic_sheets import build_exam, exam_text, render_pages
+
+
+def synthetic_pages(num_pages, seed=0):
+    questions, _ = build_exam(12, seed)
+    text = exam_text(questions)
+    pages = []
+    while len(pages) < num_pages:
+        pages.extend(render_pages(text, seed=seed + len(pages)))
+    return [preprocess_light(remove_red_ink(np.array(p))) for p in pages[:num_pages]]
+
+
+def run(num_pages=8, page_batches=(1, 2, 4, 8), recog_batches=(8, 32, 128), runs=2, reader=None):
+    reader = reader or get_reader()
+    pages = synthetic_pages(num_pages)
+    results, mismatches = [], []
+
+    latencies, peak, reference = time_runs(
+        lambda: [reader.readtext(p, detail=0, paragraph=True) for p in pages], runs)
+    results.append(summarize("easyocr", "readtext", latencies, len(pages), "pages", peak))
+
+    for page_batch in page_batches:
+        for recog_batch in recog_batches:
+            batched = BatchedReader(reader, detect_batch_size=page_batch, recog_batch_size=recog_batch)
+
+            def ocr_all():
+                out = []
+                for start in range(0, len(pages), page_batch):
+                    out.extend(batched.readtext_pages(pages[start:start + page_batch]))
+                return out
+
+            latencies, peak, texts = time_runs(ocr_all, runs)
+            name = f"p{page_batch}_r{recog_batch}"
+            row = summarize("easyocr", name, latencies, len(pages), "pages", peak)
+            row["crops"] = batched.last_stats.get("crops")
+            results.append(row)
+            if texts != reference:
+                mismatches.append(name)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pages": num_pages,
+        },
+        "results": results,
+        "errors": [{"stage": "easyocr", "size": m, "error": "text differs from readtext"} for m in mismatches],
+    }
+
+
+def print_report(report):
+    base = report["results"][0]["p50_s"]
+    print(f"\n{'config':<12} {'p50 s':>8} {'pages/s':>8} {'speedup':>8}")
+    for r in report["results"]:
+        speedup = base / r["p50_s"] if r["p50_s"] else 0.0
+        print(f"{r['size']:<12} {r['p50_s']:>8.2f} {r['throughput_per_s']:>8.2f} {speedup:>7.2f}x")
+    for e in report["errors"]:
+        print(f"{e['size']:<12} ERROR: {e['error']}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark batched EasyOCR on CPU")
+    ap.add_argument("--pages", type=int, default=8)
+    ap.add_argument("--page-batches", default="1,2,4,8")
+    ap.add_argument("--recog-batches", default="8,32,128")
+    ap.add_argument("--runs", type=int, default=2)
+    ap.add_argument("--out", default="bench_results_easyocr.json")
+    args = ap.parse_args()
+
+    report = run(args.pages, [int(x) for x in args.page_batches.split(",")],
+                 [int(x) for x in args.recog_batches.split(",")], args.runs)
+    print_report(report)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {args.out}")
@@ -0,0 +1,310 @@
+"""
+Reproducible end-to-end benchmark suite on synthetic answer booklets.
+
+Generates booklets with synthetic_sheets.py (fixed seeds, so every run sees the
+same inputs), then times the pipeline stages and the full
+ocr_service -> pdf_parser -> text_utils -> scoring chain at several sizes.
+For every (stage, size) it reports throughput, p50/p95 latency and peak RSS,
+and writes everything to a JSON file that compare_benchmarks.py can diff.
+
+Run:
+    python benchmark_pipeline.py                         # all stages, all sizes
+    python benchmark_pipeline.py --stages parse,scoring --sizes small --runs 5
+    python benchmark_pipeline.py --out bench_results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import metrics
+from pdf_parser import parse_exam_file, PAGE_BREAK
+from synthetic_sheets import generate_booklet_set
+from text_utils import clean_text, correct_spelling
+
+# name -> (questions, answer_repeats); repeats lengthen answers, i.e. more pages
+SIZES = {
+    "small": (4, 1),
+    "medium": (8, 2),
+    "large": (12, 4),
+}
+
+ALL_STAGES = ["rasterize", "red_ink", "ocr", "parse", "text", "scoring", "pipeline", "accuracy"]
+
+# Grading fixtures from test_grading_fix.py / verify_scoring_upgrade.py. The
+# "accuracy" stage records their per-question scores so compare_benchmarks.py
+# can tie a speed change to its score drift.
+BINARY_SEARCH_MODEL = ("Binary Search Time Complexity: Best Case O(1) when target found at middle position. "
+                       "Worst Case O(log n) when element at end.")
+SCORE_FIXTURES = {
+    "grading_fix": {
+        "single": {
+            "clean_paraphrase": ("Binary search has best case O(1) when target is at the middle. Worst case is O(log n).",
+                                 BINARY_SEARCH_MODEL),
+            "ocr_garbled": ("binery srch complixy oone when midle positon Olg n wrst cse", BINARY_SEARCH_MODEL),
+        },
+        "exam": {
+            "schema": {
+                "10784": {"max_marks": 50, "type": "mandatory", "group": "10784"},
+                "1": {"max_marks": 1, "type": "challenge", "group": "1"},
+                "_total_marks": 50,
+            },
+            "model": {"1": "Binary search has O(log n) complexity.", "2": "AVL tree minimum height is floor(log2 n)."},
+            "student": {"1": "Binary search complexity log n best case O1.", "2": "AVL tree height log n."},
+        },
+    },
+    "scoring_upgrade": {
+        "exam": {
+            "schema": {
+                "1": {"max_marks": 5, "type": "mandatory", "group": "1"},
+                "2": {"max_marks": 10, "type": "mandatory", "group": "2"},
+                "3": {"max_marks": 15, "type": "optional", "group": "group_3_4"},
+                "4": {"max_marks": 15, "type": "optional", "group": "group_3_4"},
+            },
+            "model": {
+                "1": "Photosynthesis is the process by which green plants make food.",
+                "2": "Newton's laws of motion are three physical laws that lay the foundation for classical mechanics.",
+                "3": "Mitochondria is the powerhouse of the cell.",
+                "4": "The nucleus controls the activities of the cell.",
+            },
+            "student": {
+                "1": "Photosynthesis is how plants make food using sunlight.",
+                "2": "Gravity is a force.",
+                "3": "Powerhouse of cell.",
+                "4": "Nucleus is the brain of the cell controlling everything.",
+            },
+        },
+    },
+}
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(stage, size, latencies, units, unit_name, peak_rss):
+    total = sum(latencies)
+    return {
+        "stage": stage,
+        "size": size,
+        "runs": len(latencies),
+        "units_per_run": units,
+        "unit": unit_name,
+        "latencies_s": [round(x, 4) for x in latencies],
+        "mean_s": round(total / len(latencies), 4) if latencies else 0.0,
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "throughput_per_s": round(units * len(latencies) / total, 3) if total > 0 else 0.0,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+    }
+
+
+def time_runs(fn, runs):
+    """Runs fn() `runs` times; returns (latencies, peak RSS bytes, last result)."""
+    latencies = []
+    result = None
+    with metrics.PeakRSS() as mem:
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = fn()
+            latencies.append(time.perf_counter() - start)
+    return latencies, mem.peak, result
+
+
+def _student_transcript(truth):
+    """Ground-truth student text with page breaks, as OCR would return it."""
+    lines = truth["student_text"].split("\n")
+    chunk = max(1, len(lines) // 3)
+    pages = ["\n".join(lines[i:i + chunk]) for i in range(0, len(lines), chunk)]
+    return ("\n" + PAGE_BREAK + "\n").join(pages)
+
+
+def run_pipeline(student_path, model_path, scorer, question_schema=None):
+    """Same chain as app.py's background job, without Flask. Returns (exam results, student pages)."""
+    from ocr_service import extract_text_from_file
+
+    student_raw = extract_text_from_file(student_path)
+    model_raw = extract_text_from_file(model_path)
+    if not student_raw or not model_raw:
+        raise RuntimeError("OCR returned no text (are poppler and tesseract installed?)")
+    model_segments = parse_exam_file(model_raw)
+    expected = list(model_segments.keys())
+    student_segments = parse_exam_file(student_raw, expected_keys=expected)
+    model_segments = {k: clean_text(v) for k, v in model_segments.items()}
+    vocab = set(" ".join(model_segments.values()).split())
+    student_segments = {k: correct_spelling(clean_text(v), custom_dictionary=vocab)
+                        for k, v in student_segments.items()}
+    exam = scorer.evaluate_exam(student_segments, model_segments, question_schema=question_schema)
+    return exam, max(1, student_raw.count(PAGE_BREAK))
+
+
+def benchmark_size(size, stages, runs, booklet, scorer_factory):
+    paths, truth = booklet
+    results = []
+
+    pages = None
+    if "rasterize" in stages or "red_ink" in stages:
+        from pdf2image import convert_from_path
+        import numpy as np
+        from ocr_service import POPPLER_PATH, remove_red_ink
+
+        def rasterize():
+            kwargs = {"poppler_path": POPPLER_PATH} if POPPLER_PATH else {}
+            return convert_from_path(paths["student"], dpi=150, **kwargs)
+
+        lat, peak, pages = time_runs(rasterize, runs)
+        if "rasterize" in stages:
+            results.append(summarize("rasterize", size, lat, len(pages), "pages", peak))
+
+        if "red_ink" in stages:
+            arrays = [np.array(p) for p in pages]
+            lat, peak, _ = time_runs(lambda: [remove_red_ink(a) for a in arrays], runs)
+            results.append(summarize("red_ink", size, lat, len(arrays), "pages", peak))
+
+    if "ocr" in stages:
+        from ocr_service import extract_text_from_file
+        lat, peak, text = time_runs(lambda: extract_text_from_file(paths["student"]), runs)
+        if not text:
+            raise RuntimeError("OCR returned no text (are poppler and tesseract installed?)")
+        n_pages = max(1, text.count(PAGE_BREAK))
+        results.append(summarize("ocr", size, lat, n_pages, "pages", peak))
+
+    transcript = _student_transcript(truth)
+    expected = list(truth["model_segments"].keys())
+    if "parse" in stages:
+        lat, peak, _ = time_runs(lambda: parse_exam_file(transcript, expected_keys=expected), runs)
+        results.append(summarize("parse", size, lat, len(expected), "questions", peak))
+
+    vocab = set(" ".join(clean_text(v) for v in truth["model_segments"].values()).split())
+    if "text" in stages:
+        segs = truth["student_segments"]
+        lat, peak, _ = time_runs(
+            lambda: {k: correct_spelling(clean_text(v), custom_dictionary=vocab) for k, v in segs.items()}, runs)
+        results.append(summarize("text", size, lat, len(segs), "questions", peak))
+
+    if "scoring" in stages or "pipeline" in stages:
+        scorer = scorer_factory()
+        model_segs = {k: clean_text(v) for k, v in truth["model_segments"].items()}
+        student_segs = {k: correct_spelling(clean_text(v), custom_dictionary=vocab)
+                        for k, v in truth["student_segments"].items()}
+        if "scoring" in stages:
+            lat, peak, _ = time_runs(lambda: scorer.evaluate_exam(dict(student_segs), model_segs), runs)
+            results.append(summarize("scoring", size, lat, len(model_segs), "questions", peak))
+        if "pipeline" in stages:
+            lat, peak, (_, n_pages) = time_runs(lambda: run_pipeline(paths["student"], paths["model"], scorer), runs)
+            results.append(summarize("pipeline", size, lat, n_pages, "pages", peak))
+
+    if "accuracy" in stages:
+        scorer = scorer_factory()
+        lat, peak, scores = time_runs(lambda: score_fixtures(scorer), runs)
+        results.append(summarize("accuracy", size, lat, len(scores), "scores", peak))
+        results[-1]["scores"] = scores
+
+    return results
+
+
+def score_fixtures(scorer):
+    """Per-question scores on SCORE_FIXTURES: {"fixture/question": score, "fixture/total": total}."""
+    scores = {}
+    for name, fixture in SCORE_FIXTURES.items():
+        for label, (student, model) in fixture.get("single", {}).items():
+            scores[f"{name}/{label}"] = scorer.evaluate_single_answer(student, model)["score"]
+        exam = fixture.get("exam")
+        if exam:
+            result = scorer.evaluate_exam(dict(exam["student"]), exam["model"], question_schema=dict(exam["schema"]))
+            for item in result["breakdown"]:
+                scores[f"{name}/Q{item.get('_base_key', item['question'])}"] = item["score"]
+            scores[f"{name}/total"] = result["total_score"]
+    return scores
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(stages=None, sizes=None, runs=3, data_dir="bench_data", scorer_factory=None):
+    stages = stages or ALL_STAGES
+    sizes = sizes or list(SIZES)
+    if scorer_factory is None:
+        def scorer_factory():
+            from scoring import SemanticScorer
+            return SemanticScorer()
+    scorers = []
+
+    def shared_scorer():
+        if not scorers:
+            scorers.append(scorer_factory())
+        return scorers[0]
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "runs": runs,
+            "stages": stages,
+            "sizes": {s: SIZES[s] for s in sizes},
+        },
+        "results": [],
+        "scores": {},
+        "errors": [],
+    }
+    for size in sizes:
+        questions, repeats = SIZES[size]
+        booklet = generate_booklet_set(os.path.join(data_dir, size), questions,
+                                       seed=len(size), answer_repeats=repeats)
+        for stage in stages:
+            if stage == "accuracy" and report["scores"]:
+                continue  # fixtures don't depend on the booklet size
+            # Each stage separately so one missing dependency (e.g. no poppler)
+            # doesn't sink the whole run.
+            try:
+                for r in benchmark_size(size, [stage], runs, booklet, shared_scorer):
+                    report["scores"].update(r.pop("scores", {}))
+                    report["results"].append(r)
+            except Exception as e:
+                print(f"[Bench] {stage}/{size} failed: {e}")
+                report["errors"].append({"stage": stage, "size": size, "error": str(e)})
+    return report
+
+
+def print_report(report):
+    print(f"\n{'stage':<10} {'size':<7} {'p50 s':>8} {'p95 s':>8} {'thru/s':>9} {'unit':<10} {'peak MB':>8}")
+    for r in report["results"]:
+        print(f"{r['stage']:<10} {r['size']:<7} {r['p50_s']:>8.3f} {r['p95_s']:>8.3f} "
+              f"{r['throughput_per_s']:>9.2f} {r['unit']:<10} {r['peak_rss_mb']:>8.1f}")
+    for e in report["errors"]:
+        print(f"{e['stage']:<10} {e['size']:<7} ERROR: {e['error']}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark the grading pipeline on synthetic booklets")
+    ap.add_argument("--stages", default=",".join(ALL_STAGES), help=f"comma list from {ALL_STAGES}")
+    ap.add_argument("--sizes", default=",".join(SIZES), help=f"comma list from {list(SIZES)}")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--data-dir", default="bench_data")
+    ap.add_argument("--out", default="bench_results.json")
+    args = ap.parse_args()
+
+    report = run_benchmarks(args.stages.split(","), args.sizes.split(","), args.runs, args.data_dir)
+    print_report(report)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {args.out}")
@@ -0,0 +1,182 @@
+"""
+Performance regression gate: compares two benchmark_pipeline.py result files.
+
+For every (stage, size) present in both runs it diffs latency (p50 by default)
+and peak RSS, and for the grading fixtures it diffs every per-question score,
+so each speed change is reported together with its grading-accuracy cost.
+Exits non-zero when a budget is exceeded, when a stage or fixture of the base
+run is missing from the new run, or when the new run recorded errors (the last
+two only pass with --allow-missing).
+
+Run:
+    python compare_benchmarks.py base.json new.json
+    python compare_benchmarks.py base.json new.json --max-latency-regression 0.10 --max-score-drift 0.2
+    python compare_benchmarks.py base.json new.json --budget perf_budget.json
+    python compare_benchmarks.py base.json new.json --allow-missing
+
+Budget file (all keys optional; per-stage latency/RSS overrides fall back to "default"):
+    {
+      "latency": {"default": 0.15, "ocr": 0.30},
+      "rss": {"default": 0.10},
+      "score_drift": 0.5,
+      "total_drift": 1.0
+    }
+"""
+import argparse
+import json
+import sys
+
+# Latency changes below this many seconds are treated as timer noise
+MIN_LATENCY_DELTA_S = 0.005
+# RSS changes below this many MB are ignored
+MIN_RSS_DELTA_MB = 5.0
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _index(report):
+    return {(r["stage"], r["size"]): r for r in report.get("results", [])}
+
+
+def _budget_for(budget, kind, stage):
+    value = budget.get(kind)
+    if isinstance(value, dict):
+        return value.get(stage, value.get("default"))
+    return value
+
+
+def merge_budget(budget, overrides):
+    """`budget` updated from a budget file; per-stage dicts are merged, not replaced."""
+    merged = dict(budget)
+    for kind, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(kind), dict):
+            merged[kind] = {**merged[kind], **value}
+        else:
+            merged[kind] = value
+    return merged
+
+
+def compare_reports(base, new, budget, metric="p50_s", allow_missing=False):
+    """
+    Returns (rows, violations). rows are printable diffs; violations are the
+    subset that exceed the budget, plus (unless allow_missing) every stage or
+    fixture that only the base run has and every error of the new run.
+    """
+    rows = []
+    violations = []
+    base_idx, new_idx = _index(base), _index(new)
+
+    def missing(stage, size, only_in_base):
+        row = {"kind": "missing", "stage": stage, "size": size,
+               "note": "only in base" if only_in_base else "only in new"}
+        if only_in_base and not allow_missing:
+            violations.append(row)
+        rows.append(row)
+
+    for err in new.get("errors", []):
+        row = {"kind": "error", "stage": err.get("stage", "?"), "size": str(err.get("size", "")),
+               "note": err.get("error", "")}
+        if not allow_missing:
+            violations.append(row)
+        rows.append(row)
+
+    for key in sorted(set(base_idx) | set(new_idx)):
+        stage, size = key
+        if key not in base_idx or key not in new_idx:
+            missing(stage, size, key in base_idx)
+            continue
+        b, n = base_idx[key], new_idx[key]
+
+        b_lat, n_lat = b[metric], n[metric]
+        ratio = (n_lat - b_lat) / b_lat if b_lat > 0 else 0.0
+        row = {"kind": "latency", "stage": stage, "size": size, "base": b_lat, "new": n_lat, "change": ratio}
+        limit = _budget_for(budget, "latency", stage)
+        if limit is not None and ratio > limit and (n_lat - b_lat) > MIN_LATENCY_DELTA_S:
+            row["limit"] = limit
+            violations.append(row)
+        rows.append(row)
+
+        b_rss, n_rss = b.get("peak_rss_mb", 0), n.get("peak_rss_mb", 0)
+        ratio = (n_rss - b_rss) / b_rss if b_rss > 0 else 0.0
+        row = {"kind": "rss", "stage": stage, "size": size, "base": b_rss, "new": n_rss, "change": ratio}
+        limit = _budget_for(budget, "rss", stage)
+        if limit is not None and ratio > limit and (n_rss - b_rss) > MIN_RSS_DELTA_MB:
+            row["limit"] = limit
+            violations.append(row)
+        rows.append(row)
+
+    base_scores, new_scores = base.get("scores", {}), new.get("scores", {})
+    for name in sorted(set(base_scores) | set(new_scores)):
+        if name not in base_scores or name not in new_scores:
+            missing("score", name, name in base_scores)
+            continue
+        drift = new_scores[name] - base_scores[name]
+        row = {"kind": "score", "stage": "score", "size": name,
+               "base": base_scores[name], "new": new_scores[name], "change": drift}
+        limit = budget.get("total_drift") if name.endswith("/total") else budget.get("score_drift")
+        if limit is not None and abs(drift) > limit:
+            row["limit"] = limit
+            violations.append(row)
+        rows.append(row)
+
+    return rows, violations
+
+
+def print_rows(rows, violations):
+    flagged = {id(v) for v in violations}
+    print(f"{'kind':<8} {'stage':<10} {'size / fixture':<34} {'base':>10} {'new':>10} {'change':>9}")
+    for r in rows:
+        mark = "  <-- over budget" if id(r) in flagged else ""
+        if r["kind"] in ("missing", "error"):
+            print(f"{r['kind']:<8} {r['stage']:<10} {r['size']:<34} {r['note']}{mark}")
+            continue
+        if r["kind"] == "score":
+            change = f"{r['change']:+.2f}"
+        else:
+            change = f"{r['change'] * 100:+.1f}%"
+        print(f"{r['kind']:<8} {r['stage']:<10} {r['size']:<34} {r['base']:>10.3f} {r['new']:>10.3f} {change:>9}{mark}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare two benchmark_pipeline.py runs against a budget")
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--metric", default="p50_s", choices=["p50_s", "p95_s", "mean_s"])
+    ap.add_argument("--budget", help="JSON budget file (overrides the flags below, key by key)")
+    ap.add_argument("--max-latency-regression", type=float, default=0.15, help="allowed fractional slowdown")
+    ap.add_argument("--max-rss-regression", type=float, default=0.10, help="allowed fractional RSS growth")
+    ap.add_argument("--max-score-drift", type=float, default=0.5, help="allowed per-question score change")
+    ap.add_argument("--max-total-drift", type=float, default=1.0, help="allowed exam total change")
+    ap.add_argument("--allow-missing", action="store_true",
+                    help="don't fail on stages/fixtures missing from the new run or on its errors")
+    args = ap.parse_args(argv)
+
+    budget = {
+        "latency": {"default": args.max_latency_regression},
+        "rss": {"default": args.max_rss_regression},
+        "score_drift": args.max_score_drift,
+        "total_drift": args.max_total_drift,
+    }
+    if args.budget:
+        with open(args.budget, encoding="utf-8") as f:
+            budget = merge_budget(budget, json.load(f))
+
+    base, new = load_report(args.base), load_report(args.new)
+    print(f"Base: {base['meta'].get('commit')} ({base['meta'].get('timestamp')})")
+    print(f"New:  {new['meta'].get('commit')} ({new['meta'].get('timestamp')})\n")
+
+    rows, violations = compare_reports(base, new, budget, metric=args.metric, allow_missing=args.allow_missing)
+    print_rows(rows, violations)
+
+    if violations:
+        print(f"\nFAIL: {len(violations)} budget violation(s)")
+        return 1
+    print("\nPASS: within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import metrics
+
+# Same token rule as sklearn's CountVectorizer default: words of 2+ word chars
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# Phrase embeddings kept across answers/exams (least recently used evicted first)
+CONCEPT_CACHE_MAX = 50000
+
+
+class ConceptExtractor:
+    """
+    KeyBERT-style key concept extraction without fitting a CountVectorizer per call.
+
+    Candidates are 1-3 word n-grams built from a regex tokenizer after stop-word
+    removal (same candidates, in the same sorted order, as the previous
+    CountVectorizer path). Embeddings are normalized and cached per phrase, so
+    ranking is a single matrix-vector product and repeated model segments /
+    shared n-grams are never re-encoded.
+    """
+
+    def __init__(self, model, stop_words, ngram_range=(1, 3)):
+        self.model = model
+        self.stop_words = stop_words
+        self.ngram_range = ngram_range
+        self._embeddings = OrderedDict()  # phrase -> normalized embedding (np.float32), LRU order
+        self._lock = threading.Lock()     # the scorer (and this cache) is shared by job threads
+
+    def candidates(self, text):
+        """Sorted unique n-gram candidates for a document (stop words removed first)."""
+        tokens = [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        grams = set()
+        for n in range(min_n, max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                grams.add(" ".join(tokens[i:i + n]))
+        return sorted(grams)
+
+    def embed(self, phrases):
+        """
+        Returns an (len(phrases), dim) matrix of normalized embeddings.
+        Only phrases not already cached are sent to the encoder, in one batch.
+        Over CONCEPT_CACHE_MAX the least recently used phrases are evicted.
+        The matrix is built from the vectors looked up / encoded by this call,
+        never by re-reading the cache, which other threads may evict from.
+        """
+        cache = self._embeddings
+        found = {}
+        with self._lock:
+            for p in dict.fromkeys(phrases):
+                vec = cache.get(p)
+                if vec is not None:
+                    cache.move_to_end(p)
+                    found[p] = vec
+        missing = [p for p in dict.fromkeys(phrases) if p not in found]
+        if missing:
+            # Encoded outside the lock; two threads may encode the same phrase once each
+            vecs = np.asarray(self.model.encode(missing, convert_to_numpy=True), dtype=np.float32)
+            norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+            vecs = vecs / np.maximum(norms, 1e-12)
+            found.update(zip(missing, vecs))
+            with self._lock:
+                for phrase in missing:
+                    cache[phrase] = found[phrase]
+                    cache.move_to_end(phrase)
+                while len(cache) > CONCEPT_CACHE_MAX:
+                    cache.popitem(last=False)
+        if not phrases:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[p] for p in phrases])
+
+    def extract(self, text, top_n=10, diversity=None):
+        """
+        Top-n concepts for one document, most relevant first.
+        `diversity` (0-1) enables Maximal Marginal Relevance re-ranking so the
+        list isn't dominated by overlapping n-grams of the same phrase.
+        """
+        return self.extract_many([text], top_n=top_n, diversity=diversity)[0]
+
+    def extract_many(self, texts, top_n=10, diversity=None):
+        """
+        Concepts for several documents (e.g. all model segments of an exam).
+        Candidates are deduplicated across documents and embedded together.
+        """
+        with metrics.timer("concepts"):
+            return self._extract_many(texts, top_n, diversity)
+
+    def _extract_many(self, texts, top_n, diversity):
+        cand_lists = [self.candidates(t) for t in texts]
+        to_embed = [t for t, c in zip(texts, cand_lists) if c]
+        for cands in cand_lists:
+            to_embed.extend(cands)
+        self.embed(to_embed)
+
+        results = []
+        for text, cands in zip(texts, cand_lists):
+            if not cands:
+                results.append([])
+                continue
+            doc_vec = self.embed([text])[0]
+            cand_vecs = self.embed(cands)
+            sims = cand_vecs @ doc_vec
+            if diversity:
+                order = self._mmr(sims, cand_vecs, top_n, diversity)
+            else:
+                order = sims.argsort()[-top_n:][::-1]
+            results.append([cands[i] for i in order])
+        return results
+
+    def _mmr(self, doc_sims, cand_vecs, top_n, diversity):
+        """Maximal Marginal Relevance selection over normalized candidate vectors."""
+        top_n = min(top_n, len(doc_sims))
+        selected = [int(np.argmax(doc_sims))]
+        remaining = [i for i in range(len(doc_sims)) if i != selected[0]]
+        pairwise = cand_vecs @ cand_vecs.T
+
+        while remaining and len(selected) < top_n:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+            mmr = (1 - diversity) * doc_sims[remaining] - diversity * redundancy
+            best = remaining[int(np.argmax(mmr))]
+            selected.append(best)
+            remaining.remove(best)
+        return selected
@@ -0,0 +1,173 @@
+"""
+Batched EasyOCR for multi-page documents (CPU friendly).
+
+reader.readtext() handles one page at a time, and on CPU its recognizer runs
+every detected line crop as its own batch of one. BatchedReader instead:
+
+  1. runs the CRAFT detector over several pages per forward pass (pages of
+     the same size are stacked; a scanned PDF's pages usually are),
+  2. cuts every detected line crop from all those pages and sends them to the
+     recognizer together, in batches of `recog_batch_size`,
+  3. regroups the recognized lines per page and redoes paragraph grouping,
+     exactly as readtext(paragraph=True) does.
+
+Crops are bucketed by the padded width readtext would give each of them on its
+own (ceil(width / 64) * 64), so every crop is recognized at the same input size
+as in the per-page path and the text comes out the same -- batching only
+changes how many crops share a forward pass.
+
+readtext_items(pages, deadline=t) checks time.monotonic() against `t` before
+every detector and recognizer forward pass and raises Preempted once it has
+passed (a running forward pass can't be interrupted, so the overrun is at
+most one batch).
+"""
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+
+# Defaults used by ocr_service (overridable via environment there)
+DETECT_BATCH_SIZE = 4
+RECOG_BATCH_SIZE = 32
+
+# Same paragraph thresholds readtext() uses by default
+PARAGRAPH_X_THS = 1.0
+PARAGRAPH_Y_THS = 0.5
+
+
+class Preempted(Exception):
+    """EasyOCR was stopped because its deadline passed."""
+
+
+def _check_deadline(deadline):
+    if deadline is not None and time.monotonic() > deadline:
+        raise Preempted(f"EasyOCR deadline passed {time.monotonic() - deadline:.1f}s ago")
+
+
+def group_page(items, paragraph=True):
+    """
+    (text blocks, paragraph id per item) for one page's recognized lines
+    [(box, text, conf)], as readtext(detail=0, paragraph=...) would return the blocks.
+    """
+    if not paragraph:
+        return [item[1] for item in items], list(range(len(items)))
+    _, _, _, get_paragraph = _easyocr_internals()
+    paragraphs = get_paragraph(items, x_ths=PARAGRAPH_X_THS, y_ths=PARAGRAPH_Y_THS, mode="ltr")
+    block_ids = []
+    for box, _, _ in items:
+        cx = sum(p[0] for p in box) / len(box)
+        cy = sum(p[1] for p in box) / len(box)
+        block_ids.append(next((b for b, (pbox, _) in enumerate(paragraphs)
+                               if pbox[0][0] <= cx <= pbox[2][0] and pbox[0][1] <= cy <= pbox[2][1]), 0))
+    return [p[1] for p in paragraphs], block_ids
+
+
+def _easyocr_internals():
+    # Imported lazily: easyocr pulls in torch and is only needed once OCR runs
+    from easyocr.easyocr import imgH
+    from easyocr.recognition import get_text
+    from easyocr.utils import get_image_list, get_paragraph
+    return imgH, get_text, get_image_list, get_paragraph
+
+
+class BatchedReader:
+    def __init__(self, reader, detect_batch_size=DETECT_BATCH_SIZE, recog_batch_size=RECOG_BATCH_SIZE):
+        self.reader = reader
+        self.detect_batch_size = max(1, detect_batch_size)
+        self.recog_batch_size = max(1, recog_batch_size)
+        self.ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+        self.last_stats = {}
+
+    def detect(self, grey_pages, deadline=None):
+        """
+        Detector pass over all pages; returns [(horizontal_list, free_list)] per page.
+        Same-shaped pages are stacked into one forward pass of up to detect_batch_size.
+        """
+        boxes = [None] * len(grey_pages)
+        by_shape = {}
+        for i, grey in enumerate(grey_pages):
+            by_shape.setdefault(grey.shape, []).append(i)
+        for indices in by_shape.values():
+            for start in range(0, len(indices), self.detect_batch_size):
+                _check_deadline(deadline)
+                chunk = indices[start:start + self.detect_batch_size]
+                batch = np.stack([cv2.cvtColor(grey_pages[i], cv2.COLOR_GRAY2BGR) for i in chunk])
+                horizontal, free = self.reader.detect(batch if len(chunk) > 1 else batch[0], reformat=False)
+                for i, h, f in zip(chunk, horizontal, free):
+                    boxes[i] = (h, f)
+        return boxes
+
+    def crops(self, grey_pages, boxes):
+        """
+        Line crops of every page, in readtext's order (horizontal boxes, then
+        free-form boxes): [(page_index, box, crop, padded_width)].
+        """
+        imgH, _, get_image_list, _ = _easyocr_internals()
+        out = []
+        for page_index, (grey, (horizontal, free)) in enumerate(zip(grey_pages, boxes)):
+            for h_list, f_list in [([b], []) for b in horizontal] + [([], [b]) for b in free]:
+                # One box per call: the padded width is then the one readtext would use
+                image_list, max_width = get_image_list(h_list, f_list, grey, model_height=imgH)
+                for box, crop in image_list:
+                    out.append((page_index, box, crop, int(max_width)))
+        return out
+
+    def recognize(self, crops, deadline=None):
+        """Recognizer over all crops, batched per padded-width bucket. Returns [(box, text, conf)]."""
+        imgH, get_text, _, _ = _easyocr_internals()
+        reader = self.reader
+        results = [None] * len(crops)
+        buckets = {}
+        for i, (_, _, _, width) in enumerate(crops):
+            buckets.setdefault(width, []).append(i)
+        for width, indices in buckets.items():
+            for start in range(0, len(indices), self.recog_batch_size):
+                _check_deadline(deadline)
+                chunk = indices[start:start + self.recog_batch_size]
+                image_list = [(crops[i][1], crops[i][2]) for i in chunk]
+                predicted = get_text(reader.character, imgH, width, reader.recognizer, reader.converter,
+                                     image_list, self.ignore_char, "greedy", 5, len(chunk), 0.1, 0.5, 0.003,
+                                     0, reader.device)
+                for i, item in zip(chunk, predicted):
+                    results[i] = item
+        return results
+
+    def readtext_pages(self, pages, paragraph=True):
+        """
+        OCR a list of page images (grey or colour numpy arrays).
+        Returns one list of text blocks per page, like readtext(detail=0, paragraph=...).
+        """
+        return [group_page(items, paragraph)[0] for items in self.readtext_items(pages)]
+
+    def readtext_items(self, pages, deadline=None):
+        """
+        Recognized lines [(box, text, conf)] per page, in readtext's order (before
+        paragraph grouping). Raises Preempted once time.monotonic() passes `deadline`.
+        """
+        grey_pages = [p if p.ndim == 2 else cv2.cvtColor(p, cv2.COLOR_RGB2GRAY) for p in pages]
+
+        start = time.perf_counter()
+        with metrics.timer("ocr.easyocr.detect"):
+            boxes = self.detect(grey_pages, deadline)
+        detected = time.perf_counter()
+        crops = self.crops(grey_pages, boxes)
+        with metrics.timer("ocr.easyocr.recognize"):
+            recognized = self.recognize(crops, deadline)
+        done = time.perf_counter()
+
+        per_page = [[] for _ in pages]
+        for (page_index, _, _, _), item in zip(crops, recognized):
+            per_page[page_index].append(item)
+
+        self.last_stats = {
+            "pages": len(pages),
+            "crops": len(crops),
+            "width_buckets": len({c[3] for c in crops}),
+            "detect_s": round(detected - start, 3),
+            "recognize_s": round(done - detected, 3),
+        }
+        metrics.count("easyocr_crops_total", len(crops))
+        return per_page
+
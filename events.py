@@ -0,0 +1,178 @@
+"""
+Per-job progress events, pushed to the browser instead of polled.
+
+A JobEvents is an append-only, sequence-numbered event log guarded by a
+Condition: the job thread publishes, any number of readers block in wait()
+until something newer than the last id they saw arrives. app.py serves it as
+Server-Sent Events (/jobs/<id>/events, resumable via Last-Event-ID) and as a
+long-poll JSON endpoint for clients without EventSource.
+
+Like metrics.py, the job's JobEvents is bound to the worker thread, so deep
+code (OCR page loop, scorer) just calls events.emit(...), which is a no-op
+outside a job.
+
+Event types: stage, page, question, done, failed.
+
+With EVENTS_DIR set (serve.py sets it for its worker processes) every event
+is also appended to <EVENTS_DIR>/<job_id>.jsonl, and open_log() lets any other
+process on the box follow the job from that file (JobEventsLog, same wait()
+interface), whichever worker happens to run it.
+"""
+import json
+import os
+import threading
+import time
+
+# Events kept per job; older ones are dropped (readers resuming before that
+# point simply continue from the oldest retained event)
+MAX_EVENTS = 2000
+
+# Event types that end a job's stream
+TERMINAL_EVENTS = ("done", "failed")
+
+# Directory shared by the server's processes for job event logs; None = in-memory only
+EVENTS_DIR = os.environ.get("EVENTS_DIR") or None
+# How often a JobEventsLog reader looks for new lines
+LOG_POLL_SECONDS = 0.2
+
+
+def _log_path(log_dir, job_id):
+    if not log_dir or not job_id.isalnum():
+        return None
+    return os.path.join(log_dir, f"{job_id}.jsonl")
+
+
+class JobEvents:
+    def __init__(self, job_id, log_dir=None):
+        self.job_id = job_id
+        self.events = []       # [{"id", "type", "time", "data"}]
+        self.last_id = 0
+        self.finished = False
+        self._cond = threading.Condition()
+        self._path = _log_path(log_dir or EVENTS_DIR, job_id)
+        self._log = open(self._path, "a", encoding="utf-8") if self._path else None
+
+    def publish(self, event_type, **data):
+        with self._cond:
+            self.last_id += 1
+            event = {"id": self.last_id, "type": event_type, "time": round(time.time(), 3), "data": data}
+            self.events.append(event)
+            if len(self.events) > MAX_EVENTS:
+                del self.events[:len(self.events) - MAX_EVENTS]
+            if event_type in TERMINAL_EVENTS:
+                self.finished = True
+            if self._log is not None:
+                self._log.write(json.dumps(event) + "\n")
+                self._log.flush()
+                if self.finished:
+                    self._log.close()
+                    self._log = None
+            self._cond.notify_all()
+            return event
+
+    def discard(self):
+        """Drop the job's shared log (when the job is evicted)."""
+        with self._cond:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        if self._path:
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+
+    def since(self, after):
+        with self._cond:
+            return [e for e in self.events if e["id"] > after]
+
+    def wait(self, after, timeout):
+        """
+        Blocks until there are events newer than `after`, the job has finished
+        or `timeout` seconds pass. Returns (events, finished).
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.last_id <= after and not self.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [e for e in self.events if e["id"] > after], self.finished
+
+
+class JobEventsLog:
+    """Read side of a job's shared event log, for processes that don't run the job."""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self.finished = False
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        with self._lock:
+            self._read()
+            return self.events[-1]["id"] if self.events else 0
+
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        # Only whole lines; a line being written is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        self._offset += end
+        for line in chunk[:end].decode("utf-8").splitlines():
+            event = json.loads(line)
+            self.events.append(event)
+            if event["type"] in TERMINAL_EVENTS:
+                self.finished = True
+        if len(self.events) > MAX_EVENTS:
+            del self.events[:len(self.events) - MAX_EVENTS]
+
+    def since(self, after):
+        with self._lock:
+            self._read()
+            return [e for e in self.events if e["id"] > after]
+
+    def wait(self, after, timeout):
+        """As JobEvents.wait, polling the file every LOG_POLL_SECONDS."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._read()
+                newer = [e for e in self.events if e["id"] > after]
+                if newer or self.finished or time.monotonic() >= deadline:
+                    return newer, self.finished
+            time.sleep(min(LOG_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+
+def open_log(job_id, log_dir=None):
+    """A JobEventsLog for a job another process is running, or None if there is no such log."""
+    path = _log_path(log_dir or EVENTS_DIR, job_id)
+    if path is None or not os.path.exists(path):
+        return None
+    return JobEventsLog(path)
+
+
+_local = threading.local()
+
+
+def bind(job_events):
+    """Bind a JobEvents to the calling thread (None unbinds)."""
+    _local.events = job_events
+
+
+def current():
+    return getattr(_local, "events", None)
+
+
+def emit(event_type, **data):
+    job_events = current()
+    if job_events is not None:
+        job_events.publish(event_type, **data)
@@ -0,0 +1,83 @@
+"""
+Resident per-exam contexts.
+
+Every script of an exam is graded against the same model answer and question
+paper, so everything derived from them -- the parsed model segments and
+question schema, each segment's concepts, concept embeddings, segment
+embedding and keywords (scoring.ModelFeatures) and the spell-correction index
+of the model vocabulary -- is built once, by the first script graded, into a
+prepared pipeline.Reference. ExamContextCache keeps those References in
+memory across jobs, keyed by the exam (the model answer and question paper
+file hashes), so later scripts of the same exam only pay for their own side:
+the model answer isn't OCR'd, parsed or embedded again.
+
+A context expires EXAM_CONTEXT_TTL_SECONDS after it was last used; at most
+EXAM_CONTEXT_MAX are kept (least recently used dropped first).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+import result_store
+
+EXAM_CONTEXT_TTL_SECONDS = float(os.environ.get("EXAM_CONTEXT_TTL_SECONDS", "3600"))
+EXAM_CONTEXT_MAX = int(os.environ.get("EXAM_CONTEXT_MAX", "8"))
+
+
+def exam_key(model_path, question_path=None, model_hash=None, question_hash=None):
+    """The exam a model answer (+ question paper) belongs to; hashes are computed when not given."""
+    model_hash = model_hash or result_store.file_sha256(model_path)
+    if question_path and not question_hash:
+        question_hash = result_store.file_sha256(question_path)
+    return result_store.exam_id_for(model_hash, question_hash)
+
+
+class ExamContextCache:
+    """TTL + LRU cache of prepared References (see module docstring)."""
+
+    def __init__(self, ttl=EXAM_CONTEXT_TTL_SECONDS, max_contexts=EXAM_CONTEXT_MAX):
+        self.ttl = ttl
+        self.max_contexts = max_contexts
+        self._items = OrderedDict()   # key -> (reference, last used)
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for key in [k for k, (_, used) in self._items.items() if now - used > self.ttl]:
+            del self._items[key]
+            metrics.count("exam_context_expired_total")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            item = self._items.get(key)
+            if item is None:
+                metrics.count("exam_context_misses_total")
+                return None
+            self._items[key] = (item[0], now)
+            self._items.move_to_end(key)
+        metrics.count("exam_context_hits_total")
+        return item[0]
+
+    def put(self, key, reference):
+        if self.max_contexts <= 0:
+            return
+        with self._lock:
+            self._items[key] = (reference, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_contexts:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+CONTEXTS = ExamContextCache()
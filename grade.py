@@ -0,0 +1,253 @@
+"""
+Batch grader: runs the full pipeline for many students without the web server.
+
+    python grade.py --model model.pdf --questions qp.pdf --students "scripts/*.pdf" --out results/
+    python grade.py --model model.pdf --students scripts/ --jobs 4
+
+The model answer and question paper are OCR'd and parsed once, and the model
+side of scoring (concepts, embeddings, spelling index) computed once. Each student
+then goes through OCR -> parse_exam_file -> clean_text/correct_spelling ->
+evaluate_exam. Writes <out>/<student>.json per student and <out>/summary.csv,
+and with --db also stores every result in a result_store database.
+
+Parallelism:
+  --jobs N     students graded concurrently (forked processes sharing the loaded
+               model and the prepared reference; serial where fork is unavailable)
+  --workers N  questions scored in parallel within one student (single job only)
+
+Memory: LOW_MEMORY=1 or MEMORY_CEILING_MB=<MB> bound each process's RSS for
+very large booklets (see low_memory.py); more --jobs then fit on one box.
+
+Models: with INFERENCE_SOCKET set to a running inference_daemon.py, nothing is
+loaded here; encoding and EasyOCR go to the daemon.
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import low_memory
+import metrics
+import pipeline
+import result_store
+
+STUDENT_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp",
+                      ".zip", ".tar", ".tgz", ".tar.gz")
+
+# Scorer and reference inherited by forked student workers
+_JOB_CONTEXT = None
+
+
+def find_students(spec):
+    """
+    Student files from a directory, a glob pattern or a single file path (sorted).
+    Inside a students directory, each subdirectory of page images is one student.
+    """
+    if os.path.isdir(spec):
+        paths = [os.path.join(spec, name) for name in os.listdir(spec)]
+        booklets = [p for p in paths if os.path.isdir(p) and not os.path.basename(p).startswith(".")]
+    elif os.path.isfile(spec):
+        paths, booklets = [spec], []
+    else:
+        paths, booklets = glob.glob(spec), []
+    return sorted([p for p in paths if os.path.isfile(p) and p.lower().endswith(STUDENT_EXTENSIONS)] + booklets)
+
+
+def student_id(path):
+    name = os.path.basename(os.path.normpath(path))
+    if name.lower().endswith(".tar.gz"):
+        return name[:-7]
+    return os.path.splitext(name)[0]
+
+
+def unique_student_ids(paths):
+    """
+    {path: student id}. Students whose ids collide (the same file name in
+    different folders) are told apart by their path below the folders'
+    common parent ("a__s1", "b__s1"); any ids still equal get a -2, -3 suffix.
+    """
+    ids = {p: student_id(p) for p in paths}
+    counts = Counter(ids.values())
+    clashing = [p for p in paths if counts[ids[p]] > 1]
+    if clashing:
+        root = os.path.commonpath([os.path.abspath(p) for p in clashing])
+        for p in clashing:
+            rel = os.path.relpath(os.path.abspath(p), root)
+            ids[p] = os.path.join(os.path.dirname(rel), student_id(rel)).replace(os.sep, "__")
+    seen = Counter()
+    for p in paths:
+        seen[ids[p]] += 1
+        if seen[ids[p]] > 1:
+            ids[p] = f"{ids[p]}-{seen[ids[p]]}"
+    return ids
+
+
+def grade_one(scorer, path, reference, workers):
+    """Grades one student; never raises, failures are returned as a record."""
+    sid = student_id(path)
+    start = time.time()
+    profile = metrics.start_job(sid, track_rss=low_memory.track_rss())
+    artifacts = {}
+    try:
+        exam = pipeline.grade_student(scorer, path, reference, workers=workers, artifacts=artifacts)
+        error = None
+    except pipeline.PipelineError as e:
+        exam, error = None, str(e)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        exam, error = None, f"An error occurred during evaluation: {e}"
+    finally:
+        metrics.end_job()
+    return {
+        "student": sid,
+        "file": path,
+        "seconds": round(time.time() - start, 2),
+        "error": error,
+        "exam": exam,
+        "profile": profile.to_dict(),
+        "artifacts": artifacts,
+    }
+
+
+def _init_job_worker():
+    # N students in parallel: keep each one to a single intra-op thread
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _grade_in_worker(path):
+    scorer, reference = _JOB_CONTEXT
+    return grade_one(scorer, path, reference, workers=1)
+
+
+def grade_all(scorer, paths, reference, jobs=1, workers=1):
+    """Yields one record per student, in input order."""
+    global _JOB_CONTEXT
+    if jobs <= 1 or len(paths) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for path in paths:
+            yield grade_one(scorer, path, reference, workers)
+        return
+
+    _JOB_CONTEXT = (scorer, reference)
+    try:
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths)), mp_context=ctx,
+                                 initializer=_init_job_worker) as pool:
+            for record in pool.map(_grade_in_worker, paths):
+                yield record
+    finally:
+        _JOB_CONTEXT = None
+
+
+def store_record(store, record, exam_id, model_hash, question_hash):
+    """Persists one graded student (written from the parent process only)."""
+    job_id = uuid.uuid4().hex
+    store.start_job(job_id, student_id=record["student"], exam_id=exam_id, model_hash=model_hash,
+                    student_hash=result_store.file_sha256(record["file"]), question_hash=question_hash)
+    artifacts = record.get("artifacts") or {}
+    store.save_documents(job_id, artifacts.get("ocr"), artifacts.get("segments"), artifacts.get("ocr_noise"))
+    if record["error"]:
+        store.fail_job(job_id, record["error"])
+    else:
+        store.finish_job(job_id, record["exam"], artifacts.get("q_schema"))
+    return job_id
+
+
+def write_student_json(out_dir, record):
+    path = os.path.join(out_dir, record["student"] + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2, default=str)
+    return path
+
+
+def write_summary(out_dir, records, question_keys):
+    """
+    summary.csv: one row per student with total, max and per-question scores
+    (rows are matched to columns by their unannotated question id).
+    """
+    path = os.path.join(out_dir, "summary.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["student", "file", "status", "total_score", "max_score", "seconds"]
+                        + [f"Q{k}" for k in question_keys] + ["error"])
+        for r in records:
+            exam = r["exam"] or {}
+            scores = {result_store.breakdown_question(b): b.get("score") for b in exam.get("breakdown", [])}
+            writer.writerow([r["student"], r["file"], "error" if r["error"] else "ok",
+                             exam.get("total_score", ""), exam.get("max_score", ""), r["seconds"]]
+                            + [scores.get(str(k), "") for k in question_keys] + [r["error"] or ""])
+    return path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Grade a batch of answer scripts without the web server")
+    ap.add_argument("--model", required=True, help="model answer file")
+    ap.add_argument("--questions", help="question paper file (optional)")
+    ap.add_argument("--students", required=True, help="directory, glob pattern or single file")
+    ap.add_argument("--out", default="grading_results", help="output directory")
+    ap.add_argument("--jobs", type=int, default=1, help="students graded in parallel")
+    ap.add_argument("--workers", type=int, default=1, help="questions scored in parallel per student")
+    ap.add_argument("--db", help="also store results in this result_store SQLite database")
+    ap.add_argument("--exam-id", help="exam id for stored results (default: derived from the file hashes)")
+    args = ap.parse_args(argv)
+
+    paths = find_students(args.students)
+    if not paths:
+        print(f"[Grade] No student files match {args.students!r}")
+        return 2
+    os.makedirs(args.out, exist_ok=True)
+
+    from scoring import SemanticScorer
+    scorer = SemanticScorer()
+
+    start = time.time()
+    try:
+        # Model side prepared once (parsed, embedded) and inherited by forked workers
+        reference = pipeline.load_exam(scorer, args.model, args.questions)
+    except pipeline.PipelineError as e:
+        print(f"[Grade] {e}")
+        return 2
+    print(f"[Grade] Reference ready: {len(reference.model_segments)} questions, "
+          f"{len(paths)} students, jobs={args.jobs}")
+
+    store = None
+    if args.db:
+        store = result_store.ResultStore(args.db)
+        model_hash = result_store.file_sha256(args.model)
+        question_hash = result_store.file_sha256(args.questions) if args.questions else None
+        exam_id = args.exam_id or result_store.exam_id_for(model_hash, question_hash)
+
+    ids = unique_student_ids(paths)
+    records = []
+    for record in grade_all(scorer, paths, reference, jobs=args.jobs, workers=args.workers):
+        record["student"] = ids[record["file"]]
+        write_student_json(args.out, record)
+        if store is not None:
+            record["job_id"] = store_record(store, record, exam_id, model_hash, question_hash)
+        records.append(record)
+        if record["error"]:
+            print(f"[Grade] {record['student']}: ERROR {record['error']}")
+        else:
+            print(f"[Grade] {record['student']}: {record['exam']['total_score']} / "
+                  f"{record['exam']['max_score']} ({record['seconds']}s)")
+
+    records.sort(key=lambda r: r["student"])
+    summary = write_summary(args.out, records, list(reference.model_segments.keys()))
+    failed = sum(1 for r in records if r["error"])
+    print(f"[Grade] {len(records)} students in {time.time()-start:.1f}s, {failed} failed. Summary: {summary}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+"""
+Local inference daemon: one process holds the sentence model and the EasyOCR
+reader and serves them to every grading process on the machine over a Unix
+socket.
+
+    python inference_daemon.py --socket /run/answersheet/inference.sock
+    INFERENCE_SOCKET=/run/answersheet/inference.sock python grade.py ...
+    INFERENCE_SOCKET=/run/answersheet/inference.sock python serve.py --workers 4
+
+With INFERENCE_SOCKET set and the daemon answering, scoring.get_model() and
+ocr_service.get_reader() / get_batched_reader() return thin stubs
+(RemoteEncoder, RemoteReader) instead of loading the models, so a CLI run or
+a web worker starts without the multi-second load and without its own copy
+of the weights. If the daemon doesn't answer, they load the models
+in-process as before.
+
+The daemon serves two requests:
+
+  * encode(texts)  -> one embedding row per text (float32), what
+                      SentenceTransformer.encode returns in-process
+  * ocr(pages)     -> EasyOCR's recognized lines [(box, text, conf)] per page,
+                      as BatchedReader.readtext_items; an optional deadline
+                      is passed as seconds left and Preempted comes back as
+                      Preempted
+
+Requests of one kind from all connected clients are coalesced: a batch
+thread per model takes what is queued, waits up to COALESCE_SECONDS for more
+(up to MAX_ENCODE_TEXTS texts / MAX_OCR_PAGES pages), runs one encode() or
+one batched EasyOCR pass over all of it and hands each client its share.
+While a batch runs the next one queues up, so under load batches grow
+without any waiting. Coalesced embeddings equal the per-client ones up to
+float rounding (the model pads each internal batch to its longest text).
+An OCR batch runs against its earliest deadline; if that preempts it, the
+requests are rerun one by one against their own deadlines.
+
+Wire format (both directions): 8-byte header (JSON length, payload length),
+a JSON object, then the raw bytes of the arrays it describes -- pages and
+embeddings are never pickled. The socket is created mode 0600.
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from easyocr_batch import Preempted, group_page
+
+# Socket of a running daemon; unset = models are loaded in-process
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET") or None
+# How long a batch waits for more requests to join it (seconds)
+COALESCE_SECONDS = float(os.environ.get("INFERENCE_COALESCE_MS", "5")) / 1000.0
+# Batch size at which a batch stops waiting for more requests
+MAX_ENCODE_TEXTS = 256
+MAX_OCR_PAGES = 16
+# Seconds a client waits to connect before falling back to in-process models
+CONNECT_TIMEOUT_SECONDS = 2.0
+
+_FRAME = struct.Struct("!II")
+
+
+def _to_json(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()  # numpy scalars and arrays (EasyOCR boxes)
+    raise TypeError(f"not JSON serializable: {type(value).__name__}")
+
+
+def _send(sock, header, arrays=()):
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    head = json.dumps(dict(header, arrays=[[a.dtype.str, list(a.shape)] for a in arrays]),
+                      default=_to_json).encode("utf-8")
+    sock.sendall(_FRAME.pack(len(head), sum(a.nbytes for a in arrays)) + head)
+    for a in arrays:
+        if a.nbytes:
+            sock.sendall(memoryview(a).cast("B"))
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if not k:
+            raise ConnectionError("inference socket closed")
+        got += k
+    return buf
+
+
+def _recv(sock):
+    head_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, head_len))
+    payload = _recv_exact(sock, payload_len)
+    arrays, offset = [], 0
+    for dtype, shape in header.pop("arrays", []):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if count:
+            a = np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape)
+        else:
+            a = np.empty(shape, dtype=dtype)
+        offset += a.nbytes
+        arrays.append(a)
+    return header, arrays
+
+
+# ---------------------------------------------------------------- daemon side
+
+class _Request:
+    __slots__ = ("items", "deadline", "done", "result", "error")
+
+    def __init__(self, items, deadline):
+        self.items = items
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """
+    Requests for one model from all connections, run together by one thread.
+    run(items, deadline) must return one result per item, in order.
+    """
+
+    def __init__(self, name, run, max_items):
+        self.name = name
+        self._run = run
+        self.max_items = max_items
+        self.batches = self.requests = self.items = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, name=f"inference-{name}", daemon=True).start()
+
+    def submit(self, items, deadline=None):
+        req = _Request(list(items), deadline)
+        self._queue.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].items)
+            until = time.monotonic() + COALESCE_SECONDS
+            while size < self.max_items:
+                try:
+                    req = self._queue.get(timeout=max(0.0, until - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(req)
+                size += len(req.items)
+            self._execute(batch)
+
+    def _execute(self, batch):
+        items = [item for req in batch for item in req.items]
+        deadlines = [req.deadline for req in batch if req.deadline is not None]
+        try:
+            results = self._run(items, min(deadlines) if deadlines else None)
+        except Preempted as e:
+            if len(batch) > 1:
+                # Only the earliest deadline is known to have passed
+                for req in batch:
+                    self._execute([req])
+                return
+            results, batch[0].error = None, e
+        except Exception as e:
+            print(f"[Inference] {self.name} batch of {len(items)} failed: {e!r}")
+            results = None
+            for req in batch:
+                req.error = e
+        self.batches += 1
+        self.requests += len(batch)
+        self.items += len(items)
+        offset = 0
+        for req in batch:
+            if results is not None:
+                req.result = results[offset:offset + len(req.items)]
+            offset += len(req.items)
+            req.done.set()
+
+    def stats(self):
+        return {"batches": self.batches, "requests": self.requests, "items": self.items}
+
+
+class InferenceService:
+    """The models a daemon serves; either may be None (that request is then refused)."""
+
+    def __init__(self, encoder=None, reader=None):
+        self.dimension = None
+        self.encoder = self.ocr = None
+        if encoder is not None:
+            self.dimension = int(np.asarray(encoder.encode(["dimension probe"])).shape[-1])
+            self.encoder = Coalescer(
+                "encode", lambda texts, deadline: np.asarray(encoder.encode(texts, convert_to_numpy=True),
+                                                             dtype=np.float32),
+                MAX_ENCODE_TEXTS)
+        if reader is not None:
+            self.ocr = Coalescer("ocr", lambda pages, deadline: reader.readtext_items(pages, deadline=deadline),
+                                 MAX_OCR_PAGES)
+
+    def info(self):
+        return {"pid": os.getpid(), "encoder": self.encoder is not None, "dimension": self.dimension,
+                "ocr": self.ocr is not None,
+                "stats": {c.name: c.stats() for c in (self.encoder, self.ocr) if c is not None}}
+
+    def handle(self, header, arrays):
+        """One request -> (reply header, reply arrays)."""
+        op = header.get("op")
+        if op == "ping":
+            return dict(self.info(), ok=True), []
+        if op == "encode" and self.encoder is not None:
+            return {"ok": True}, [self.encoder.submit(header["texts"])]
+        if op == "ocr" and self.ocr is not None:
+            timeout = header.get("timeout")
+            deadline = None if timeout is None else time.monotonic() + timeout
+            return {"ok": True, "pages": self.ocr.submit(arrays, deadline)}, []
+        return {"ok": False, "error": "unsupported", "message": f"{op!r} is not served here"}, []
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                header, arrays = _recv(self.request)
+            except (ConnectionError, struct.error, ValueError):
+                return
+            try:
+                reply, out = service.handle(header, arrays)
+            except Preempted as e:
+                reply, out = {"ok": False, "error": "preempted", "message": str(e)}, []
+            except Exception as e:
+                reply, out = {"ok": False, "error": "failed", "message": repr(e)}, []
+            try:
+                _send(self.request, reply, out)
+            except OSError:
+                return
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(path, service):
+    """Unix socket server for `service` at `path` (a stale socket file is replaced)."""
+    if os.path.exists(path):
+        if connect(path, quiet=True) is not None:
+            raise RuntimeError(f"an inference daemon is already listening on {path}")
+        os.unlink(path)
+    old_umask = os.umask(0o177)
+    try:
+        server = _Server(path, _Handler)
+    finally:
+        os.umask(old_umask)
+    os.chmod(path, 0o600)
+    server.service = service
+    return server
+
+
+# ---------------------------------------------------------------- client side
+
+class InferenceClient:
+    """Connection to the daemon: one socket per thread, reconnected on failure."""
+
+    def __init__(self, path):
+        self.path = path
+        self.info = {}
+        self._local = threading.local()
+        # A forked child (serve.py workers, grade.py --jobs) opens its own sockets
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        self._local = threading.local()
+
+    def _socket(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(None)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, header, arrays=()):
+        """Send one request, return (reply header, reply arrays). Requests are idempotent,
+        so one that fails on a dropped connection is sent once more on a new one."""
+        for attempt in range(2):
+            try:
+                sock = self._socket()
+                _send(sock, header, arrays)
+                reply, out = _recv(sock)
+                break
+            except OSError:
+                self._drop()
+                if attempt:
+                    raise
+        if not reply.get("ok"):
+            if reply.get("error") == "preempted":
+                raise Preempted(reply.get("message", ""))
+            raise RuntimeError(f"inference daemon: {reply.get('message')}")
+        return reply, out
+
+
+class RemoteEncoder:
+    """Stand-in for the SentenceTransformer: encode() runs in the daemon."""
+
+    def __init__(self, client):
+        self._client = client
+        self.dimension = client.info.get("dimension") or 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, convert_to_tensor=False, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if texts:
+            _, (out,) = self._client.call({"op": "encode", "texts": texts})
+        else:
+            out = np.zeros((0, self.dimension), dtype=np.float32)
+        if normalize_embeddings:
+            out = out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        if single:
+            out = out[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(out)
+        return out
+
+
+class RemoteReader:
+    """Stand-in for the EasyOCR reader and BatchedReader: recognition runs in the daemon."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def readtext_items(self, pages, deadline=None):
+        header = {"op": "ocr"}
+        if deadline is not None:
+            header["timeout"] = deadline - time.monotonic()
+        reply, _ = self._client.call(header, [np.asarray(p) for p in pages])
+        return [[(box, text, conf) for box, text, conf in items] for items in reply["pages"]]
+
+    def readtext_pages(self, pages, paragraph=True):
+        return [group_page(items, paragraph)[0] for items in self.readtext_items(pages)]
+
+    def readtext(self, image, detail=1, paragraph=False):
+        items = self.readtext_items([image])[0]
+        if paragraph:
+            return group_page(items, True)[0]
+        return items if detail else [text for _, text, _ in items]
+
+
+def connect(path, quiet=False):
+    """InferenceClient for the daemon at `path`, or None if it doesn't answer."""
+    client = InferenceClient(path)
+    try:
+        client.info, _ = client.call({"op": "ping"})
+    except (OSError, RuntimeError) as e:
+        if not quiet:
+            print(f"[Inference] No daemon at {path} ({e}); loading models in-process")
+        return None
+    return client
+
+
+_CLIENT = None
+
+
+def client():
+    """The client of the INFERENCE_SOCKET daemon, or None (unset or not answering)."""
+    global _CLIENT
+    if _CLIENT is None and INFERENCE_SOCKET:
+        _CLIENT = connect(INFERENCE_SOCKET)
+    return _CLIENT
+
+
+def remote_encoder():
+    """RemoteEncoder if the daemon serves the sentence model, else None."""
+    c = client()
+    return RemoteEncoder(c) if c is not None and c.info.get("encoder") else None
+
+
+def remote_reader():
+    """RemoteReader if the daemon serves EasyOCR, else None."""
+    c = client()
+    return RemoteReader(c) if c is not None and c.info.get("ocr") else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the sentence model and EasyOCR to local grading processes")
+    default_socket = INFERENCE_SOCKET or os.path.join(os.path.expanduser("~"), ".answersheet-inference.sock")
+    ap.add_argument("--socket", default=default_socket,
+                    help="Unix socket path (default: INFERENCE_SOCKET or ~/.answersheet-inference.sock)")
+    ap.add_argument("--no-encoder", action="store_true", help="don't serve the sentence model")
+    ap.add_argument("--no-ocr", action="store_true", help="don't serve EasyOCR")
+    args = ap.parse_args()
+    if not hasattr(socket, "AF_UNIX"):
+        sys.exit("inference_daemon.py needs Unix sockets")
+
+    start = time.time()
+    encoder = reader = None
+    if not args.no_encoder:
+        import scoring
+        encoder = scoring.load_model()
+    if not args.no_ocr:
+        import ocr_service
+        from easyocr_batch import BatchedReader
+        reader = BatchedReader(ocr_service.load_reader(), detect_batch_size=ocr_service.EASYOCR_PAGE_BATCH,
+                               recog_batch_size=ocr_service.EASYOCR_RECOG_BATCH)
+    server = make_server(args.socket, InferenceService(encoder, reader))
+    print(f"[Inference] Models loaded in {time.time() - start:.1f}s; serving on {args.socket}")
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+        print("[Inference] Stopped")
+
+
+if __name__ == "__main__":
+    main()
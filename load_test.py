@@ -0,0 +1,154 @@
+"""
+Load test for a running server (serve.py or app.py): concurrent evaluations.
+
+Submits --requests evaluations at each --concurrency level, follows every job
+through its long-poll event endpoint until it is done or failed, and reports
+completed evaluations per minute and p50/p95 latency (submit -> done) per
+level. The scripts are synthetic one-page booklets (synthetic_sheets.py,
+fixed seed) unless --student/--model/--questions are given.
+
+Run:
+    python serve.py --workers 2 &
+    python load_test.py --url http://127.0.0.1:5000 --concurrency 1,2,4 --requests 8
+    python load_test.py --student s.pdf --model m.pdf --out load.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Longest a single evaluation is followed before it counts as failed (seconds)
+EVAL_TIMEOUT_SECONDS = 900
+
+
+def synthetic_files(out_dir, num_questions=3, seed=0):
+    """One-page student and model answer PNGs."""
+    from synthetic_sheets import build_exam, exam_text, render_pages
+    questions, _ = build_exam(num_questions, seed)
+    paths = {}
+    for name, handwriting in (("student", True), ("model", False)):
+        page = render_pages(exam_text(questions), seed=seed, handwriting=handwriting, red_ink=handwriting)[0]
+        paths[name] = os.path.join(out_dir, f"{name}.png")
+        page.save(paths[name])
+    return paths
+
+
+def _multipart(files, fields):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, path in files.items():
+        with open(path, "rb") as f:
+            data = f.read()
+        head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{os.path.basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n')
+        parts.append(head.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _get_json(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def evaluate_once(base_url, files, student_id):
+    """One evaluation end to end; returns (ok, seconds, detail)."""
+    body, content_type = _multipart(files, {"student_id": student_id})
+    start = time.perf_counter()
+    req = urllib.request.Request(f"{base_url}/evaluate", data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            job_id = json.loads(resp.read())["job_id"]
+        after, last = 0, None
+        while time.perf_counter() - start < EVAL_TIMEOUT_SECONDS:
+            page = _get_json(f"{base_url}/jobs/{job_id}/events/poll?after={after}&timeout=20", timeout=60)
+            if page["events"]:
+                after = page["events"][-1]["id"]
+                last = page["events"][-1]
+            if page["finished"]:
+                return last is not None and last["type"] == "done", time.perf_counter() - start, job_id
+        return False, time.perf_counter() - start, f"{job_id}: timed out"
+    except Exception as e:
+        return False, time.perf_counter() - start, repr(e)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_level(base_url, files, concurrency, requests):
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def one(_):
+        with lock:
+            n = next(counter)
+        return evaluate_once(base_url, files, f"load-{concurrency}-{n}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    latencies = [s for ok, s, _ in results if ok]
+    failures = [d for ok, _, d in results if not ok]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "completed": len(latencies),
+        "failed": len(failures),
+        "failures": failures[:5],
+        "wall_s": round(wall, 2),
+        "evals_per_min": round(60.0 * len(latencies) / wall, 2) if wall else 0.0,
+        "p50_s": round(_percentile(latencies, 0.5), 2),
+        "p95_s": round(_percentile(latencies, 0.95), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Concurrent-evaluation load test against a running server")
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--concurrency", default="1,2,4", help="comma list of concurrent clients")
+    ap.add_argument("--requests", type=int, default=8, help="evaluations per concurrency level")
+    ap.add_argument("--student", help="student answer file (default: synthetic page)")
+    ap.add_argument("--model", help="model answer file (default: synthetic page)")
+    ap.add_argument("--questions", help="question paper file (optional)")
+    ap.add_argument("--out", help="also write the results as JSON here")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.student and args.model:
+            files = {"student_file": args.student, "model_file": args.model}
+        else:
+            generated = synthetic_files(tmp)
+            files = {"student_file": generated["student"], "model_file": generated["model"]}
+        if args.questions:
+            files["question_file"] = args.questions
+
+        levels = []
+        print(f"{'concurrency':>11} {'done':>5} {'failed':>6} {'evals/min':>10} {'p50 s':>7} {'p95 s':>7}")
+        for c in [int(x) for x in args.concurrency.split(",")]:
+            r = run_level(args.url.rstrip("/"), files, c, args.requests)
+            levels.append(r)
+            print(f"{r['concurrency']:>11} {r['completed']:>5} {r['failed']:>6} {r['evals_per_min']:>10.2f} "
+                  f"{r['p50_s']:>7.2f} {r['p95_s']:>7.2f}")
+            for f in r["failures"]:
+                print(f"    failed: {f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"url": args.url, "files": {k: os.path.basename(v) for k, v in files.items()},
+                       "levels": levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
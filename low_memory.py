@@ -0,0 +1,131 @@
+"""
+Low-memory mode for very large booklets.
+
+A worker's RSS is the models (~1-2 GB) plus whatever the current job holds,
+and for a long booklet that used to grow with the document: several decoded
+and prepared pages per batch (plus the next batch being prepared ahead), the
+prepared-page caches, and the transcript built up with `text +=`. In
+low-memory mode extract_document instead
+
+  * streams one page at a time (one rasterized PDF page per poppler call,
+    no EasyOCR page batches, no preparation workers or lookahead) and drops
+    each decoded page as soon as it is prepared; the prepared page is kept
+    in greyscale (a third of the RGB page) and isn't cached,
+  * spills every page's text to a spool file on disk (TextSpool) and reads
+    the transcript back once at the end, instead of re-concatenating it,
+  * keeps no PageOCR (words, boxes, confidences) once a page is read: only
+    the document statistics scoring uses are folded into the OCRDocument
+    (OCRDocument.add_page(page, keep=False)),
+  * checks the process against MEMORY_CEILING_MB after every page and, over
+    it, empties the page caches and returns freed heap to the OS (relieve()).
+
+The mode is on with LOW_MEMORY=1, and switches itself on for a job that
+starts with the process already within CEILING_SWITCH_SHARE of the ceiling.
+Jobs in either case record the peak RSS of every timed stage in their
+profile (metrics.JobProfile, "peak_rss_mb").
+"""
+import ctypes
+import gc
+import os
+import tempfile
+
+import metrics
+
+LOW_MEMORY = os.environ.get("LOW_MEMORY", "0") == "1"
+# RSS ceiling of a worker process in MB; 0 = none
+MEMORY_CEILING_MB = float(os.environ.get("MEMORY_CEILING_MB", "0"))
+# A job starting above this share of the ceiling runs in low-memory mode
+CEILING_SWITCH_SHARE = 0.8
+# Where page texts are spilled (default: the system temp directory)
+SPOOL_DIR = os.environ.get("OCR_SPOOL_DIR") or None
+
+
+def rss_mb():
+    return metrics.current_rss_bytes() / 2 ** 20
+
+
+def enabled():
+    """Whether the job starting now should run in low-memory mode."""
+    if LOW_MEMORY:
+        return True
+    return bool(MEMORY_CEILING_MB) and rss_mb() >= MEMORY_CEILING_MB * CEILING_SWITCH_SHARE
+
+
+def track_rss():
+    """Whether job profiles should record peak RSS per stage."""
+    return LOW_MEMORY or bool(MEMORY_CEILING_MB)
+
+
+_free_callbacks = []
+
+
+def on_pressure(callback):
+    """Register a cache-emptying callback for relieve() (e.g. PageCache.clear)."""
+    _free_callbacks.append(callback)
+    return callback
+
+
+def _malloc_trim():
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass  # not glibc
+
+
+def relieve(where=""):
+    """
+    Over MEMORY_CEILING_MB: empty the registered caches and hand freed heap
+    back to the OS. Returns True if the ceiling was exceeded.
+    """
+    if not MEMORY_CEILING_MB:
+        return False
+    before = rss_mb()
+    if before < MEMORY_CEILING_MB:
+        return False
+    for callback in _free_callbacks:
+        callback()
+    gc.collect()
+    _malloc_trim()
+    after = rss_mb()
+    metrics.count("memory_ceiling_exceeded_total")
+    print(f"    [Memory] RSS {before:.0f} MB over the {MEMORY_CEILING_MB:.0f} MB ceiling {where}"
+          f"-- caches emptied, now {after:.0f} MB")
+    return True
+
+
+class TextSpool:
+    """
+    Page texts collected in order and joined once. With `spill` they are
+    written to an unnamed temp file as they arrive (nothing of the document's
+    text is held in memory until text() reads it back in one piece).
+    """
+
+    def __init__(self, spill=False):
+        self._parts = None if spill else []
+        self._file = tempfile.TemporaryFile("w+", encoding="utf-8", dir=SPOOL_DIR) if spill else None
+
+    def add(self, text):
+        if self._file is not None:
+            self._file.write(text)
+        else:
+            self._parts.append(text)
+
+    def text(self):
+        if self._file is None:
+            return "".join(self._parts)
+        self._file.flush()
+        self._file.seek(0)
+        return self._file.read()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
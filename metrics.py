@@ -0,0 +1,379 @@
+"""
+Lightweight pipeline instrumentation.
+
+Every timed stage is recorded twice:
+  * in the process-wide REGISTRY (cumulative counters + latency histogram per
+    stage), rendered in Prometheus text format by /metrics, and
+  * in the JobProfile bound to the current thread (if any), which keeps the
+    per-stage, per-page and per-question breakdown of one evaluation and is
+    served as JSON.
+
+Usage:
+    profile = metrics.start_job(job_id)        # in the job's worker thread
+    with metrics.timer("ocr.easyocr", page=3):
+        ...
+    metrics.record_encode(batch_size, tokens, seconds)
+    metrics.end_job()
+"""
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram buckets (seconds) shared by all stages
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Seconds between RSS samples while a job tracking RSS has a stage open
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Words and single punctuation marks, as BERT-style tokenizers pre-split text;
+# the encoder token counters use this instead of running the tokenizer again
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class StageStats:
+    """count / total / min / max for one timed stage."""
+
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 4),
+            "mean_s": round(self.total / self.count, 4) if self.count else 0.0,
+            "min_s": round(self.min or 0.0, 4),
+            "max_s": round(self.max, 4),
+        }
+
+
+class JobProfile:
+    """
+    Per-job timing breakdown (stage, page and question level) plus encoder
+    counters; with `track_rss`, also the peak RSS seen during each stage.
+    """
+
+    def __init__(self, job_id, track_rss=False):
+        self.job_id = job_id
+        self.track_rss = track_rss
+        self.rss = {}         # stage -> peak RSS bytes
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stages = {}      # stage -> StageStats
+        self.pages = {}       # page -> {stage: seconds}
+        self.questions = {}   # question -> {stage: seconds}
+        self.counters = {}    # name -> value
+        self.encode = {"calls": 0, "texts": 0, "tokens": 0, "max_batch": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, page=None, question=None):
+        with self._lock:
+            self.stages.setdefault(stage, StageStats()).add(seconds)
+            if page is not None:
+                per_page = self.pages.setdefault(str(page), {})
+                per_page[stage] = round(per_page.get(stage, 0.0) + seconds, 4)
+            if question is not None:
+                per_q = self.questions.setdefault(str(question), {})
+                per_q[stage] = round(per_q.get(stage, 0.0) + seconds, 4)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_rss(self, stage, peak):
+        with self._lock:
+            self.rss[stage] = max(self.rss.get(stage, 0), peak)
+
+    def record_encode(self, batch_size, tokens, seconds):
+        with self._lock:
+            self.encode["calls"] += 1
+            self.encode["texts"] += batch_size
+            self.encode["tokens"] += tokens
+            self.encode["max_batch"] = max(self.encode["max_batch"], batch_size)
+            self.encode["seconds"] += seconds
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            encode = dict(self.encode)
+            encode["seconds"] = round(encode["seconds"], 4)
+            return {
+                "job_id": self.job_id,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "total_s": round(end - self.started_at, 3),
+                "stages": {k: v.to_dict() for k, v in sorted(self.stages.items())},
+                "pages": dict(self.pages),
+                "questions": dict(self.questions),
+                "counters": dict(self.counters),
+                "encode": encode,
+                "peak_rss_mb": {k: round(v / 2 ** 20, 1) for k, v in sorted(self.rss.items())},
+            }
+
+
+class Registry:
+    """Process-wide cumulative metrics, rendered in Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_buckets = {}   # stage -> [count per bucket] (+Inf is the stage count)
+        self.stages = {}          # stage -> StageStats
+        self.counters = {}        # name -> value
+        self.gauges = {}          # name -> value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stages.setdefault(stage, StageStats()).add(seconds)
+            buckets = self.stage_buckets.setdefault(stage, [0] * len(HISTOGRAM_BUCKETS))
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            lines.append("# HELP answersheet_stage_seconds Time spent per pipeline stage.")
+            lines.append("# TYPE answersheet_stage_seconds histogram")
+            for stage in sorted(self.stages):
+                stats = self.stages[stage]
+                for bound, n in zip(HISTOGRAM_BUCKETS, self.stage_buckets[stage]):
+                    lines.append(f'answersheet_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+                lines.append(f'answersheet_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats.count}')
+                lines.append(f'answersheet_stage_seconds_sum{{stage="{stage}"}} {stats.total:.6f}')
+                lines.append(f'answersheet_stage_seconds_count{{stage="{stage}"}} {stats.count}')
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE answersheet_{name} counter")
+                lines.append(f"answersheet_{name} {self.counters[name]}")
+            for name in sorted(self.gauges):
+                lines.append(f"# TYPE answersheet_{name} gauge")
+                lines.append(f"answersheet_{name} {self.gauges[name]}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_local = threading.local()
+
+
+def start_job(job_id, track_rss=False):
+    """Create a JobProfile and bind it to the calling thread."""
+    profile = JobProfile(job_id, track_rss=track_rss)
+    _local.profile = profile
+    REGISTRY.inc("jobs_started_total")
+    return profile
+
+
+def end_job():
+    """Finish and unbind the current thread's JobProfile (returns it)."""
+    profile = current()
+    if profile is not None:
+        profile.finish()
+        _local.profile = None
+    return profile
+
+
+def current():
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def document(name):
+    """Prefix page labels recorded inside this block (e.g. "student:3", "model:1")."""
+    previous = getattr(_local, "document", None)
+    _local.document = name
+    try:
+        yield
+    finally:
+        _local.document = previous
+
+
+def current_document():
+    """Name set by the enclosing document() block, if any."""
+    return getattr(_local, "document", None)
+
+
+def record(stage, seconds, page=None, question=None):
+    REGISTRY.observe(stage, seconds)
+    profile = current()
+    if profile is not None:
+        doc = current_document()
+        if page is not None and doc:
+            page = f"{doc}:{page}"
+        profile.record(stage, seconds, page=page, question=question)
+
+
+@contextmanager
+def timer(stage, page=None, question=None):
+    profile = current()
+    watch = _RSS_SAMPLER.open() if profile is not None and profile.track_rss else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start, page=page, question=question)
+        if watch is not None:
+            profile.record_rss(stage, _RSS_SAMPLER.close(watch))
+
+
+def count(name, value=1):
+    REGISTRY.inc(name, value)
+    profile = current()
+    if profile is not None:
+        profile.count(name, value)
+
+
+def record_encode(batch_size, tokens, seconds):
+    REGISTRY.observe("encode", seconds)
+    REGISTRY.inc("encode_calls_total")
+    REGISTRY.inc("encode_texts_total", batch_size)
+    REGISTRY.inc("encode_tokens_total", tokens)
+    profile = current()
+    if profile is not None:
+        profile.record("encode", seconds)
+        profile.record_encode(batch_size, tokens, seconds)
+
+
+class InstrumentedEncoder:
+    """
+    Thin wrapper around a SentenceTransformer that records every encode() call
+    (count, batch size, estimated token count, latency). Everything else is delegated.
+    """
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, name):
+        if name == "_model":
+            raise AttributeError(name)
+        return getattr(self._model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self._model(*args, **kwargs)
+
+    def _count_tokens(self, texts):
+        # Estimate (pre-tokenized words, capped at the model's sequence length);
+        # sub-word splits aren't counted, so it is a lower bound
+        limit = getattr(self._model, "max_seq_length", None)
+        total = 0
+        for t in texts:
+            n = sum(1 for _ in _TOKEN_RE.finditer(t))
+            total += min(n, limit) if limit else n
+        return total
+
+    def encode(self, sentences, *args, **kwargs):
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        start = time.perf_counter()
+        out = self._model.encode(sentences, *args, **kwargs)
+        record_encode(len(texts), self._count_tokens(texts), time.perf_counter() - start)
+        return out
+
+
+def current_rss_bytes():
+    """Resident set size of this process (0 if it can't be determined)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class _RSSSampler:
+    """
+    One background thread sampling RSS for every open RSS-tracked stage
+    (timer); each watch keeps the highest value seen while it was open. The
+    thread only runs while some watch is open.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._watches = {}   # id -> [peak bytes]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def open(self):
+        watch = [current_rss_bytes()]
+        with self._lock:
+            self._watches[id(watch)] = watch
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return watch
+
+    def close(self, watch):
+        with self._lock:
+            del self._watches[id(watch)]
+        return max(watch[0], current_rss_bytes())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._watches:
+                    self._thread = None
+                    return
+                watches = list(self._watches.values())
+            rss = current_rss_bytes()
+            for watch in watches:
+                watch[0] = max(watch[0], rss)
+            time.sleep(self.interval)
+
+
+_RSS_SAMPLER = _RSSSampler()
+
+
+class PeakRSS:
+    """
+    Context manager sampling RSS in a background thread; `.peak` holds the
+    highest RSS (bytes) seen while the block ran.
+        with metrics.PeakRSS() as mem: ...
+        print(mem.peak / 2**20)
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+        return False
@@ -0,0 +1,178 @@
+"""
+Line-level merge of the EasyOCR and Tesseract results of one page.
+
+When both engines read a page about equally well, ocr_page_dual_engine used to
+return the two transcripts one after the other. That doubled the page's text
+(and the parsing, spelling correction and embedding work behind it) and
+repeated every question marker. merge_pages builds one transcript instead:
+
+  * with word boxes, every EasyOCR line box is paired with the Tesseract line
+    its vertical centre falls in (EasyOCR often splits one written line into
+    several boxes, Tesseract returns it whole)
+  * without boxes, the two line sequences are aligned by text similarity
+    (align_lines, a weighted longest-common-subsequence over lines), and
+    unaligned EasyOCR fragments join the nearby line that contains them
+
+For every aligned pair the side with more confidently readable words is kept;
+lines only one engine found are kept as they are.
+"""
+import difflib
+import re
+
+import numpy as np
+
+from ocr_result import EASYOCR, TESSERACT, PageOCR
+
+# Lines less similar than this are never aligned with each other (sequence alignment)
+MIN_LINE_SIMILARITY = 0.5
+# Aligned rows on either side searched for the line an unaligned fragment belongs to
+FRAGMENT_WINDOW = 3
+
+_READABLE = re.compile(r"[a-zA-Z]{3,}")
+
+
+class _Line:
+    __slots__ = ("idx", "engine", "text", "score", "x0", "y0", "x1", "y1")
+
+    def __init__(self, page, idx, word_scores):
+        self.idx = idx
+        self.engine = int(page.engine[idx[0]])
+        self.text = " ".join(page.word(i) for i in idx)
+        self.score = float(word_scores[idx].sum())
+        b = page.boxes[idx]
+        self.x0, self.y0 = int(b[:, 0].min()), int(b[:, 1].min())
+        self.x1, self.y1 = int(b[:, 2].max()), int(b[:, 3].max())
+
+
+def _lines(page):
+    """Lines of a page in the engines' own order, each with its readable-word score."""
+    word_scores = np.array([len(_READABLE.findall(page.word(i))) for i in range(len(page))],
+                           dtype=np.float32) * page.conf
+    ids, first = np.unique(page.line, return_index=True)
+    return [_Line(page, np.flatnonzero(page.line == line_id), word_scores)
+            for line_id in ids[np.argsort(first)]]
+
+
+def _similarity(a, b):
+    m = difflib.SequenceMatcher(None, a.lower(), b.lower())
+    if m.real_quick_ratio() < MIN_LINE_SIMILARITY or m.quick_ratio() < MIN_LINE_SIMILARITY:
+        return 0.0
+    return m.ratio()
+
+
+def align_lines(a, b, similarity=_similarity, min_similarity=MIN_LINE_SIMILARITY):
+    """
+    Order-preserving alignment of two lists of line texts.
+    Returns [(i, j)] covering every line once; i or j is None for a line
+    that has no counterpart on the other side.
+    """
+    n, m = len(a), len(b)
+    sim = np.zeros((n, m))
+    for i in range(n):
+        for j in range(m):
+            s = similarity(a[i], b[j])
+            sim[i, j] = s if s >= min_similarity else 0.0
+    best = np.zeros((n + 1, m + 1))
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            best[i, j] = max(best[i - 1, j], best[i, j - 1],
+                             best[i - 1, j - 1] + sim[i - 1, j - 1] if sim[i - 1, j - 1] else 0.0)
+
+    pairs = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and sim[i - 1, j - 1] and best[i, j] == best[i - 1, j - 1] + sim[i - 1, j - 1]:
+            pairs.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif i > 0 and (j == 0 or best[i, j] == best[i - 1, j]):
+            pairs.append((i - 1, None))
+            i -= 1
+        else:
+            pairs.append((None, j - 1))
+            j -= 1
+    pairs.reverse()
+    return pairs
+
+
+def _better(easy_lines, tess_lines):
+    # Tesseract wins ties: its lines are whole, EasyOCR's may be fragments
+    return easy_lines if sum(l.score for l in easy_lines) > sum(l.score for l in tess_lines) else tess_lines
+
+
+def _rows_by_position(easy_lines, tess_lines):
+    groups = {id(t): [] for t in tess_lines}
+    rows = []
+    for e in easy_lines:
+        cy = (e.y0 + e.y1) / 2
+        best, best_overlap = None, 0
+        for t in tess_lines:
+            if t.y0 <= cy <= t.y1 and e.x0 < t.x1 and t.x0 < e.x1:
+                overlap = min(e.y1, t.y1) - max(e.y0, t.y0)
+                if overlap > best_overlap:
+                    best, best_overlap = t, overlap
+        if best is None:
+            rows.append([e])
+        else:
+            groups[id(best)].append(e)
+    for t in tess_lines:
+        group = groups[id(t)]
+        rows.append(_better(sorted(group, key=lambda l: l.x0), [t]) if group else [t])
+    # Reading order: top to bottom, then left to right
+    rows.sort(key=lambda row: ((row[0].y0 + row[0].y1) / 2, row[0].x0))
+    return rows
+
+
+def _contained(fragment, line):
+    """Share of `fragment`'s characters found, in order, in `line`."""
+    m = difflib.SequenceMatcher(None, fragment.lower(), line.lower())
+    return sum(b.size for b in m.get_matching_blocks()) / max(len(fragment), 1)
+
+
+def _rows_by_sequence(easy_lines, tess_lines):
+    groups = [([easy_lines[i]] if i is not None else [], [tess_lines[j]] if j is not None else [])
+              for i, j in align_lines([l.text for l in easy_lines], [l.text for l in tess_lines])]
+
+    # An EasyOCR fragment of a longer line doesn't align on its own; it joins
+    # the nearby Tesseract line that contains it instead of being repeated
+    for k, (easy, tess) in enumerate(groups):
+        if tess or not easy:
+            continue
+        nearby = [c for c in range(max(0, k - FRAGMENT_WINDOW), min(len(groups), k + FRAGMENT_WINDOW + 1))
+                  if groups[c][1]]
+        scored = [(_contained(easy[0].text, groups[c][1][0].text), c) for c in nearby]
+        if scored:
+            share, c = max(scored)
+            if share >= MIN_LINE_SIMILARITY:
+                groups[c][0].append(easy.pop())
+
+    rows = []
+    for easy, tess in groups:
+        if easy and tess:
+            rows.append(_better(sorted(easy, key=lambda l: l.idx[0]), tess))
+        elif easy or tess:
+            rows.append(easy or tess)
+    return rows
+
+
+def _has_boxes(lines):
+    return any(l.x1 > l.x0 or l.y1 > l.y0 for l in lines)
+
+
+def merge_pages(easy, tess, page=None):
+    """
+    One PageOCR from the EasyOCR and Tesseract results of the same page,
+    keeping the better reading of every line. Its text has one line per row.
+    """
+    both = PageOCR.concat([easy, tess], page=page)
+    lines = _lines(both) if len(both) else []
+    easy_lines = [l for l in lines if l.engine == EASYOCR]
+    tess_lines = [l for l in lines if l.engine == TESSERACT]
+
+    if _has_boxes(easy_lines) and _has_boxes(tess_lines):
+        rows = _rows_by_position(easy_lines, tess_lines)
+    else:
+        rows = _rows_by_sequence(easy_lines, tess_lines)
+
+    indices = [i for row in rows for line in row for i in line.idx]
+    text = "\n".join(" ".join(line.text for line in row) for row in rows)
+    return both.select(indices, text=text, page=page)
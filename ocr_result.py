@@ -0,0 +1,242 @@
+"""
+Structured OCR output: the words of each page with their boxes, confidences,
+engine of origin and line / paragraph grouping.
+
+extract_text_from_file() keeps returning the flat text the parser works on;
+extract_document() returns an OCRDocument that carries the same text plus one
+PageOCR per page. A PageOCR stores its words column-wise in numpy arrays (the
+word strings as one joined string plus offsets) instead of a dict per word, so
+a long script adds a few bytes per word rather than a few hundred.
+
+Confidences are normalized to 0..1 for both engines (Tesseract reports 0..100,
+EasyOCR one value per detected line, shared by the words of that line).
+"""
+import os
+import re
+
+import numpy as np
+
+ENGINES = ("easyocr", "tesseract")
+EASYOCR, TESSERACT = 0, 1
+
+# Words read with less confidence than this are treated as unreliable
+LOW_CONFIDENCE = float(os.environ.get("OCR_LOW_CONFIDENCE", "0.3"))
+
+_READABLE = re.compile(r"[a-zA-Z]{3,}")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_token(word):
+    """Lower-cased word without punctuation, as used to match OCR words to segment text."""
+    return _NON_WORD.sub("", word).lower()
+
+
+def _column(values, n, dtype, fill):
+    if values is None:
+        return np.full(n, fill, dtype=dtype)
+    return np.asarray(values, dtype=dtype).reshape(n)
+
+
+class PageOCR:
+    """
+    The words of one page. Per-word columns (all of length len(page)):
+      boxes  int32 (n, 4)  x0, y0, x1, y1 in page pixels
+      conf   float32       0..1
+      engine uint8         index into ENGINES
+      line   int32         line id, unique within the page
+      block  int32         paragraph id, unique within the page
+    `text` is the page text exactly as the chosen engine(s) produced it.
+    """
+    __slots__ = ("page", "text", "_chars", "_offsets", "boxes", "conf", "engine", "line", "block")
+
+    def __init__(self, words=(), boxes=None, conf=None, engine=None, line=None, block=None, text="", page=None):
+        words = list(words)
+        n = len(words)
+        self._chars = "".join(words)
+        self._offsets = np.zeros(n + 1, dtype=np.int32)
+        if n:
+            np.cumsum([len(w) for w in words], out=self._offsets[1:])
+        self.boxes = np.zeros((n, 4), dtype=np.int32) if boxes is None else np.asarray(boxes, dtype=np.int32).reshape(n, 4)
+        self.conf = _column(conf, n, np.float32, 1.0)
+        self.engine = _column(engine, n, np.uint8, EASYOCR)
+        self.line = _column(line, n, np.int32, 0)
+        self.block = _column(block, n, np.int32, 0)
+        self.text = text
+        self.page = page
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def word(self, i):
+        return self._chars[self._offsets[i]:self._offsets[i + 1]]
+
+    def words(self):
+        return [self.word(i) for i in range(len(self))]
+
+    @classmethod
+    def from_tesseract_tsv(cls, tsv, text="", page=None):
+        """Word rows (level 5) of Tesseract's TSV output (GetTSVText / image_to_data)."""
+        words, boxes, conf, lines, blocks = [], [], [], [], []
+        line_ids, block_ids = {}, {}
+        for row in tsv.splitlines():
+            cols = row.split("\t")
+            if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+                continue
+            block_num, par_num, line_num = cols[2], cols[3], cols[4]
+            left, top, width, height = (int(c) for c in cols[6:10])
+            words.append(cols[11])
+            boxes.append((left, top, left + width, top + height))
+            conf.append(max(float(cols[10]), 0.0) / 100.0)
+            blocks.append(block_ids.setdefault((block_num, par_num), len(block_ids)))
+            lines.append(line_ids.setdefault((block_num, par_num, line_num), len(line_ids)))
+        return cls(words, boxes, conf, [TESSERACT] * len(words), lines, blocks, text=text, page=page)
+
+    @classmethod
+    def from_easyocr(cls, items, block_ids=None, text="", page=None):
+        """
+        EasyOCR's recognized lines [(box points, text, confidence)] split into words.
+        A word's box is its share of the line box by character position.
+        """
+        words, boxes, conf, lines, blocks = [], [], [], [], []
+        for line_id, (box, line_text, line_conf) in enumerate(items):
+            xs = [int(p[0]) for p in box]
+            ys = [int(p[1]) for p in box]
+            x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+            per_char = (x1 - x0) / max(len(line_text), 1)
+            for m in re.finditer(r"\S+", line_text):
+                words.append(m.group())
+                boxes.append((x0 + int(m.start() * per_char), y0, x0 + int(m.end() * per_char), y1))
+                conf.append(float(line_conf))
+                lines.append(line_id)
+                blocks.append(block_ids[line_id] if block_ids is not None else line_id)
+        return cls(words, boxes, conf, [EASYOCR] * len(words), lines, blocks, text=text, page=page)
+
+    @classmethod
+    def concat(cls, parts, text="", page=None):
+        """One page from several results (e.g. both engines); line/block ids are kept apart."""
+        words, boxes, conf, engine, lines, blocks = [], [], [], [], [], []
+        line_base = block_base = 0
+        for p in parts:
+            words.extend(p.words())
+            boxes.append(p.boxes)
+            conf.append(p.conf)
+            engine.append(p.engine)
+            lines.append(p.line + line_base)
+            blocks.append(p.block + block_base)
+            if len(p):
+                line_base += int(p.line.max()) + 1
+                block_base += int(p.block.max()) + 1
+        if not words:
+            return cls(text=text, page=page)
+        return cls(words, np.concatenate(boxes), np.concatenate(conf), np.concatenate(engine),
+                   np.concatenate(lines), np.concatenate(blocks), text=text, page=page)
+
+    def select(self, indices, text="", page=None):
+        """A new PageOCR with the words at `indices`, in that order (ids are kept)."""
+        idx = np.asarray(indices, dtype=np.int64)
+        return PageOCR([self.word(i) for i in idx], self.boxes[idx], self.conf[idx], self.engine[idx],
+                       self.line[idx], self.block[idx], text=text, page=self.page if page is None else page)
+
+    def lines(self):
+        """[(line id, text, mean confidence, (x0, y0, x1, y1))] in reading order of the engine."""
+        out = []
+        if not len(self):
+            return out
+        ids, first = np.unique(self.line, return_index=True)
+        for line_id in ids[np.argsort(first)]:
+            idx = np.flatnonzero(self.line == line_id)
+            b = self.boxes[idx]
+            out.append((int(line_id), " ".join(self.word(i) for i in idx), float(self.conf[idx].mean()),
+                        (int(b[:, 0].min()), int(b[:, 1].min()), int(b[:, 2].max()), int(b[:, 3].max()))))
+        return out
+
+    def mean_confidence(self, engine=None):
+        conf = self.conf if engine is None else self.conf[self.engine == ENGINES.index(engine)]
+        return float(conf.mean()) if len(conf) else 0.0
+
+    def readable_words(self):
+        """
+        (count, confidence-weighted count) of readable words (>= 3 letters),
+        the measure the dual-engine selection compares.
+        """
+        count, weighted = 0, 0.0
+        for i in range(len(self)):
+            n = len(_READABLE.findall(self.word(i)))
+            count += n
+            weighted += n * float(self.conf[i])
+        return count, weighted
+
+
+def _best_token_confidence(page, best):
+    for i in range(len(page)):
+        token = normalize_token(page.word(i))
+        if token and page.conf[i] > best.get(token, -1.0):
+            best[token] = float(page.conf[i])
+
+
+class OCRDocument:
+    """
+    All pages of one file plus the flat text extract_text_from_file returns.
+    `schedule` is the OCR scheduler's report (budget, degraded pages), if any.
+
+    Pages added with add_page(page, keep=False) (low-memory mode) are not
+    kept: only what the document-level statistics need -- word count,
+    confidence sum and the best confidence per distinct token -- is folded
+    in, so memory grows with the vocabulary, not with the booklet.
+    """
+
+    def __init__(self, pages=None, text="", schedule=None):
+        self.pages = pages or []
+        self.text = text
+        self.schedule = schedule
+        self._token_conf = None
+        self._dropped_pages = 0
+        self._dropped_words = 0
+        self._dropped_conf = 0.0
+        self._dropped_tokens = {}
+
+    def add_page(self, page, keep=True):
+        if keep:
+            self.pages.append(page)
+        else:
+            self._dropped_pages += 1
+            self._dropped_words += len(page)
+            self._dropped_conf += float(page.conf.sum())
+            _best_token_confidence(page, self._dropped_tokens)
+        self._token_conf = None
+
+    def __len__(self):
+        return len(self.pages) + self._dropped_pages
+
+    def word_count(self):
+        return sum(len(p) for p in self.pages) + self._dropped_words
+
+    def mean_confidence(self):
+        total = self.word_count()
+        conf = sum(float(p.conf.sum()) for p in self.pages) + self._dropped_conf
+        return conf / total if total else 0.0
+
+    def token_confidence(self):
+        """normalized word -> best confidence any engine read it with, anywhere in the document."""
+        if self._token_conf is None:
+            best = dict(self._dropped_tokens)
+            for p in self.pages:
+                _best_token_confidence(p, best)
+            self._token_conf = best
+        return self._token_conf
+
+    def low_confidence_ratio(self, text, threshold=LOW_CONFIDENCE):
+        """
+        Share of the words of `text` (e.g. one parsed answer) that OCR read with
+        confidence below `threshold`. Words that no longer match an OCR word
+        (changed by spelling correction) are left out; None if none match.
+        """
+        best = self.token_confidence()
+        matched = low = 0
+        for word in text.split():
+            conf = best.get(normalize_token(word))
+            if conf is None:
+                continue
+            matched += 1
+            low += conf < threshold
+        return low / matched if matched else None
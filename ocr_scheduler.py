@@ -0,0 +1,150 @@
+"""
+Deadline-aware engine scheduling for one OCR job.
+
+The old rule (PAGE_TIMEOUT_SECONDS) looked at a dual-engine page only after it
+had finished and then switched the rest of the document to Tesseract. A slow
+page could still take minutes, and a long document had no overall limit.
+OCRScheduler instead gives each file a wall-clock budget (OCR_DEADLINE_SECONDS,
+or OCR_PAGE_BUDGET_SECONDS per page) and, before every batch of pages:
+
+  * reserves the time Tesseract needs for every page not OCR'd yet (Tesseract
+    always runs, it is the cheap engine),
+  * shares what is left evenly over those pages and gives EasyOCR to the
+    pages of the batch whose estimated EasyOCR cost fits the batch's share,
+  * hands the EasyOCR call a deadline (easyocr_deadline); BatchedReader checks
+    it between detector and recognizer batches and gives up (Preempted) when
+    it has passed, and the batch is finished with Tesseract alone.
+
+Costs are estimated from measured throughput: EngineRates keeps seconds per
+megapixel for each engine (exponentially weighted, shared by all jobs of the
+process, starting from rough CPU priors). Pages that did not get EasyOCR are
+recorded with the reason ("budget" or "preempted") and reported in
+OCRDocument.schedule, the page events and the job's counters.
+"""
+import os
+import threading
+import time
+
+import metrics
+
+# Wall-clock OCR budget per file; 0 = OCR_PAGE_BUDGET_SECONDS x number of pages
+OCR_DEADLINE_SECONDS = float(os.environ.get("OCR_DEADLINE_SECONDS", "0"))
+OCR_PAGE_BUDGET_SECONDS = float(os.environ.get("OCR_PAGE_BUDGET_SECONDS", "60"))
+
+# Seconds per megapixel on CPU before anything was measured (a 150 DPI A4 page is ~2.2 MP)
+PRIOR_SECONDS_PER_MP = {"easyocr": 5.0, "tesseract": 0.8}
+RATE_SMOOTHING = 0.3       # weight of the newest measurement
+SAFETY_MARGIN = 0.9        # plan with this share of the remaining time
+PREEMPT_FACTOR = 2.0       # EasyOCR may take this many times its estimate before it is stopped
+
+
+class EngineRates:
+    """Measured seconds per megapixel of each OCR engine, shared by all jobs."""
+
+    def __init__(self, priors=PRIOR_SECONDS_PER_MP, alpha=RATE_SMOOTHING):
+        self.alpha = alpha
+        self._rates = dict(priors)
+        self._samples = {engine: 0 for engine in priors}
+        self._lock = threading.Lock()
+
+    def estimate(self, engine, megapixels):
+        with self._lock:
+            return self._rates[engine] * megapixels
+
+    def observe(self, engine, seconds, megapixels):
+        if megapixels <= 0:
+            return
+        rate = seconds / megapixels
+        with self._lock:
+            # Blended with the prior too: one early outlier (e.g. a cold
+            # process) shouldn't set the rate on its own
+            self._rates[engine] = self.alpha * rate + (1 - self.alpha) * self._rates[engine]
+            self._samples[engine] += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {engine: {"s_per_mp": round(rate, 3), "samples": self._samples[engine]}
+                    for engine, rate in self._rates.items()}
+
+
+RATES = EngineRates()
+
+
+def megapixels(img):
+    return img.shape[0] * img.shape[1] / 1e6
+
+
+class OCRScheduler:
+    """Engine plan and degradation record for one file of `total_pages` pages."""
+
+    def __init__(self, total_pages, budget=None, rates=None):
+        if budget is None:
+            budget = OCR_DEADLINE_SECONDS or OCR_PAGE_BUDGET_SECONDS * max(1, total_pages)
+        self.total_pages = total_pages
+        self.budget = budget
+        self.rates = rates or RATES
+        self.start = time.monotonic()
+        self.deadline = self.start + budget
+        self.pages_done = 0
+        self._mp_seen, self._pages_seen = 0.0, 0
+        self.degraded = {}   # page -> reason
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def _tesseract_reserve(self, batch_mp):
+        """Estimated Tesseract time for this batch and every page after it."""
+        later = max(0, self.total_pages - self.pages_done - len(batch_mp))
+        mean_mp = self._mp_seen / self._pages_seen if self._pages_seen else 0.0
+        return sum(self.rates.estimate("tesseract", mp) for mp in batch_mp.values()) + \
+            later * self.rates.estimate("tesseract", mean_mp)
+
+    def plan(self, batch_mp):
+        """
+        Pages of the next batch ({page: megapixels}) to read with EasyOCR as
+        well as Tesseract; the others are recorded as degraded ("budget").
+        """
+        self._mp_seen += sum(batch_mp.values())
+        self._pages_seen += len(batch_mp)
+        pages_left = max(len(batch_mp), self.total_pages - self.pages_done)
+        slack = self.remaining() * SAFETY_MARGIN - self._tesseract_reserve(batch_mp)
+        share = slack * len(batch_mp) / pages_left
+
+        chosen, cost = [], 0.0
+        for page in sorted(batch_mp):
+            page_cost = self.rates.estimate("easyocr", batch_mp[page])
+            if cost + page_cost <= share:
+                chosen.append(page)
+                cost += page_cost
+            else:
+                self.degrade(page, "budget")
+        return chosen
+
+    def easyocr_deadline(self, batch_mp, chosen):
+        """time.monotonic() by which EasyOCR on `chosen` pages has to be done."""
+        estimate = sum(self.rates.estimate("easyocr", batch_mp[p]) for p in chosen)
+        latest = self.deadline - self._tesseract_reserve(batch_mp)
+        return min(time.monotonic() + estimate * PREEMPT_FACTOR, latest)
+
+    def degrade(self, page, reason):
+        self.degraded[page] = reason
+        metrics.count("pages_degraded_total")
+        if reason == "preempted":
+            metrics.count("easyocr_preempted_total")
+
+    def observe(self, engine, seconds, mp):
+        self.rates.observe(engine, seconds, mp)
+
+    def page_done(self):
+        self.pages_done += 1
+
+    def report(self):
+        elapsed = time.monotonic() - self.start
+        return {
+            "budget_s": round(self.budget, 1),
+            "elapsed_s": round(elapsed, 2),
+            "over_budget": elapsed > self.budget,
+            "pages": self.total_pages,
+            "degraded": [{"page": p, "reason": r} for p, r in sorted(self.degraded.items())],
+            "rates": self.rates.to_dict(),
+        }
@@ -1,13 +1,25 @@
-import easyocr
 from PIL import Image, ImageEnhance, ImageFilter
 import re
 import os
 import time
-from pdf2image import convert_from_path
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import sys
 import numpy as np
 import cv2
-import pytesseract
+import low_memory
+import metrics
+import page_buffers
+import tesseract_pool
+import events
+import inference_daemon
+from easyocr_batch import BatchedReader, Preempted, group_page
+from ocr_result import OCRDocument, PageOCR
+from ocr_merge import merge_pages
+from ocr_scheduler import OCRScheduler, megapixels
+from page_normalize import NORMALIZE_PAGES, PageCache, as_rgb, normalize_page
+from page_sources import open_pages
 
 # Try to find poppler in common locations, otherwise hope it's in PATH
 POPPLER_PATH = None
@@ -24,15 +36,56 @@ for p in possible_poppler_paths:
 
 # Initialize EasyOCR reader globally to avoid reloading it (it's heavy)
 READER = None
+BATCHED_READER = None
+
+# How pages both engines read about equally well are combined: "align" keeps
+# the better reading of each line (ocr_merge.py), "concat" appends both texts
+DUAL_MERGE_MODE = os.environ.get("DUAL_MERGE_MODE", "align")
+
+# Prepared pages (normalized, red ink removed) of recently OCR'd files
+PAGE_CACHE = PageCache()
+
+# Processes preparing pages (normalize + red ink) ahead of OCR; pages go to and
+# from them through shared memory (page_buffers.py). 0 = prepare in-process
+PAGE_PREP_WORKERS = int(os.environ.get("PAGE_PREP_WORKERS", "0"))
+# Prepared pages of the worker path, kept as (reference-counted) shared buffers
+SHARED_PAGE_CACHE = PageCache(retain=page_buffers.PageBuffer.retain, release=page_buffers.PageBuffer.release)
+# Both are emptied when the process goes over its memory ceiling (low_memory.py)
+low_memory.on_pressure(PAGE_CACHE.clear)
+low_memory.on_pressure(SHARED_PAGE_CACHE.clear)
+
+# Pages per batched EasyOCR pass and line crops per
+# recognizer forward pass; see easyocr_batch.py
+EASYOCR_PAGE_BATCH = int(os.environ.get("EASYOCR_PAGE_BATCH", "4"))
+EASYOCR_RECOG_BATCH = int(os.environ.get("EASYOCR_RECOG_BATCH", "32"))
+
+def load_reader():
+    """The EasyOCR reader itself, loaded in this process."""
+    import easyocr
+    print("Loading EasyOCR model... this might take a moment.")
+    return easyocr.Reader(['en'])
+
 
 def get_reader():
     global READER
     if READER is None:
-        print("Loading EasyOCR model... this might take a moment.")
-        READER = easyocr.Reader(['en'])
+        # With INFERENCE_SOCKET set, a running inference daemon reads the pages
+        READER = inference_daemon.remote_reader() or load_reader()
     return READER
 
 
+def get_batched_reader():
+    global BATCHED_READER
+    if BATCHED_READER is None:
+        reader = get_reader()
+        if isinstance(reader, inference_daemon.RemoteReader):
+            BATCHED_READER = reader  # the daemon batches (and coalesces) itself
+        else:
+            BATCHED_READER = BatchedReader(reader, detect_batch_size=EASYOCR_PAGE_BATCH,
+                                           recog_batch_size=EASYOCR_RECOG_BATCH)
+    return BATCHED_READER
+
+
 def preprocess_light(image):
     """
     Light preprocessing for handwritten text -- preserves ink details
@@ -80,21 +133,25 @@ def preprocess_for_tesseract(image):
     return binary
 
 
-def remove_red_ink(image):
+def remove_red_ink(image, inplace=False):
     """
     Removes red ink (teacher's grading) from the image by replacing it with white.
+    Expects RGB (PIL page images, np.array of them); returns RGB.
+    With inplace=True a writable RGB array is cleaned in place instead of copied.
     """
     if not isinstance(image, np.ndarray):
         img = np.array(image)
+    elif inplace and image.flags.writeable:
+        img = image
     else:
         img = image.copy()
         
     if len(img.shape) == 2:
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
     elif img.shape[2] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
         
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
     
     # Red wraps around 180 in HSV, so we need two ranges
     lower_red1 = np.array([0, 50, 50])
@@ -116,153 +173,430 @@ def remove_red_ink(image):
     return img
 
 
-def _count_readable_words(text):
-    """Count words that look like actual English words (>= 3 chars, alphabetic)."""
-    words = re.findall(r'[a-zA-Z]{3,}', text)
-    return len(words)
+def _prepare(image, page=None, own_input=False):
+    """prepare_page without the cache. `own_input`: `image` may be modified in place."""
+    img = as_rgb(image)
+    if NORMALIZE_PAGES:
+        with metrics.timer("normalize", page=page):
+            norm = normalize_page(img)
+        img = norm.image
+        if norm.angle or norm.crop or norm.scale != 1.0:
+            print(f"    Normalized page {page}: deskew {norm.angle:+.1f} deg, "
+                  f"{norm.source_size[0]}x{norm.source_size[1]} -> {img.shape[1]}x{img.shape[0]} "
+                  f"(scale {norm.scale:.2f}, text height {norm.text_height or 0:.0f}px)")
+
+    # Remove red ink (teacher's marks) -- requires the colour image. Arrays made
+    # above (not the caller's) are cleaned in place rather than copied once more
+    with metrics.timer("red_ink", page=page):
+        return remove_red_ink(img, inplace=own_input or img is not image)
 
 
-def ocr_page_tesseract_only(img_np):
+def prepare_page(image, page=None):
     """
-    Fast OCR using only Tesseract. Used as fallback when dual engine is too slow.
+    The page both OCR engines read: normalized (deskewed, cropped, resampled;
+    see page_normalize.py) and with red ink removed, as an RGB array.
+    Cached by page content, so a file OCR'd again reuses its pages.
     """
+    key = PAGE_CACHE.key(image)
+    prepared = PAGE_CACHE.get(key)
+    if prepared is not None:
+        metrics.count("page_cache_hits_total")
+        return prepared
+
+    prepared = _prepare(image, page)
+    PAGE_CACHE.put(key, prepared)
+    return prepared
+
+
+def _prepare_shared(buf, page):
+    """
+    Worker process: prepare the page in shared buffer `buf` (in place) and
+    return it in a new shared buffer, as the greyscale page both OCR engines
+    read (a third of the RGB page's size).
+    """
+    with page_buffers.attached(buf) as src:
+        prepared = _prepare(src, page, own_input=True)
+        out = page_buffers.export(prepared.shape[:2],
+                                  fill=lambda view: cv2.cvtColor(prepared, cv2.COLOR_RGB2GRAY, dst=view))
+        del src, prepared
+    return out
+
+
+def _submit_prepare(images, pages, executor):
+    """
+    Hand a batch of decoded pages to the preparation workers. Each page is
+    written once into shared memory; pages whose prepared version is cached
+    aren't sent. Returns the batch's tickets for _collect_prepared.
+    """
+    pool = page_buffers.get_pool()
+    tickets = []
+    for i, img in zip(pages, images):
+        src = pool.put(img)
+        key = PageCache.key(src.array())
+        cached = SHARED_PAGE_CACHE.get(key)
+        if cached is not None:
+            metrics.count("page_cache_hits_total")
+            src.release()
+            tickets.append((i, None, key, cached))
+        else:
+            tickets.append((i, src, key, executor.submit(_prepare_shared, src, i)))
+    return tickets
+
+
+def _collect_prepared(tickets):
+    """{page: PageBuffer} of prepared pages for a batch of tickets; the caller releases them."""
+    pool = page_buffers.get_pool()
+    prepared = {}
+    try:
+        for i, src, key, pending in tickets:
+            if src is None:
+                prepared[i] = pending
+                continue
+            try:
+                out = pool.adopt(pending.result())
+            finally:
+                src.release()
+            SHARED_PAGE_CACHE.put(key, out.retain())
+            prepared[i] = out
+    except Exception:
+        _release_tickets(tickets[len(prepared) + 1:])
+        for buf in prepared.values():
+            buf.release()
+        raise
+    return prepared
+
+
+def _release_tickets(tickets):
+    for i, src, key, pending in tickets:
+        if src is None:
+            pending.release()
+            continue
+        try:
+            page_buffers.get_pool().adopt(pending.result()).release()
+        except Exception:
+            pass
+        src.release()
+
+
+def _prep_executor(total_pages):
+    """Process pool for page preparation, or None to prepare in-process."""
+    if PAGE_PREP_WORKERS <= 0 or total_pages <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    # Forked like scoring's workers: they inherit the loaded modules, no re-import
+    return ProcessPoolExecutor(max_workers=PAGE_PREP_WORKERS, mp_context=multiprocessing.get_context("fork"))
+
+
+def _prepare_lean(image, page):
+    """Low-memory preparation: uncached, in place, kept as the greyscale page both engines read."""
+    prepared = _prepare(image, page, own_input=True)
+    return cv2.cvtColor(prepared, cv2.COLOR_RGB2GRAY)
+
+
+def _prepared_batches(page_iter, batch_size, executor=None, lean=False):
+    """
+    (pages, {page: prepared image}, shared buffers to release) per batch of up
+    to `batch_size` pages. With an executor the next batch is being prepared
+    by the workers while the current one is OCR'd. `lean`: low-memory
+    preparation (_prepare_lean), in-process only.
+    """
+    batch_start = 0
+
+    def next_batch():
+        nonlocal batch_start
+        images = list(islice(page_iter, batch_size))
+        pages = list(range(batch_start + 1, batch_start + len(images) + 1))
+        batch_start += len(images)
+        return pages, images
+
+    if executor is None:
+        while True:
+            batch_pages, batch_images = next_batch()
+            if not batch_pages:
+                return
+            no_red_pages = {}
+            for i, img in zip(batch_pages, batch_images):
+                # 1. Normalize the page and remove red ink
+                no_red_pages[i] = _prepare_lean(img, i) if lean else prepare_page(img, page=i)
+            del batch_images, img  # free the decoded pages once prepared
+            yield batch_pages, no_red_pages, []
+
+    pages, images = next_batch()
+    ahead = pages, (_submit_prepare(images, pages, executor) if pages else [])
+    del images
+    try:
+        while ahead[0]:
+            batch_pages, tickets = ahead
+            ahead = [], []
+            with metrics.timer("prepare.wait"):
+                buffers = _collect_prepared(tickets)
+            # The workers prepare the next batch while this one is OCR'd
+            pages, images = next_batch()
+            ahead = pages, (_submit_prepare(images, pages, executor) if pages else [])
+            del images
+            yield batch_pages, {i: buf.array() for i, buf in buffers.items()}, list(buffers.values())
+    finally:
+        _release_tickets(ahead[1])
+
+
+def _tesseract_page(img_np, page=None):
+    """Tesseract on the adaptive threshold binary, as a PageOCR (empty on error)."""
     binary_img = preprocess_for_tesseract(img_np)
     try:
-        tess_text = pytesseract.image_to_string(binary_img, config='--psm 4 --oem 3')
-        return tess_text
+        with metrics.timer("ocr.tesseract", page=page):
+            tess_text, tsv = tesseract_pool.image_to_data(binary_img, psm=4)
+        return PageOCR.from_tesseract_tsv(tsv, text=tess_text, page=page)
     except Exception as e:
         print(f"    Tesseract error: {e}")
-        return ""
+        return PageOCR(page=page)
+
 
+def _easyocr_page(items, page=None):
+    """PageOCR from EasyOCR's recognized lines; text as readtext(detail=0, paragraph=True)."""
+    blocks, block_ids = group_page(items, paragraph=True)
+    return PageOCR.from_easyocr(items, block_ids, text="\n".join(blocks), page=page)
 
-def ocr_page_dual_engine(img_np):
+
+def ocr_page_tesseract_only(img_np, page=None):
+    """
+    Fast OCR using only Tesseract. Used on pages the OCR budget has no room
+    for EasyOCR on (see ocr_scheduler.py).
+    Returns a PageOCR (its .text is the page text).
     """
-    Run both EasyOCR and Tesseract on a page, return the better result.
+    return _tesseract_page(img_np, page)
+
+
+def easyocr_pages(images, pages=None, deadline=None):
+    """
+    Batched EasyOCR over several pages (after red ink removal). Returns one
+    PageOCR per page, or None if the batched path failed (callers then OCR per page).
+    Raises Preempted when time.monotonic() passes `deadline` first.
+    """
+    light_images = [preprocess_light(img) for img in images]
+    pages = pages or [None] * len(images)
+    try:
+        with metrics.timer("ocr.easyocr.batch"):
+            per_page = get_batched_reader().readtext_items(light_images, deadline=deadline)
+        return [_easyocr_page(items, page) for items, page in zip(per_page, pages)]
+    except Preempted:
+        raise
+    except Exception as e:
+        print(f"    Batched EasyOCR error, falling back to per-page OCR: {e}")
+        return None
+
+
+def ocr_page_dual_engine(img_np, page=None, easy=None):
+    """
+    Run both EasyOCR and Tesseract on a page, return the better result as a
+    PageOCR (words, boxes and confidences of the engine(s) used; .text is the
+    page text).
     
     Strategy:
     - EasyOCR: run on raw color image (after red ink removal) -- uses deep learning
     - Tesseract: run on adaptive threshold binary -- better for structured text
-    - Pick the result with more readable words (heuristic for quality)
+    - Pick the result with more readable words, each weighted by the
+      confidence the engine reported for it
+    - If neither is clearly better, merge them line by line (ocr_merge.py)
+
+    `easy` is this page's EasyOCR PageOCR when it was already produced by a
+    batched pass (easyocr_pages); EasyOCR then isn't run again.
     """
-    reader = get_reader()
-    
-    # --- EasyOCR on lightly processed image ---
-    light_img = preprocess_light(img_np)
-    try:
-        easy_results = reader.readtext(light_img, detail=0, paragraph=True)
-        easy_text = "\n".join(easy_results)
-    except Exception as e:
-        print(f"    EasyOCR error: {e}")
-        easy_text = ""
+    if easy is None:
+        reader = get_reader()
+        
+        # --- EasyOCR on lightly processed image ---
+        light_img = preprocess_light(img_np)
+        try:
+            with metrics.timer("ocr.easyocr", page=page):
+                easy_items = reader.readtext(light_img, detail=1, paragraph=False)
+            easy = _easyocr_page(easy_items, page)
+        except Exception as e:
+            print(f"    EasyOCR error: {e}")
+            easy = PageOCR(page=page)
     
     # --- Tesseract on adaptive threshold ---
-    binary_img = preprocess_for_tesseract(img_np)
-    try:
-        tess_text = pytesseract.image_to_string(binary_img, config='--psm 4 --oem 3')
-    except Exception as e:
-        print(f"    Tesseract error: {e}")
-        tess_text = ""
+    tess = _tesseract_page(img_np, page)
     
     # --- Pick the better result ---
-    easy_words = _count_readable_words(easy_text)
-    tess_words = _count_readable_words(tess_text)
+    easy_words, easy_score = easy.readable_words()
+    tess_words, tess_score = tess.readable_words()
     
-    # Merge: use the one with more readable words  
+    # Merge: use the one with more (confidently) readable words
     # But also combine unique content from both if they're close
     if easy_words == 0 and tess_words == 0:
         # Both failed -- return whatever we got
-        return easy_text + "\n" + tess_text
+        return PageOCR.concat([easy, tess], text=easy.text + "\n" + tess.text, page=page)
     
-    if tess_words > easy_words * 1.3:
+    if tess_score > easy_score * 1.3:
         chosen = "Tesseract"
-        result = tess_text
-    elif easy_words > tess_words * 1.3:
+        result = tess
+    elif easy_score > tess_score * 1.3:
         chosen = "EasyOCR"
-        result = easy_text
+        result = easy
+    elif DUAL_MERGE_MODE == "concat":
+        chosen = "Merged"
+        result = PageOCR.concat([easy, tess], text=easy.text + "\n" + tess.text, page=page)
     else:
-        # Similar quality -- merge both for maximum content
+        # Similar quality -- line by line, keep whichever engine read each line better
         chosen = "Merged"
-        result = easy_text + "\n" + tess_text
+        result = merge_pages(easy, tess, page=page)
     
-    print(f"    OCR winner: {chosen} (EasyOCR: {easy_words} words, Tesseract: {tess_words} words)")
+    print(f"    OCR winner: {chosen} (EasyOCR: {easy_words} words, conf {easy.mean_confidence():.2f}; "
+          f"Tesseract: {tess_words} words, conf {tess.mean_confidence():.2f})")
     
     return result
 
 
-# Maximum seconds per page before switching to fast mode
-PAGE_TIMEOUT_SECONDS = 120  # 2 minutes per page max for dual engine
+def extract_text_from_file(file_path):
+    """
+    Extracts text from a PDF, image, archive or directory of page images
+    using dual-engine OCR (EasyOCR + Tesseract) with confidence-based selection.
+    See extract_document for the per-word results.
+    """
+    return extract_document(file_path).text
+
+
+def ocr_batch(no_red_pages, scheduler):
+    """
+    OCR one batch of prepared pages {page: image} within the job's budget:
+    batched EasyOCR (with a deadline) on the pages the scheduler allows, then
+    Tesseract and the engine choice per page. Returns the PageOCRs in page order.
+    """
+    batch_mp = {i: megapixels(img) for i, img in no_red_pages.items()}
+    dual = scheduler.plan(batch_mp)
+    easy_results = {}
+    if dual:
+        # Load the reader first: a cold model load is neither EasyOCR's
+        # per-page cost nor time its deadline should count
+        try:
+            with metrics.timer("ocr.easyocr.load"):
+                get_batched_reader()
+        except Exception as e:
+            print(f"    EasyOCR reader unavailable: {e}")  # easyocr_pages falls back
+        easy_start = time.time()
+        try:
+            batched = easyocr_pages([no_red_pages[i] for i in dual], dual,
+                                    deadline=scheduler.easyocr_deadline(batch_mp, dual))
+        except Preempted as e:
+            print(f"    WARNING: EasyOCR stopped on page(s) {dual} ({e}), using Tesseract only")
+            # The time it got is a lower bound on its cost; learn from it so later batches plan with it
+            scheduler.observe("easyocr", time.time() - easy_start, sum(batch_mp[i] for i in dual))
+            for i in dual:
+                scheduler.degrade(i, "preempted")
+            dual = []
+        else:
+            if batched is not None:
+                easy_results = dict(zip(dual, batched))
+                scheduler.observe("easyocr", time.time() - easy_start, sum(batch_mp[i] for i in dual))
 
+    results = []
+    for i in sorted(no_red_pages):
+        page_start = time.time()
+        mode_label = "DUAL" if i in dual else "FAST"
+        print(f"  OCR page {i}/{scheduler.total_pages} [{mode_label}]...")
+        no_red_img = no_red_pages.pop(i)
 
-def extract_text_from_file(file_path):
+        if i in dual:
+            page_ocr = ocr_page_dual_engine(no_red_img, page=i, easy=easy_results.get(i))
+        else:
+            page_ocr = ocr_page_tesseract_only(no_red_img, page=i)
+            metrics.count("pages_fast_mode_total")
+        page_time = time.time() - page_start
+        if i in easy_results or i not in dual:
+            # Otherwise EasyOCR ran inside ocr_page_dual_engine and the time isn't Tesseract's alone
+            scheduler.observe("tesseract", page_time, batch_mp[i])
+        scheduler.page_done()
+        print(f"    Page {i} took {page_time:.1f}s")
+
+        metrics.record("ocr.page", page_time, page=i)
+        metrics.count("pages_total")
+        events.emit("page", document=metrics.current_document(), page=i, total=scheduler.total_pages,
+                    seconds=round(page_time, 2), mode=mode_label,
+                    confidence=round(page_ocr.mean_confidence(), 3),
+                    degraded=scheduler.degraded.get(i))
+        results.append(page_ocr)
+
+        # Free memory after each page
+        del no_red_img
+    return results
+
+
+def extract_document(file_path, budget=None, low_memory_mode=None):
     """
-    Extracts text from a PDF or Image file using dual-engine OCR
-    (EasyOCR + Tesseract) with confidence-based selection.
+    OCR a PDF, image (every frame of a multi-page TIFF), ZIP/tar archive of
+    page images or directory of page images (see page_sources.py) into an
+    OCRDocument: the extracted text (as extract_text_from_file returns it;
+    multi-page inputs get a ---PAGE_BREAK--- after every page) plus a PageOCR
+    per page with word boxes, confidences and the engine each word came from.
     
-    Adaptive strategy: starts with dual-engine OCR for best quality,
-    but if a page takes too long (>2min), switches to Tesseract-only
-    for remaining pages to avoid timeout.
+    The file is OCR'd within a time budget (`budget` seconds, default from
+    ocr_scheduler.py): dual-engine OCR where the budget allows it, Tesseract
+    only on the other pages. The document's .schedule reports the budget and
+    which pages were degraded and why.
+
+    `low_memory_mode` (default: low_memory.enabled()) reads the file one page
+    at a time (one rasterized PDF page per poppler call), spills the page
+    texts to disk and keeps only the document statistics of each page, not
+    its words (see low_memory.py, OCRDocument.add_page).
     """
-    text = ""
-    use_fast_mode = False  # Switch to Tesseract-only if dual engine is too slow
+    lean = low_memory.enabled() if low_memory_mode is None else low_memory_mode
+    spool = low_memory.TextSpool(spill=lean)
+    document = OCRDocument()
     
     try:
-        # -------- PDF HANDLING --------
-        if file_path.lower().endswith(".pdf"):
-            # Use 150 DPI (good balance of quality vs speed for handwriting)
-            print(f"Converting PDF to images: {os.path.basename(file_path)}")
-            convert_start = time.time()
-            if POPPLER_PATH:
-                images = convert_from_path(file_path, poppler_path=POPPLER_PATH, dpi=150)
-            else:
-                images = convert_from_path(file_path, dpi=150)
-            
-            total_pages = len(images)
-            convert_time = time.time() - convert_start
-            print(f"Converted {total_pages} page(s) in {convert_time:.1f}s from: {os.path.basename(file_path)}")
-                
-            for i, img in enumerate(images, 1):
-                page_start = time.time()
-                mode_label = "FAST" if use_fast_mode else "DUAL"
-                print(f"  OCR page {i}/{total_pages} [{mode_label}]...")
-                
-                # 1. Remove Red Ink first (requires Color image)
-                img_np = np.array(img)
-                no_red_img = remove_red_ink(img_np)
-                
-                # 2. OCR (dual or fast mode)
-                if use_fast_mode:
-                    page_text = ocr_page_tesseract_only(no_red_img)
-                else:
-                    page_text = ocr_page_dual_engine(no_red_img)
-                    
-                    # Check if this page was too slow
-                    page_time = time.time() - page_start
-                    print(f"    Page {i} took {page_time:.1f}s")
-                    
-                    if page_time > PAGE_TIMEOUT_SECONDS and i < total_pages:
-                        print(f"    WARNING: Page took >{PAGE_TIMEOUT_SECONDS}s, switching to fast mode for remaining pages")
-                        use_fast_mode = True
-                
-                text += page_text + "\n---PAGE_BREAK---\n"
-                
-                # Free memory after each page
-                del img_np, no_red_img
-
-        # -------- IMAGE HANDLING --------
-        else:
-            img = Image.open(file_path)
-            img_np = np.array(img)
-            
-            # 1. Remove Red Ink
-            no_red_img = remove_red_ink(img_np)
-             
-            # 2. Dual-engine OCR
-            text = ocr_page_dual_engine(no_red_img)
+        source = open_pages(file_path, poppler_path=POPPLER_PATH, chunk_pages=1 if lean else None)
+    except Exception as e:
+        print(f"Error during OCR: could not open {os.path.basename(file_path)}: {e}")
+        spool.close()
+        return OCRDocument()
+
+    executor = None
+    try:
+        total_pages = len(source)
+        scheduler = OCRScheduler(total_pages, budget)
+        print(f"Reading {total_pages} page(s) ({source.kind}) from: {os.path.basename(file_path)} "
+              f"(OCR budget {scheduler.budget:.0f}s)")
+        # A single image's text has no page break (as it always had)
+        single_image = source.kind == "image" and total_pages == 1
+
+        # Pages are decoded lazily, one batch at a time, and prepared in-process
+        # or by PAGE_PREP_WORKERS processes. EasyOCR runs over
+        # EASYOCR_PAGE_BATCH pages at a time (see easyocr_batch.py);
+        # Tesseract and the engine choice stay per page. Low-memory mode
+        # takes one page at a time, in-process
+        if lean:
+            print("  Low-memory mode: one page at a time, page text spooled to disk")
+            metrics.count("low_memory_documents_total")
+        batch_size = 1 if lean else max(1, EASYOCR_PAGE_BATCH)
+        executor = None if lean else _prep_executor(total_pages)
+        for batch_pages, no_red_pages, buffers in _prepared_batches(iter(source), batch_size, executor, lean):
+            try:
+                # 2. OCR (dual engine or Tesseract only, as the budget allows)
+                for page_ocr in ocr_batch(no_red_pages, scheduler):
+                    spool.add(page_ocr.text if single_image else page_ocr.text + "\n---PAGE_BREAK---\n")
+                    document.add_page(page_ocr, keep=not lean)
+            finally:
+                no_red_pages.clear()
+                for buf in buffers:
+                    buf.release()
+            low_memory.relieve(f"after page {batch_pages[-1]}")
+
+        text = spool.text()
             
     except Exception as e:
         print(f"Error during OCR: {e}")
         import traceback
         traceback.print_exc()
-        return ""
+        return OCRDocument()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        source.close()
+        spool.close()
     
-    return text
+    schedule = scheduler.report()
+    if schedule["degraded"]:
+        print(f"  {len(schedule['degraded'])}/{total_pages} page(s) read with Tesseract only: "
+              + ", ".join(f"{d['page']} ({d['reason']})" for d in schedule["degraded"]))
+    document.text = text
+    document.schedule = schedule
+    return document
@@ -0,0 +1,215 @@
+"""
+Page images in shared memory, for handing pages between processes without
+pickling pixels.
+
+A PageBuffer is one page (shape + dtype) in a multiprocessing.shared_memory
+segment. It pickles as its segment name, shape and dtype -- a few dozen bytes
+instead of the ~6 MB of an RGB page at 150 DPI -- and the receiving process
+maps the same memory (attached / export). Segments are owned by one
+PageBufferPool in the parent process:
+
+    pool = get_pool()
+    buf = pool.put(page)                   # the page is written once
+    future = executor.submit(work, buf)    # the worker attaches, zero-copy
+    out = pool.adopt(future.result())
+    view = out.array()                     # owner's zero-copy view
+    ...
+    buf.release(); out.release()           # reference counted
+
+A buffer starts with one reference; retain() adds one (e.g. for a cache
+holding it) and the segment is recycled when the last reference is released:
+kept on a free list (up to PAGE_BUFFER_POOL_BYTES) for the next page of a
+similar size, otherwise unlinked. Views must not be used after the release
+that drops the count to zero.
+"""
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Bytes of released segments kept for reuse by later pages
+PAGE_BUFFER_POOL_BYTES = int(os.environ.get("PAGE_BUFFER_POOL_BYTES", str(128 * 1024 * 1024)))
+# A free segment is reused for a page of at least this share of its size
+MIN_REUSE_FILL = 0.5
+
+
+class PageBuffer:
+    """Handle of one page in shared memory; only the owning pool's copy is reference counted."""
+
+    __slots__ = ("name", "shape", "dtype", "_pool")
+
+    def __init__(self, name, shape, dtype, pool=None):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._pool = pool
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def array(self):
+        """Zero-copy view of the page (owner process only; see attached() elsewhere)."""
+        return self._pool.view(self)
+
+    def retain(self):
+        self._pool._retain(self.name)
+        return self
+
+    def release(self):
+        self._pool._release(self.name)
+
+    def __reduce__(self):
+        return PageBuffer, (self.name, self.shape, self.dtype.str)
+
+    def __repr__(self):
+        return f"PageBuffer({self.name!r}, {self.shape}, {self.dtype})"
+
+
+@contextmanager
+def attached(buf):
+    """Map `buf` in this process; yields its array. Drop every view before the block ends."""
+    shm = shared_memory.SharedMemory(name=buf.name)
+    try:
+        yield np.ndarray(buf.shape, buf.dtype, buffer=shm.buf)
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a view outlived the block; the mapping goes away with it
+
+
+def export(shape, dtype=np.uint8, fill=None):
+    """
+    New segment (created in a worker) for a result page; `fill(array)` writes
+    it in place. Returns the PageBuffer to send back for the owner to adopt().
+    """
+    buf_dtype = np.dtype(dtype)
+    size = max(1, int(np.prod(shape)) * buf_dtype.itemsize)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        if fill is not None:
+            view = np.ndarray(shape, buf_dtype, buffer=shm.buf)
+            fill(view)
+            del view
+        return PageBuffer(shm.name, shape, buf_dtype)
+    finally:
+        shm.close()
+
+
+class PageBufferPool:
+    """Owner of the shared page segments of this process (see module docstring)."""
+
+    def __init__(self, max_free_bytes=PAGE_BUFFER_POOL_BYTES):
+        self.max_free_bytes = max_free_bytes
+        self._segments = {}   # name -> SharedMemory (mapped here)
+        self._refs = {}       # name -> references
+        self._free = []       # released SharedMemory kept for reuse
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "adopted": 0, "unlinked": 0}
+        # Start the tracker before any worker is forked, so workers share it
+        # instead of starting their own (which would unlink their segments on exit)
+        resource_tracker.ensure_running()
+
+    def _segment(self, nbytes):
+        with self._lock:
+            fits = [shm for shm in self._free if nbytes <= shm.size and nbytes >= shm.size * MIN_REUSE_FILL]
+            if fits:
+                shm = min(fits, key=lambda s: s.size)
+                self._free.remove(shm)
+                self.stats["reused"] += 1
+                return shm
+            self.stats["created"] += 1
+        return shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+
+    def _register(self, shm, shape, dtype):
+        with self._lock:
+            self._segments[shm.name] = shm
+            self._refs[shm.name] = 1
+        return PageBuffer(shm.name, shape, dtype, pool=self)
+
+    def empty(self, shape, dtype=np.uint8):
+        """A page buffer of `shape` (contents undefined) and its writable view."""
+        dtype = np.dtype(dtype)
+        shm = self._segment(int(np.prod(shape)) * dtype.itemsize)
+        buf = self._register(shm, shape, dtype)
+        return buf, self.view(buf)
+
+    def put(self, image):
+        """Copy a page (array or PIL image) into shared memory; returns its PageBuffer."""
+        img = np.asarray(image)
+        buf, view = self.empty(img.shape, img.dtype)
+        np.copyto(view, img)
+        return buf
+
+    def adopt(self, buf):
+        """Take ownership of a segment a worker created with export()."""
+        shm = shared_memory.SharedMemory(name=buf.name)
+        with self._lock:
+            self.stats["adopted"] += 1
+        return self._register(shm, buf.shape, buf.dtype)
+
+    def view(self, buf):
+        with self._lock:
+            shm = self._segments[buf.name]
+        return np.ndarray(buf.shape, buf.dtype, buffer=shm.buf)
+
+    def _retain(self, name):
+        with self._lock:
+            self._refs[name] += 1
+
+    def _release(self, name):
+        with self._lock:
+            self._refs[name] -= 1
+            if self._refs[name] > 0:
+                return
+            del self._refs[name]
+            shm = self._segments.pop(name)
+            self._free.append(shm)
+            # Unlink the oldest free segments beyond the byte limit
+            doomed = []
+            while self._free and sum(s.size for s in self._free) > self.max_free_bytes:
+                doomed.append(self._free.pop(0))
+            self.stats["unlinked"] += len(doomed)
+        for shm in doomed:
+            _destroy(shm)
+
+    def in_use(self):
+        with self._lock:
+            return len(self._refs)
+
+    def close(self):
+        """Unlink every segment (free and in use)."""
+        with self._lock:
+            segments = list(self._segments.values()) + self._free
+            self._segments, self._refs, self._free = {}, {}, []
+        for shm in segments:
+            _destroy(shm)
+
+
+def _destroy(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a stale view still maps it; the memory goes when that view does
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool (created on first use, unlinked at exit)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = PageBufferPool()
+            atexit.register(_POOL.close)
+        return _POOL
@@ -0,0 +1,251 @@
+"""
+Page normalization before OCR: deskew, crop to the written area and resample
+to a target text size.
+
+Scans arrive skewed, with wide (often dark) scanner borders and at whatever
+resolution the scanner or phone produced -- a 4000px photo costs EasyOCR's
+detector and Tesseract several times what a 150 DPI page does, for no gain.
+normalize_page measures everything on a ~1000px wide ink mask:
+
+  * skew: the rotation (within +-MAX_SKEW_DEGREES) that makes the row profile
+    of the ink sharpest (projection-profile search, coarse then fine)
+  * content bounds: the box around all ink that neither touches the page edge
+    nor spans half of it (scanner borders and shadows do), plus a small padding
+  * text size: the median height of the ink's connected components, roughly
+    the x-height for print and the letter height for handwriting
+
+and then rotates, crops and rescales the full-resolution page with one affine
+warp so that text size becomes TARGET_TEXT_HEIGHT (and no side exceeds
+MAX_PAGE_SIDE). Pages already within RESCALE_TOLERANCE of the target keep
+their resolution.
+
+PageCache keeps the last few prepared pages by content hash, so the same
+page (e.g. a model answer uploaded with every student) isn't normalized twice.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+NORMALIZE_PAGES = os.environ.get("NORMALIZE_PAGES", "1") != "0"
+# Median letter height of a handwritten page rasterized at 150 DPI (see
+# extract_document), so pages at that resolution keep it
+TARGET_TEXT_HEIGHT = float(os.environ.get("PAGE_TARGET_TEXT_HEIGHT", "18"))
+MAX_PAGE_SIDE = int(os.environ.get("MAX_PAGE_SIDE", "2400"))
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "8"))
+
+MAX_SKEW_DEGREES = 5.0
+MIN_SKEW_DEGREES = 0.5     # smaller angles are not worth a resample
+RESCALE_TOLERANCE = 0.25   # text height within 25% of the target: keep the size
+MIN_SCALE, MAX_SCALE = 0.25, 2.0
+CROP_PADDING = 0.02        # of the page's shorter side, around the content box
+ANALYSIS_WIDTH = 1000
+PAPER_COLOR = (255, 255, 255)
+
+
+class NormalizedPage:
+    """A normalized page image (RGB) and what was done to it."""
+
+    def __init__(self, image, angle=0.0, crop=None, scale=1.0, text_height=None, source_size=None):
+        self.image = image
+        self.angle = angle
+        self.crop = crop
+        self.scale = scale
+        self.text_height = text_height
+        self.source_size = source_size
+
+    def to_dict(self):
+        return {
+            "angle": round(self.angle, 2),
+            "crop": self.crop,
+            "scale": round(self.scale, 3),
+            "text_height": None if self.text_height is None else round(self.text_height, 1),
+            "source_size": self.source_size,
+            "size": [int(self.image.shape[1]), int(self.image.shape[0])],
+        }
+
+
+def as_rgb(image):
+    """uint8 RGB array from a PIL image or a grey / RGB / RGBA array."""
+    img = np.asarray(image)
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    if img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
+    return img
+
+
+def ink_mask(grey):
+    """255 where there are pen strokes; local thresholding ignores the inside of dark borders."""
+    return cv2.adaptiveThreshold(grey, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 25, 15)
+
+
+def _rotate(img, angle, border=0, interpolation=cv2.INTER_NEAREST):
+    h, w = img.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(img, m, (w, h), flags=interpolation, borderValue=border)
+
+
+def _profile_sharpness(mask, angle):
+    rows = _rotate(mask, angle).sum(axis=1, dtype=np.float64)
+    return float(np.square(np.diff(rows)).sum())
+
+
+def estimate_skew(mask):
+    """Rotation (degrees, counter-clockwise) that straightens the text lines of an ink mask."""
+    if not mask.any():
+        return 0.0
+    coarse = np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 1e-6, 0.5)
+    best = max(coarse, key=lambda a: _profile_sharpness(mask, a))
+    fine = np.arange(best - 0.5, best + 0.5 + 1e-6, 0.1)
+    return round(float(max(fine, key=lambda a: _profile_sharpness(mask, a))), 2)
+
+
+def _components(mask):
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    return stats[1:count]  # x, y, w, h, area (background dropped)
+
+
+def content_bounds(mask, stats=None):
+    """
+    (x0, y0, x1, y1) around the ink components that neither touch the page edge
+    nor span half of it (scanner borders, shadows, fold lines); None if none.
+    """
+    h, w = mask.shape
+    stats = _components(mask) if stats is None else stats
+    x, y, bw, bh, area = stats.T if len(stats) else (np.array([]),) * 5
+    keep = ((x > 0) & (y > 0) & (x + bw < w) & (y + bh < h) & (area >= 4)
+            & (bw < w / 2) & (bh < h / 2))
+    if not keep.any():
+        return None
+    return (int(x[keep].min()), int(y[keep].min()),
+            int((x + bw)[keep].max()), int((y + bh)[keep].max()))
+
+
+def estimate_text_height(stats, page_height):
+    """Median height of letter-sized ink components; None if there are too few."""
+    if not len(stats):
+        return None
+    h, w, area = stats[:, 3], stats[:, 2], stats[:, 4]
+    letters = (h >= 3) & (h <= page_height * 0.1) & (area >= 6) & (w <= h * 8)
+    if letters.sum() < 10:
+        return None
+    return float(np.median(h[letters]))
+
+
+def normalize_page(image):
+    """Deskew, crop and rescale one page (PIL image or array). Returns a NormalizedPage."""
+    rgb = as_rgb(image)
+    src_h, src_w = rgb.shape[:2]
+    grey = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+    # Measure on a small copy; everything found there is scaled back by `f`
+    f = min(1.0, ANALYSIS_WIDTH / src_w)
+    small = cv2.resize(grey, (max(1, int(src_w * f)), max(1, int(src_h * f))),
+                       interpolation=cv2.INTER_AREA) if f < 1.0 else grey
+    mask = ink_mask(small)
+    angle = estimate_skew(mask)
+    if abs(angle) < MIN_SKEW_DEGREES:
+        angle = 0.0
+    elif angle:
+        mask = _rotate(mask, angle)
+
+    stats = _components(mask)
+    bounds = content_bounds(mask, stats)
+    text_height = estimate_text_height(stats, mask.shape[0])
+    if text_height is not None:
+        text_height /= f
+
+    if bounds is None:
+        x0, y0, x1, y1 = 0, 0, src_w, src_h
+    else:
+        pad = CROP_PADDING * min(src_w, src_h)
+        x0 = max(0, int(bounds[0] / f - pad))
+        y0 = max(0, int(bounds[1] / f - pad))
+        x1 = min(src_w, int(bounds[2] / f + pad))
+        y1 = min(src_h, int(bounds[3] / f + pad))
+
+    scale = 1.0
+    if text_height:
+        ratio = TARGET_TEXT_HEIGHT / text_height
+        if abs(ratio - 1.0) > RESCALE_TOLERANCE:
+            scale = min(MAX_SCALE, max(MIN_SCALE, ratio))
+    scale = min(scale, MAX_PAGE_SIDE / max(x1 - x0, y1 - y0))
+
+    crop = None if (x0, y0, x1, y1) == (0, 0, src_w, src_h) else [x0, y0, x1, y1]
+    if not angle and crop is None and scale == 1.0:
+        return NormalizedPage(rgb, 0.0, None, 1.0, text_height, [src_w, src_h])
+
+    out_w, out_h = max(1, int(round((x1 - x0) * scale))), max(1, int(round((y1 - y0) * scale)))
+    if scale < 0.5:
+        # Area-average big reductions first; warpAffine's interpolation would alias
+        rgb = cv2.resize(rgb, (max(1, int(src_w * scale)), max(1, int(src_h * scale))),
+                         interpolation=cv2.INTER_AREA)
+        pre, scale_left = scale, 1.0
+    else:
+        pre, scale_left = 1.0, scale
+    # Rotate about the page centre, then move the crop box to the origin and scale it
+    m = cv2.getRotationMatrix2D((src_w * pre / 2, src_h * pre / 2), angle, 1.0)
+    m[:, 2] -= (x0 * pre, y0 * pre)
+    m *= scale_left
+    out = cv2.warpAffine(rgb, m, (out_w, out_h), flags=cv2.INTER_LINEAR if scale_left <= 1.0 else cv2.INTER_CUBIC,
+                         borderValue=PAPER_COLOR)
+    return NormalizedPage(out, angle, crop, scale, text_height, [src_w, src_h])
+
+
+class PageCache:
+    """
+    Small LRU of prepared pages keyed by the source image's content hash.
+    For reference-counted values (shared page buffers), `retain` is applied to
+    every value handed out by get() and `release` to every value dropped.
+    """
+
+    def __init__(self, max_pages=PAGE_CACHE_SIZE, retain=None, release=None):
+        self.max_pages = max_pages
+        self.retain = retain
+        self.release = release
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image):
+        img = np.ascontiguousarray(np.asarray(image))
+        return hashlib.blake2b(img.data, digest_size=16, person=str(img.shape).encode()[:16]).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                if self.retain is not None:
+                    self.retain(value)
+            return value
+
+    def put(self, key, value):
+        """Store `value` (the cache takes over the caller's reference, if counted)."""
+        dropped = []
+        with self._lock:
+            if self.max_pages <= 0:
+                dropped.append(value)
+            else:
+                old = self._items.pop(key, None)
+                if old is not None:
+                    dropped.append(old)
+                self._items[key] = value
+                while len(self._items) > self.max_pages:
+                    dropped.append(self._items.popitem(last=False)[1])
+        self._drop(dropped)
+
+    def clear(self):
+        with self._lock:
+            dropped = list(self._items.values())
+            self._items.clear()
+        self._drop(dropped)
+
+    def _drop(self, values):
+        if self.release is not None:
+            for value in values:
+                self.release(value)
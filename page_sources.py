@@ -0,0 +1,206 @@
+"""
+Page sources: every supported upload as a lazy sequence of page images.
+
+    PDF                    rasterized by pdf2image (poppler), PDF_CHUNK_PAGES at a time
+                           (`chunk_pages`, e.g. 1 in low-memory mode)
+    image file             every frame is a page (multi-page TIFF from scanning stations)
+    ZIP / tar archive      the page images inside, in natural order (page2 before page10)
+    directory              the page images inside, in natural order
+
+Pages are decoded one member / frame at a time as they are iterated, so a long
+booklet never holds more than a few decoded pages in memory. Every page comes
+out as an RGB PIL image with its EXIF orientation applied. len() counts pages
+without decoding any pixels.
+
+    with open_pages(path) as source:
+        for page in source:
+            ...
+"""
+import io
+import os
+import re
+import tarfile
+import time
+import zipfile
+
+from PIL import Image, ImageOps
+
+import metrics
+
+PAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+PDF_DPI = 150
+PDF_CHUNK_PAGES = int(os.environ.get("PDF_CHUNK_PAGES", "4"))
+# Refuse inputs with more pages than this (a booklet is tens of pages)
+MAX_INPUT_PAGES = int(os.environ.get("MAX_INPUT_PAGES", "500"))
+
+_MULTI_FRAME_EXTENSIONS = (".tif", ".tiff", ".webp")
+
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def _is_page_name(name):
+    base = os.path.basename(name)
+    return (base.lower().endswith(PAGE_EXTENSIONS) and not base.startswith(".")
+            and not name.startswith("__MACOSX/"))
+
+
+def _frames(img):
+    """RGB page images for every frame of an opened image."""
+    for index in range(getattr(img, "n_frames", 1)):
+        if index:
+            img.seek(index)
+        yield ImageOps.exif_transpose(img).convert("RGB")
+
+
+def _frame_count(opener, name):
+    if not name.lower().endswith(_MULTI_FRAME_EXTENSIONS):
+        return 1
+    with Image.open(opener()) as img:
+        return getattr(img, "n_frames", 1)
+
+
+class PageSource:
+    """Base class: `kind`, len() = number of pages, iteration yields RGB PIL pages."""
+    kind = "pages"
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _check_size(self):
+        if self.count > MAX_INPUT_PAGES:
+            raise ValueError(f"{os.path.basename(self.path)} has {self.count} pages "
+                             f"(more than MAX_INPUT_PAGES={MAX_INPUT_PAGES})")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ImageFileSource(PageSource):
+    kind = "image"
+
+    def __init__(self, path):
+        super().__init__(path)
+        with Image.open(path) as img:
+            self.count = getattr(img, "n_frames", 1)
+        self._check_size()
+
+    def __iter__(self):
+        with Image.open(self.path) as img:
+            yield from _frames(img)
+
+
+class PdfSource(PageSource):
+    kind = "pdf"
+
+    def __init__(self, path, poppler_path=None, dpi=PDF_DPI, chunk_pages=None):
+        super().__init__(path)
+        from pdf2image import pdfinfo_from_path
+        self.poppler_path = poppler_path
+        self.dpi = dpi
+        self.chunk_pages = max(1, chunk_pages or PDF_CHUNK_PAGES)
+        self.count = int(pdfinfo_from_path(path, poppler_path=poppler_path)["Pages"])
+        self._check_size()
+
+    def __iter__(self):
+        from pdf2image import convert_from_path
+        kwargs = {"poppler_path": self.poppler_path} if self.poppler_path else {}
+        for first in range(1, self.count + 1, self.chunk_pages):
+            last = min(self.count, first + self.chunk_pages - 1)
+            start = time.time()
+            with metrics.timer("rasterize"):
+                pages = convert_from_path(self.path, dpi=self.dpi, first_page=first, last_page=last, **kwargs)
+            print(f"Converted page(s) {first}-{last} of {self.count} in {time.time()-start:.1f}s")
+            while pages:
+                yield pages.pop(0)
+
+
+class _MemberSource(PageSource):
+    """Pages stored as separate files: [(name, opener)] in natural order."""
+
+    def _set_members(self, members):
+        self.members = sorted(members, key=lambda m: natural_key(m[0]))
+        self.count = sum(_frame_count(opener, name) for name, opener in self.members)
+        self._check_size()
+
+    def __iter__(self):
+        for name, opener in self.members:
+            with Image.open(opener()) as img:
+                yield from _frames(img)
+
+
+class ZipSource(_MemberSource):
+    kind = "zip"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._zip = zipfile.ZipFile(path)
+        self._set_members([(info.filename, self._opener(info)) for info in self._zip.infolist()
+                           if not info.is_dir() and _is_page_name(info.filename)])
+
+    def _opener(self, info):
+        # One member in memory at a time; PIL needs a seekable file
+        return lambda: io.BytesIO(self._zip.read(info))
+
+    def close(self):
+        self._zip.close()
+
+
+class TarSource(_MemberSource):
+    kind = "tar"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._tar = tarfile.open(path, "r:*")
+        self._set_members([(m.name, self._opener(m)) for m in self._tar.getmembers()
+                           if m.isfile() and _is_page_name(m.name)])
+
+    def _opener(self, member):
+        return lambda: io.BytesIO(self._tar.extractfile(member).read())
+
+    def close(self):
+        self._tar.close()
+
+
+class DirectorySource(_MemberSource):
+    kind = "directory"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._set_members([(name, self._opener(os.path.join(path, name))) for name in os.listdir(path)
+                           if os.path.isfile(os.path.join(path, name)) and _is_page_name(name)])
+
+    @staticmethod
+    def _opener(path):
+        return lambda: path
+
+
+def open_pages(path, poppler_path=None, chunk_pages=None):
+    """
+    The PageSource for a PDF, image, archive or directory of page images.
+    `chunk_pages` is how many PDF pages are rasterized per poppler call
+    (default PDF_CHUNK_PAGES); other sources decode one page at a time anyway.
+    """
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    lower = path.lower()
+    if lower.endswith(".pdf"):
+        return PdfSource(path, poppler_path=poppler_path, chunk_pages=chunk_pages)
+    if not lower.endswith(PAGE_EXTENSIONS):
+        # Archives are recognized by content (uploads keep only the last extension, e.g. ".gz")
+        if zipfile.is_zipfile(path):
+            return ZipSource(path)
+        if tarfile.is_tarfile(path):
+            return TarSource(path)
+    return ImageFileSource(path)
@@ -0,0 +1,273 @@
+"""
+The grading pipeline shared by the web app (app.py) and the batch CLI (grade.py):
+
+    question paper OCR -> schema
+    model answer OCR   -> parse_exam_file -> clean_text            (once per exam)
+    student OCR        -> parse_exam_file -> clean_text/correct_spelling
+                       -> SemanticScorer.evaluate_exam              (per student)
+
+The model answer and question paper are prepared once into a Reference, so a
+batch of students only pays for their own OCR and scoring. load_exam keeps
+prepared References resident across jobs of the same exam (exam_context.py).
+"""
+import time
+import metrics
+from exam_context import CONTEXTS, exam_key
+from text_utils import SpellingIndex, clean_text
+from pdf_parser import parse_exam_file
+from question_paper import parse_question_paper_file
+
+
+def extract_document(path):
+    """ocr_service.extract_document; the OCR stack is imported on first use."""
+    from ocr_service import extract_document as extract
+    return extract(path)
+
+
+class PipelineError(Exception):
+    """A user-facing failure (unreadable file, no question numbers, ...)."""
+
+
+class Reference:
+    """
+    Everything derived from the model answer and question paper of one exam.
+    prepare_scoring() adds the model side of scoring (scoring.ModelFeatures
+    per segment), so scoring a student only computes the student side.
+    """
+
+    def __init__(self, model_segments, q_schema, model_vocab, model_raw=None):
+        self.model_segments = model_segments
+        self.q_schema = q_schema
+        self.model_vocab = model_vocab
+        self.model_raw = model_raw
+        self.features = None
+        self._spelling = None
+
+    def prepare_scoring(self, scorer):
+        """Compute every model segment's concepts, embeddings and keywords (once)."""
+        if self.features is None:
+            step_start = time.time()
+            with metrics.timer("reference.features"):
+                self.features = scorer.model_features_many(self.model_segments.values())
+            print(f"Model features ready for {len(self.features)} segment(s) ({time.time()-step_start:.1f}s)")
+        return self
+
+    def spelling_index(self):
+        """Spell-correction index of the model vocabulary, shared by all students."""
+        if self._spelling is None:
+            self._spelling = SpellingIndex(custom_dictionary=self.model_vocab)
+        return self._spelling
+
+    def expected_keys(self):
+        """Model keys plus any extra question-paper keys, used as the student parsing hint."""
+        keys = list(self.model_segments.keys())
+        for k in self.q_schema:
+            if k not in keys and not k.startswith("_"):
+                keys.append(k)
+        return keys
+
+
+def _no_progress(step, message):
+    print(f"[Pipeline] {message}")
+
+
+def load_question_paper(q_path, progress=_no_progress):
+    if not q_path:
+        return {}
+    progress(2, "Reading question paper with OCR... (this may take a minute)")
+    step_start = time.time()
+    with metrics.timer("question_paper"), metrics.document("question"):
+        q_schema = parse_question_paper_file(q_path)
+    print(f"Question Paper Schema: {q_schema} ({time.time()-step_start:.1f}s)")
+    return q_schema
+
+
+def ocr_document(path, which, progress=_no_progress, step=3):
+    """
+    OCR one document into an OCRDocument (text plus per-word confidences);
+    raises PipelineError when nothing could be read.
+    """
+    if which == "student":
+        progress(step, "Running OCR on student answer... (this may take a few minutes)")
+    else:
+        progress(step, f"Running OCR on {which} answer...")
+    step_start = time.time()
+    with metrics.timer(f"ocr.{which}"), metrics.document(which):
+        doc = extract_document(path)
+    print(f"{which.capitalize()} OCR completed in {time.time()-step_start:.1f}s "
+          f"({doc.word_count()} words, mean confidence {doc.mean_confidence():.2f})")
+    if not doc.text:
+        raise PipelineError(f"OCR failed to read the {which} answer file. Ensure it is clear and not corrupted.")
+    return doc
+
+
+def ocr_file(path, which, progress=_no_progress, step=3):
+    """OCR one document to text; raises PipelineError when nothing could be read."""
+    return ocr_document(path, which, progress, step).text
+
+
+def build_reference(model_raw, q_schema):
+    """Parse and clean the model answer text into a Reference."""
+    # Use QP schema as hint if available to prevent ghost parts in model answer
+    model_expected = list(q_schema.keys()) if q_schema else None
+    with metrics.timer("parse"):
+        model_segments = parse_exam_file(model_raw, expected_keys=model_expected)
+    if not model_segments:
+        raise PipelineError("Could not detect Question Numbers (e.g., '1.', 'Q1') in the Model Answer PDF. Please ensure standard formatting.")
+
+    all_model_text = ""
+    for k in model_segments:
+        m_clean = clean_text(model_segments[k])
+        model_segments[k] = m_clean
+        all_model_text += " " + m_clean
+
+    # Build vocabulary from model answer for context-aware correction
+    model_vocab = set(all_model_text.split())
+    print(f"Built Model Vocabulary: {len(model_vocab)} unique words.")
+    return Reference(model_segments, q_schema, model_vocab, model_raw=model_raw)
+
+
+def prepare_reference(model_path, q_path=None, progress=_no_progress):
+    """OCR + parse the question paper (optional) and model answer of an exam."""
+    q_schema = load_question_paper(q_path, progress)
+    model_raw = ocr_file(model_path, "model", progress, step=4)
+    return build_reference(model_raw, q_schema)
+
+
+def load_exam(scorer, model_path, q_path=None, progress=_no_progress, key=None):
+    """
+    The prepared Reference of an exam: the resident one while it is cached
+    (see exam_context.py), otherwise the question paper and model answer are
+    OCR'd, parsed and prepared for scoring, and the result is cached.
+    `key` is the exam key when the caller has the file hashes already.
+    """
+    key = key or exam_key(model_path, q_path)
+    reference = CONTEXTS.get(key)
+    if reference is not None:
+        print(f"[Exam] Reusing resident context {key} ({len(reference.model_segments)} questions)")
+        return reference
+    reference = prepare_reference(model_path, q_path, progress).prepare_scoring(scorer)
+    CONTEXTS.put(key, reference)
+    return reference
+
+
+def parse_student(student_raw, reference):
+    """Split the student's OCR text into questions, then clean and spell-correct each one."""
+    expected_keys = reference.expected_keys()
+    with metrics.timer("parse"):
+        student_segments = parse_exam_file(student_raw, expected_keys=expected_keys)
+    print(f"\n[Parsing] Model keys: {sorted(reference.model_segments.keys())}")
+    print(f"[Parsing] Student keys: {sorted(student_segments.keys())}")
+    print(f"[Parsing] Expected keys hint: {sorted(expected_keys)}")
+
+    spelling = reference.spelling_index()
+    for k in student_segments:
+        s_clean = clean_text(student_segments[k])
+        with metrics.timer("spell_correct", question=k):
+            s_corrected = spelling.correct(s_clean)
+        student_segments[k] = s_corrected
+
+        if len(s_clean) > 0:
+            print(f"Q{k} Original: {s_clean[:30]}... -> Corrected: {s_corrected[:30]}...")
+    return student_segments
+
+
+def stored_reference(scorer, model_segments, q_schema, key=None):
+    """
+    Reference for re-scoring stored segments (no OCR): the resident one of the
+    exam while it matches them, otherwise one prepared from the stored segments.
+    """
+    reference = CONTEXTS.get(key) if key else None
+    if reference is not None and reference.model_segments == model_segments and reference.q_schema == q_schema:
+        return reference
+    return Reference(dict(model_segments), q_schema, set()).prepare_scoring(scorer)
+
+
+def segment_noise(ocr, student_segments):
+    """Each answer's share of low-confidence OCR words in the student's OCRDocument."""
+    return {k: ocr.low_confidence_ratio(v) for k, v in student_segments.items()}
+
+
+def score_student(scorer, student_segments, reference, workers=None, ocr=None, ocr_noise=None):
+    """
+    Score parsed student segments. With the student's OCRDocument as `ocr` (or
+    the ratios stored with the segments as `ocr_noise`), each answer's share of
+    low-confidence OCR words feeds the scorer's noise estimate.
+    """
+    if ocr_noise is None and ocr is not None:
+        ocr_noise = segment_noise(ocr, student_segments)
+
+    print("\n--- DEBUG: Parsed Student Data ---")
+    for k, v in student_segments.items():
+        preview = v[:50].replace('\n', ' ') + "..."
+        print(f"Q{k}: {preview}")
+    print("------------------------------------\n")
+
+    step_start = time.time()
+    with metrics.timer("scoring"):
+        exam_results = scorer.evaluate_exam(student_segments, reference.model_segments,
+                                            question_schema=reference.q_schema, workers=workers,
+                                            ocr_noise=ocr_noise, model_features=reference.features)
+    print(f"Scoring completed in {time.time()-step_start:.1f}s")
+    return exam_results
+
+
+def _keep(artifacts, reference, ocr=None, student_segments=None, ocr_noise=None):
+    # Intermediate outputs for callers that persist them (see result_store.py)
+    if artifacts is None:
+        return
+    artifacts.setdefault("ocr", {}).update(ocr or {})
+    segments = artifacts.setdefault("segments", {})
+    segments["model"] = dict(reference.model_segments)
+    if student_segments is not None:
+        segments["student"] = dict(student_segments)
+    if ocr_noise is not None:
+        artifacts.setdefault("ocr_noise", {})["student"] = dict(ocr_noise)
+    artifacts["q_schema"] = reference.q_schema
+
+
+def grade_student(scorer, student_path, reference, workers=None, progress=_no_progress, artifacts=None):
+    """
+    Full per-student pipeline: OCR -> parse -> clean/correct -> score.
+    If `artifacts` is a dict it receives the raw OCR text, parsed segments and
+    their OCR noise ratios.
+    """
+    student_doc = ocr_document(student_path, "student", progress, step=3)
+    progress(5, "Processing text and correcting OCR errors...")
+    student_segments = parse_student(student_doc.text, reference)
+    ocr_noise = segment_noise(student_doc, student_segments)
+    _keep(artifacts, reference, {"student": student_doc.text}, student_segments, ocr_noise)
+    progress(6, "Scoring answers with semantic analysis...")
+    return score_student(scorer, student_segments, reference, workers, ocr_noise=ocr_noise)
+
+
+def run_pipeline(scorer, student_path, model_path, q_path=None, workers=None, progress=_no_progress,
+                 artifacts=None, exam=None):
+    """
+    One student against one model answer, in the order the web app reports
+    progress (question paper, student OCR, model OCR, parse, score).
+    The question paper and model answer are only read for the first student
+    of an exam; later ones reuse its resident Reference (see load_exam).
+    `exam` is the exam key if the caller has it. `artifacts` as in grade_student.
+    """
+    key = exam or exam_key(model_path, q_path)
+    reference = CONTEXTS.get(key)
+    if reference is None:
+        q_schema = load_question_paper(q_path, progress)
+    student_doc = ocr_document(student_path, "student", progress, step=3)
+    if reference is None:
+        model_raw = ocr_file(model_path, "model", progress, step=4)
+        progress(5, "Processing text and correcting OCR errors...")
+        reference = build_reference(model_raw, q_schema).prepare_scoring(scorer)
+        CONTEXTS.put(key, reference)
+    else:
+        print(f"[Exam] Reusing resident context {key} ({len(reference.model_segments)} questions)")
+        progress(5, "Processing text and correcting OCR errors...")
+
+    student_segments = parse_student(student_doc.text, reference)
+    ocr_noise = segment_noise(student_doc, student_segments)
+    _keep(artifacts, reference, {"student": student_doc.text, "model": reference.model_raw}, student_segments,
+          ocr_noise)
+
+    progress(6, "Scoring answers with semantic analysis...")
+    return score_student(scorer, student_segments, reference, workers, ocr_noise=ocr_noise)
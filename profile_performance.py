@@ -1,12 +1,12 @@
+import json
 import time
-import os
-import cv2
 import numpy as np
-from ocr_service import extract_text_from_file, remove_red_ink, preprocess_image, get_reader
+import metrics
+from ocr_service import remove_red_ink, preprocess_light, preprocess_for_tesseract, get_reader
 from scoring import SemanticScorer
-from pdf2image import convert_from_path
 
 def profile_pipeline():
+    profile = metrics.start_job("profile_performance")
     # Use a dummy large image or a pdf if available
     # We'll generate a large dummy image to simulate 300 DPI A4
     # A4 at 300 DPI is approx 2480 x 3508
@@ -18,11 +18,13 @@ def profile_pipeline():
     remove_red_ink(img)
     print(f"Red Ink Removal: {time.time() - start:.4f}s")
     
-    # 2. Profile Preprocessing
-    # Preprocessing converts to gray then bilateral filter
+    # 2. Profile Preprocessing (light blur for EasyOCR, adaptive threshold for Tesseract)
     start = time.time()
-    preprocess_image(img)
-    print(f"Preprocessing (CLAHE+Bilateral): {time.time() - start:.4f}s")
+    preprocess_light(img)
+    print(f"Preprocessing (EasyOCR light): {time.time() - start:.4f}s")
+    start = time.time()
+    preprocess_for_tesseract(img)
+    print(f"Preprocessing (Tesseract threshold): {time.time() - start:.4f}s")
     
     # 3. Profile OCR (just init and run on small crop to avoid waiting forever if too slow)
     # We'll use a smaller crop for OCR profiling
@@ -45,5 +47,9 @@ def profile_pipeline():
     scorer.evaluate_single_answer(text1, text2)
     print(f"Scoring (Single Answer): {time.time() - start:.4f}s")
 
+    # Encoder/concept/fuzzy-match breakdown collected by the metrics hooks
+    metrics.end_job()
+    print(json.dumps(profile.to_dict(), indent=2))
+
 if __name__ == "__main__":
     profile_pipeline()
@@ -1,6 +1,12 @@
 import re
 import math
-from ocr_service import extract_text_from_file
+
+
+def extract_text_from_file(file_path):
+    """OCR text of a file; ocr_service (and its image libraries) is imported on first use."""
+    from ocr_service import extract_text_from_file as extract
+    return extract(file_path)
+
 
 class QuestionPaperParser:
     def __init__(self):
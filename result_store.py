@@ -0,0 +1,311 @@
+"""
+Persistent store for completed evaluations (SQLite, WAL mode).
+
+One row per job in `jobs` (scores, status, hashes of the uploaded files and the
+full evaluate_exam output as JSON), plus the per-page OCR text (`pages`) and the
+parsed, cleaned segments (`segments`) of each document. Lookups by job, student,
+exam and model-answer hash are indexed, so result pages, CSV exports and
+re-grades read back in milliseconds instead of re-running OCR.
+
+Retention is bounded: prune() keeps at most RESULT_MAX_JOBS jobs no older than
+RESULT_RETENTION_DAYS and runs automatically every PRUNE_EVERY saves.
+
+Each thread gets its own connection; WAL lets the web threads read while a
+job thread writes.
+"""
+import csv
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from pdf_parser import PAGE_BREAK
+
+RESULTS_DB = os.environ.get("RESULTS_DB", "results.db")
+RESULT_RETENTION_DAYS = int(os.environ.get("RESULT_RETENTION_DAYS", "180"))
+RESULT_MAX_JOBS = int(os.environ.get("RESULT_MAX_JOBS", "10000"))
+PRUNE_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id        TEXT PRIMARY KEY,
+    student_id    TEXT,
+    exam_id       TEXT,
+    model_hash    TEXT,
+    student_hash  TEXT,
+    question_hash TEXT,
+    status        TEXT NOT NULL,
+    error         TEXT,
+    total_score   REAL,
+    max_score     REAL,
+    created_at    REAL NOT NULL,
+    finished_at   REAL,
+    regrade_of    TEXT,
+    q_schema      TEXT,
+    result        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_student ON jobs(student_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_exam ON jobs(exam_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_model_hash ON jobs(model_hash);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at);
+
+CREATE TABLE IF NOT EXISTS pages (
+    job_id   TEXT NOT NULL,
+    document TEXT NOT NULL,
+    page     INTEGER NOT NULL,
+    text     TEXT,
+    PRIMARY KEY (job_id, document, page)
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    job_id   TEXT NOT NULL,
+    document TEXT NOT NULL,
+    question TEXT NOT NULL,
+    text     TEXT,
+    ocr_noise REAL,
+    PRIMARY KEY (job_id, document, question)
+);
+"""
+
+JOB_COLUMNS = ("job_id", "student_id", "exam_id", "model_hash", "student_hash", "question_hash",
+               "status", "error", "total_score", "max_score", "created_at", "finished_at", "regrade_of")
+
+
+def exam_id_for(model_hash, question_hash=None):
+    """Default exam id: the same model answer + question paper is the same exam."""
+    return hashlib.sha256(f"{model_hash}:{question_hash or ''}".encode()).hexdigest()[:16]
+
+
+def _forget_connections(store_ref):
+    store = store_ref()
+    if store is not None:
+        store._local = threading.local()
+
+
+def split_pages(raw_text):
+    """Per-page OCR text from extract_text_from_file output."""
+    if not raw_text:
+        return []
+    pages = [p.strip("\n") for p in raw_text.split(PAGE_BREAK)]
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+
+def breakdown_question(item):
+    """
+    The plain question id of a breakdown row: "1a", also for rows annotated
+    as "1a (checked against Q1)" (scoring keeps the clean id in _base_key).
+    """
+    key = item.get("_base_key")
+    if key is None:
+        key = str(item.get("question")).split(" (", 1)[0]
+    return str(key)
+
+
+class ResultStore:
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self._local = threading.local()
+        self._saves = 0
+        self._saves_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+        self._migrate()
+        # A forked child (serve.py / grade.py workers) opens its own connections
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=functools.partial(_forget_connections, weakref.ref(self)))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        """Adds columns introduced after a database was created."""
+        conn = self._conn()
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(segments)")}
+        if "ocr_noise" not in columns:
+            with conn:
+                conn.execute("ALTER TABLE segments ADD COLUMN ocr_noise REAL")
+
+    # --- writes ---
+
+    def start_job(self, job_id, student_id=None, exam_id=None, model_hash=None,
+                  student_hash=None, question_hash=None, regrade_of=None):
+        if exam_id is None and model_hash:
+            exam_id = exam_id_for(model_hash, question_hash)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, student_id, exam_id, model_hash, student_hash,"
+                " question_hash, status, created_at, regrade_of) VALUES (?, ?, ?, ?, ?, ?, 'processing', ?, ?)",
+                (job_id, student_id, exam_id, model_hash, student_hash, question_hash, time.time(), regrade_of))
+
+    def save_documents(self, job_id, ocr_text=None, segments=None, ocr_noise=None):
+        """
+        ocr_text: {document: raw OCR text}, stored one row per page.
+        segments: {document: {question: text}}.
+        ocr_noise: {document: {question: low-confidence token ratio}}, kept with
+        the segments so a re-grade triages them like the original grade did.
+        """
+        with self._conn() as conn:
+            for document, raw in (ocr_text or {}).items():
+                conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                                 [(job_id, document, i, text) for i, text in enumerate(split_pages(raw), 1)])
+            for document, segs in (segments or {}).items():
+                noise = (ocr_noise or {}).get(document) or {}
+                conn.executemany(
+                    "INSERT OR REPLACE INTO segments (job_id, document, question, text, ocr_noise)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, document, str(q), text, noise.get(q)) for q, text in segs.items()])
+
+    def finish_job(self, job_id, exam_results, q_schema=None):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE jobs SET status='done', total_score=?, max_score=?, finished_at=?, q_schema=?, result=?"
+                " WHERE job_id=?",
+                (exam_results.get("total_score"), exam_results.get("max_score"), time.time(),
+                 json.dumps(q_schema or {}), json.dumps(exam_results), job_id))
+        self._maybe_prune()
+
+    def fail_job(self, job_id, error):
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET status='error', error=?, finished_at=? WHERE job_id=?",
+                         (error, time.time(), job_id))
+        self._maybe_prune()
+
+    # --- reads ---
+
+    def get_job(self, job_id):
+        row = self._conn().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_result(self, job_id):
+        row = self._conn().execute("SELECT result FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return json.loads(row["result"]) if row and row["result"] else None
+
+    def get_schema(self, job_id):
+        row = self._conn().execute("SELECT q_schema FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return json.loads(row["q_schema"]) if row and row["q_schema"] else {}
+
+    def latest_job_id(self, status="done"):
+        row = self._conn().execute(
+            "SELECT job_id FROM jobs WHERE status=? ORDER BY created_at DESC LIMIT 1", (status,)).fetchone()
+        return row["job_id"] if row else None
+
+    def list_jobs(self, student_id=None, exam_id=None, model_hash=None, status=None, limit=100):
+        """Most recent jobs first, filtered on any of the indexed columns."""
+        clauses, params = [], []
+        for column, value in (("student_id", student_id), ("exam_id", exam_id),
+                              ("model_hash", model_hash), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column}=?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT ?",
+            params + [limit]).fetchall()
+        return [dict(r) for r in rows]
+
+    def pages(self, job_id, document=None):
+        """{document: [page text, ...]}"""
+        sql = "SELECT document, page, text FROM pages WHERE job_id=?"
+        params = [job_id]
+        if document:
+            sql += " AND document=?"
+            params.append(document)
+        out = {}
+        for row in self._conn().execute(sql + " ORDER BY document, page", params):
+            out.setdefault(row["document"], []).append(row["text"])
+        return out
+
+    def segments(self, job_id, document):
+        """{question: text} in insertion order."""
+        rows = self._conn().execute(
+            "SELECT question, text FROM segments WHERE job_id=? AND document=? ORDER BY rowid",
+            (job_id, document)).fetchall()
+        return {r["question"]: r["text"] for r in rows}
+
+    def segment_noise(self, job_id, document):
+        """{question: OCR noise ratio} for the segments that have one."""
+        rows = self._conn().execute(
+            "SELECT question, ocr_noise FROM segments WHERE job_id=? AND document=? AND ocr_noise IS NOT NULL"
+            " ORDER BY rowid", (job_id, document)).fetchall()
+        return {r["question"]: r["ocr_noise"] for r in rows}
+
+    # --- export / retention ---
+
+    def export_csv(self, fileobj, jobs):
+        """Writes one row per job (scores per question as columns) to a text file object."""
+        results = {j["job_id"]: self.get_result(j["job_id"]) or {} for j in jobs}
+        questions = []
+        for res in results.values():
+            for b in res.get("breakdown", []):
+                q = breakdown_question(b)
+                if q not in questions:
+                    questions.append(q)
+        writer = csv.writer(fileobj)
+        writer.writerow(["job_id", "student_id", "exam_id", "status", "total_score", "max_score", "created_at"]
+                        + [f"Q{q}" for q in questions] + ["error"])
+        for j in jobs:
+            scores = {breakdown_question(b): b.get("score") for b in results[j["job_id"]].get("breakdown", [])}
+            writer.writerow([j["job_id"], j["student_id"] or "", j["exam_id"] or "", j["status"],
+                             "" if j["total_score"] is None else j["total_score"],
+                             "" if j["max_score"] is None else j["max_score"],
+                             time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(j["created_at"]))]
+                            + [scores.get(q, "") for q in questions] + [j["error"] or ""])
+
+    def prune(self, max_jobs=RESULT_MAX_JOBS, retention_days=RESULT_RETENTION_DAYS):
+        """Deletes jobs (and their pages/segments) beyond the age or count limit."""
+        cutoff = time.time() - retention_days * 86400
+        with self._conn() as conn:
+            stale = [r[0] for r in conn.execute("SELECT job_id FROM jobs WHERE created_at < ?", (cutoff,))]
+            stale += [r[0] for r in conn.execute(
+                "SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?", (max_jobs,))]
+            stale = list(dict.fromkeys(stale))
+            for table in ("pages", "segments", "jobs"):
+                conn.executemany(f"DELETE FROM {table} WHERE job_id=?", [(j,) for j in stale])
+        if stale:
+            print(f"[ResultStore] Pruned {len(stale)} job(s)")
+        return len(stale)
+
+    def _maybe_prune(self):
+        with self._saves_lock:
+            self._saves += 1
+            due = self._saves % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Hash of a file on disk (for callers without a streamed upload hash).
+    A directory of page images hashes its file names and contents in name order.
+    """
+    sha = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name)))
+    else:
+        files = [None]
+    for name in files:
+        if name is not None:
+            sha.update(name.encode("utf-8") + b"\0")
+        with open(path if name is None else os.path.join(path, name), "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
@@ -1,20 +1,101 @@
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
+import os
 import re
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concepts import ConceptExtractor
+from window_embeddings import WindowEmbedder
+from text_utils import COMMON_TERMS, SegmentAnalysis, analyze_segment
+from collections import OrderedDict
+import time
+import metrics
+import events
+import inference_daemon
 
 # Global MODEL cache
 MODEL = None
 
+# Distinct texts whose SegmentAnalysis is kept by a scorer
+ANALYSIS_CACHE_MAX = 1024
+
+# Triage of student segments before scoring (see SemanticScorer.triage_segment):
+# only empty segments, and segments at least TRIAGE_NOISE_RATIO noisy without a
+# single content word or number, are not worth an embedding. Short answers ("CPU", "42") are scored.
+# Pass 2 never matched segments under TRIAGE_MIN_CHARS (baseline behaviour)
+TRIAGE_MIN_CHARS = 10
+TRIAGE_NOISE_RATIO = 0.5
+# In a noisy segment, letter runs this long with a vowel count as content words
+# ("cpu", "arp"); shorter ones ("il", "li") only if they are known words
+TRIAGE_MIN_WORD_LETTERS = 3
+TRIAGE_RESULTS = {
+    "empty": {"score": 0, "feedback": "Empty answer"},
+    "noise": {"score": 0, "feedback": "Unreadable answer (OCR noise only)"},
+}
+
+# How student windows are embedded: "sentence" (each window encoded, exact) or
+# "token" (answers of 300+ words pooled from one encoder pass, see window_embeddings.py)
+WINDOW_MODE = os.environ.get("WINDOW_MODE", "sentence")
+
+# The scorer of this process when it is a forked scoring worker (see _init_pool_worker)
+_WORKER_SCORER = None
+
+def load_model():
+    """The sentence model itself, loaded in this process."""
+    from sentence_transformers import SentenceTransformer
+    print("Loading Semantic Model (all-MiniLM-L6-v2)...")
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
 def get_model():
     global MODEL
     if MODEL is None:
-        print("Loading Semantic Model (all-MiniLM-L6-v2)...")
-        MODEL = SentenceTransformer('all-MiniLM-L6-v2')
+        # With INFERENCE_SOCKET set, a running inference daemon encodes for us
+        MODEL = inference_daemon.remote_encoder() or load_model()
     return MODEL
 
+def _init_pool_worker(scorer):
+    # The scorer comes in through initargs, which a forked worker inherits
+    # instead of unpickling, so it shares the parent's weights. Each pool gets
+    # the scorer of the job that started it (concurrent jobs don't share a global).
+    global _WORKER_SCORER
+    _WORKER_SCORER = scorer
+    # Another job thread may have held a cache lock at fork time
+    scorer.concept_extractor._lock = threading.Lock()
+    scorer.window_embedder._lock = threading.Lock()
+    # One intra-op thread each keeps N workers from oversubscribing the cores.
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+class ModelFeatures:
+    """
+    What scoring needs from one model segment, independent of the student:
+    key concepts, their embeddings (one row each), the segment's embedding
+    and its keywords. Computed once per exam (see pipeline.Reference).
+    """
+
+    __slots__ = ("concepts", "concept_embeddings", "embedding", "keywords")
+
+    def __init__(self, concepts, concept_embeddings, embedding, keywords):
+        self.concepts = concepts
+        self.concept_embeddings = concept_embeddings
+        self.embedding = embedding
+        self.keywords = keywords
+
+
+def _pool_score_pair(pair):
+    start = time.perf_counter()
+    res = _WORKER_SCORER.evaluate_single_answer(*pair)
+    return res, time.perf_counter() - start
+
+
 class SemanticScorer:
-    def __init__(self):
-        self.model = get_model()
+    def __init__(self, window_mode=None):
+        # Wrapped so every encode() call is counted/timed (see metrics.py)
+        self.model = metrics.InstrumentedEncoder(get_model())
         # Lowered from 0.65 -- OCR garbling inherently reduces cosine similarity
         # even for correct answers. A score of 0.50 is a cleaner paraphrase signal.
         self.similarity_threshold = 0.50
@@ -26,110 +107,123 @@ class SemanticScorer:
             "has", "had", "do", "does", "did", "can", "could", "will", "would",
             "should", "may", "might", "must", "done", "used", "using", "uses"
         ])
+        self.concept_extractor = ConceptExtractor(self.model, self.stop_words)
+        self._analyses = OrderedDict()  # text -> SegmentAnalysis
+        # WINDOW_MODE unless given: "sentence" (exact) or "token" (single-pass pooling for 300+ word answers)
+        self.window_embedder = WindowEmbedder(self.model, mode=window_mode or WINDOW_MODE)
 
-    def extract_key_concepts(self, text, top_n=10):
+    def extract_key_concepts(self, text, top_n=10, diversity=None):
         """
         Extracts key concepts (n-grams) from text using embedding similarity (KeyBERT style).
+        See concepts.ConceptExtractor; `diversity` turns on MMR re-ranking.
         """
-        from sklearn.feature_extraction.text import CountVectorizer
-        from sklearn.metrics.pairwise import cosine_similarity
+        return self.concept_extractor.extract(text, top_n=top_n, diversity=diversity)
 
-        # 1. Extract candidate n-grams (1-gram to 3-gram)
-        # We use a simple regex for tokens to avoid complex NLTK dependencies if possible
-        n_gram_range = (1, 3)
-        stop_words_list = list(self.stop_words)
-        
-        try:
-            count = CountVectorizer(ngram_range=n_gram_range, stop_words=stop_words_list).fit([text])
-            candidates = count.get_feature_names_out()
-        except ValueError:
-            # If text is empty or only stopwords
-            return []
-
-        if len(candidates) == 0:
-            return []
-
-        # 2. Embed document and candidates
-        doc_embedding = self.model.encode([text], convert_to_tensor=True)
-        candidate_embeddings = self.model.encode(candidates, convert_to_tensor=True)
-
-        # 3. Calculate Similarity
-        # We want concepts that are most similar to the overall document meaning
-        # Move to CPU for sklearn
-        doc_embedding_np = doc_embedding.cpu().numpy()
-        candidate_embeddings_np = candidate_embeddings.cpu().numpy()
-        
-        distances = cosine_similarity(doc_embedding_np, candidate_embeddings_np)
-        
-        # 4. Select Top N
-        keywords = []
-        indices = distances.argsort()[0][-top_n:]
-        for i in indices:
-            keywords.append(candidates[i])
-            
-        # Reverse to get most relevant first
-        return keywords[::-1]
+    def analyze(self, text):
+        """
+        Returns the SegmentAnalysis (token index) for `text`, building it once
+        per distinct text. Accepts an existing SegmentAnalysis unchanged.
+        """
+        if isinstance(text, SegmentAnalysis):
+            return text
+        seg = self._analyses.get(text)
+        if seg is None:
+            seg = analyze_segment(text, self.stop_words)
+            self._analyses[text] = seg
+            while len(self._analyses) > ANALYSIS_CACHE_MAX:
+                self._analyses.popitem(last=False)
+        return seg
 
     def extract_keywords_simple(self, text):
         """
         Simple extraction for fallback or specific checks.
         """
-        clean = re.sub(r'[^\w\s]', '', text.lower())
-        words = clean.split()
-        return [w for w in words if len(w) > 3 and w not in self.stop_words]
+        return self.analyze(text).keywords
 
     def fuzzy_keyword_overlap(self, concept_keywords, student_text):
         """
         Returns True if any concept keyword is fuzzy-matched in student text.
         Requires proportional edit distances (no 2-edit matches for 4-letter words).
         """
-        student_words = self.extract_keywords_simple(student_text)
-        
+        with metrics.timer("fuzzy_match"):
+            return self._fuzzy_keyword_overlap(concept_keywords, self.analyze(student_text).length_buckets)
+
+    def _fuzzy_keyword_overlap(self, concept_keywords, buckets):
         # Heuristic: only allow fuzzy matching if the student's word is reasonably close in length
         # and doesn't diverge too quickly.
         for tgt in concept_keywords:
             if len(tgt) < 4:
                 continue # Do not fuzzy match very short words (e.g. "bus", "car", "net")
                 
-            for cand in student_words:
-                if abs(len(cand) - len(tgt)) > 2:
-                    continue
-                
-                # First char match (optimization & sanity)
-                if cand[0] != tgt[0]:
-                    continue
+            for length in range(len(tgt) - 2, len(tgt) + 3):
+                for cand in buckets.get(length, ()):
+                    # First char match (optimization & sanity)
+                    if cand[0] != tgt[0]:
+                        continue
+                        
+                    # Simple diff check
+                    diffs = sum(1 for a, b in zip(cand, tgt) if a != b)
+                    diffs += abs(len(cand) - len(tgt))
                     
-                # Simple diff check
-                diffs = sum(1 for a, b in zip(cand, tgt) if a != b)
-                diffs += abs(len(cand) - len(tgt))
-                
-                # Dynamic tolerance:
-                # 4-5 chars: 1 edit max
-                # 6+ chars: 2 edits max
-                tolerance = 1 if len(tgt) <= 5 else 2
-                
-                if diffs <= tolerance:
-                    return True
+                    # Dynamic tolerance:
+                    # 4-5 chars: 1 edit max
+                    # 6+ chars: 2 edits max
+                    tolerance = 1 if len(tgt) <= 5 else 2
+                    
+                    if diffs <= tolerance:
+                        return True
         return False
 
-    def ocr_noise_ratio(self, text):
+    def ocr_noise_ratio(self, text, ocr_noise=None):
         """
         Estimate what fraction of the text looks like OCR garbage.
         High ratio (>0.35) means the text is very noisy and scoring should be lenient.
+        `ocr_noise` is the share of the words OCR itself read with low confidence
+        (OCRDocument.low_confidence_ratio); the higher of the two estimates is used.
+        """
+        ratio = self.analyze(text).noise_ratio
+        if ocr_noise is not None:
+            ratio = max(ratio, ocr_noise)
+        return ratio
+
+    def is_content_token(self, token, vocabulary=()):
+        """
+        True for an alphanumeric run that carries meaning even in a noisy
+        segment: a number, a known word of 2+ letters (stop word, COMMON_TERMS,
+        `vocabulary`) or a word of TRIAGE_MIN_WORD_LETTERS+ letters with a vowel.
+        """
+        if token.isdigit():
+            return True
+        if not token.isalpha() or len(token) < 2:
+            return False
+        word = token.lower()
+        if word in self.stop_words or word in vocabulary or word in COMMON_TERMS:
+            return True
+        return len(word) >= TRIAGE_MIN_WORD_LETTERS and any(c in "aeiouy" for c in word)
+
+    def triage_segment(self, text, ocr_noise=None, vocabulary=()):
+        """
+        "empty" (nothing alphanumeric), "noise" (an ocr_noise_ratio >= TRIAGE_NOISE_RATIO
+        and not one content token, see is_content_token -- "CPU", "O(1)", "x = 5"
+        and "9.8 m/s2" all have one, "~ Il ,' lI|" has none) or "substantive".
+        `vocabulary` holds the exam's model-answer words (model_vocabulary).
+        Only substantive segments are embedded and scored; the others get their
+        TRIAGE_RESULTS entry.
         """
-        words = text.split()
-        if not words:
-            return 0.0
-        # Garbage words: contain >= 2 digits mixed with letters, or are mostly non-alpha
-        noise_words = 0
-        for w in words:
-            alpha_chars = sum(c.isalpha() for c in w)
-            digit_chars = sum(c.isdigit() for c in w)
-            if len(w) >= 2 and alpha_chars == 0:   # Purely non-alpha ("---", "...", "##")
-                noise_words += 1
-            elif digit_chars > 0 and alpha_chars > 0 and digit_chars >= alpha_chars:  # Like "42ab"
-                noise_words += 1
-        return noise_words / max(len(words), 1)
+        stripped = (text or "").strip()
+        if not any(c.isalnum() for c in stripped):
+            return "empty"
+        seg = self.analyze(text.replace('\n', ' '))
+        if self.ocr_noise_ratio(seg, ocr_noise) < TRIAGE_NOISE_RATIO:
+            return "substantive"
+        if any(self.is_content_token(t, vocabulary) for t in re.findall(r"[^\W_]+", stripped)):
+            return "substantive"
+        return "noise"
+
+    @staticmethod
+    def model_vocabulary(model_texts):
+        """Lowercase alphanumeric runs of the model answers (for triage_segment)."""
+        return {t for text in model_texts for t in re.findall(r"[^\W_]+", (text or "").lower())}
 
     def keyword_rescue_floor(self, model_keywords, student_text):
         """
@@ -144,12 +238,12 @@ class SemanticScorer:
             return 0
         
         matches = 0
-        student_lower = student_text.lower()
+        seg = self.analyze(student_text)
         for kw in meaty_kw:
             kw_lower = kw.lower()
-            if kw_lower in student_lower:
+            if kw_lower in seg.lower_text:
                 matches += 1
-            elif self.fuzzy_keyword_overlap([kw_lower], student_lower):
+            elif self.fuzzy_keyword_overlap([kw_lower], seg):
                 matches += 1
                 
         return matches
@@ -169,34 +263,53 @@ class SemanticScorer:
         if best_sem_score > high_threshold:
             return True
         
+        seg = self.analyze(student_text)
         concept_keywords = self.extract_keywords_simple(concept)
         
         # 2. Moderate Semantic + Answer likely relevant
         if best_sem_score > mid_threshold: 
-            student_keywords = self.extract_keywords_simple(student_text)
-            if set(concept_keywords) & set(student_keywords):
+            if set(concept_keywords) & seg.keyword_set:
                 return True
                 
         # 3. Loose Semantic + Fuzzy Keyword Support (Typos/Messy OCR)
         if best_sem_score > low_threshold:
-             if self.fuzzy_keyword_overlap(concept_keywords, student_text):
+             if self.fuzzy_keyword_overlap(concept_keywords, seg):
                  return True
 
         # 4. Keyword Rescue (Literal match despite bad semantic)
-        if concept.lower() in student_text.lower():
+        if concept.lower() in seg.lower_text:
              return True
              
         # 5. Fuzzy keyword alone — important for OCR noise
-        if self.fuzzy_keyword_overlap(concept_keywords, student_text):
+        if self.fuzzy_keyword_overlap(concept_keywords, seg):
              return True
              
         return False
 
 
-    def evaluate_single_answer(self, student_text, model_text):
+    def model_features(self, model_text):
+        """ModelFeatures of one model segment (newlines already replaced by spaces)."""
+        model_concepts = self.extract_key_concepts(model_text, top_n=8)
+        if not model_concepts:
+            model_concepts = [model_text]
+        import torch
+        # Concepts and the segment were embedded (normalized) while extracting
+        # the concepts; the extractor's cache hands those vectors back
+        vecs = torch.from_numpy(self.concept_extractor.embed(model_concepts + [model_text]))
+        return ModelFeatures(model_concepts, vecs[:-1], vecs[-1], self.extract_keywords_simple(model_text))
+
+    def model_features_many(self, model_texts):
+        """{model text: ModelFeatures} for all model segments of an exam, concepts extracted in one batch."""
+        texts = list(dict.fromkeys(t.replace('\n', ' ') for t in model_texts if t))
+        self.concept_extractor.extract_many(texts, top_n=8)
+        return {t: self.model_features(t) for t in texts}
+
+    def evaluate_single_answer(self, student_text, model_text, ocr_noise=None, features=None):
         """
         Evaluates answer using Granular Concept Matching.
-        Handles OCR-noisy student text with adaptive thresholds.
+        Handles OCR-noisy student text with adaptive thresholds
+        (`ocr_noise` as in ocr_noise_ratio). `features` are the model segment's
+        precomputed ModelFeatures (computed here when not given).
         """
         if not student_text or not model_text:
             return {"score": 0, "feedback": "Empty answer"}
@@ -204,53 +317,44 @@ class SemanticScorer:
         student_text = student_text.replace('\n', ' ')
         model_text = model_text.replace('\n', ' ')
 
+        # Token index for the student segment, shared by all helpers below
+        seg = self.analyze(student_text)
+
         # Detect OCR noise level in student answer
-        noise_ratio = self.ocr_noise_ratio(student_text)
+        noise_ratio = self.ocr_noise_ratio(seg, ocr_noise)
         noisy_mode = noise_ratio > 0.30
         if noisy_mode:
             print(f"    [Scoring] OCR noisy mode ON (noise_ratio={noise_ratio:.2f})")
 
-        # 1. Extract Concepts from model answer
-        model_concepts = self.extract_key_concepts(model_text, top_n=8)
-        if not model_concepts:
-            model_concepts = [model_text]
+        # 1. Concepts of the model answer (with their embeddings)
+        if features is None:
+            features = self.model_features(model_text)
+        model_concepts = features.concepts
+
+        from sentence_transformers import util
 
         # 2. Variable Windowing
-        # For short answers (<= 30 words), use the full text (windowing is harmful on short noisy text)
-        words = student_text.split()
-        window_size = 6
-        step_size = 3
-        windows = []
-        if len(words) <= window_size or len(words) <= 30:
-            windows.append(student_text)
-        else:
-            for i in range(0, len(words) - window_size + 1, step_size):
-                windows.append(" ".join(words[i:i+window_size]))
-            if len(words) % step_size != 0:
-                 windows.append(" ".join(words[-window_size:]))
-        
-        if not windows:
-            windows = [student_text]
-            
-        window_embeddings = self.model.encode(windows, convert_to_tensor=True)
+        # For short answers (<= 30 words), use the full text (windowing is harmful on short noisy text).
+        # Window + full-text embeddings are cached per student segment (see window_embeddings.py).
+        windows, window_embeddings, emb1 = self.window_embedder.embed(student_text)
         
         matched_concepts = []
         missing_concepts = []
         
-        for concept in model_concepts:
-            concept_emb = self.model.encode(concept, convert_to_tensor=True)
-            hits = util.semantic_search(concept_emb, window_embeddings, top_k=1)
-            best_score = hits[0][0]['score'] if hits and hits[0] else 0.0
+        # Best window for every concept in one search (cosine, so the stored
+        # normalized concept vectors score exactly like freshly encoded ones)
+        concept_hits = util.semantic_search(features.concept_embeddings.to(window_embeddings),
+                                            window_embeddings, top_k=1)
+        for concept, hits in zip(model_concepts, concept_hits):
+            best_score = hits[0]['score'] if hits else 0.0
             
-            if self.check_match(concept, student_text, best_score, noisy_mode=noisy_mode):
+            if self.check_match(concept, seg, best_score, noisy_mode=noisy_mode):
                 matched_concepts.append(concept)
             else:
                 missing_concepts.append(concept)
 
         # 3. Overall Similarity
-        emb1 = self.model.encode(student_text, convert_to_tensor=True)
-        emb2 = self.model.encode(model_text, convert_to_tensor=True)
-        overall_sim = float(util.cos_sim(emb1, emb2)[0][0])
+        overall_sim = float(util.cos_sim(emb1, features.embedding.to(emb1))[0][0])
         
         # 4. Final Score — CONCEPT-DRIVEN (Pure Semantic Grading)
         # We rely on the AI's holistic understanding of the answer block.
@@ -287,9 +391,8 @@ class SemanticScorer:
         
         # 5. Keyword Rescue Floor: if ≥2 subject keywords found, guarantee ≥35%
         # But ONLY if the text actually has some length. Prevents zeros from bad OCR.
-        words = student_text.split()
-        model_simple_kws = self.extract_keywords_simple(model_text)
-        kw_hits = self.keyword_rescue_floor(model_simple_kws, student_text)
+        words = seg.tokens
+        kw_hits = self.keyword_rescue_floor(features.keywords, seg)
         if kw_hits >= 2 and len(words) > 5:
             final_score = max(final_score, 0.35)
             print(f"    [Scoring] Keyword rescue: {kw_hits} keywords matched -> floor 35%")
@@ -329,10 +432,79 @@ class SemanticScorer:
         }
 
 
-    def evaluate_exam(self, student_segments, model_segments, question_schema=None):
+    def score_answer_pairs(self, pairs, workers=None, labels=None):
+        """
+        Runs evaluate_single_answer on each (student_text, model_text[, ocr_noise[, features]])
+        pair and returns the results in the same order as `pairs`.
+
+        With workers > 1 the pairs are dispatched to a process pool. On
+        platforms with fork() the workers inherit this scorer (and its already
+        loaded model) copy-on-write, so the weights are not reloaded or pickled.
+        Elsewhere a thread pool is used instead (torch releases the GIL while
+        encoding, so this still overlaps the heavy work).
+
+        `labels` (e.g. question keys) name each pair in the job's timing profile.
+        """
+        if labels is None:
+            labels = [None] * len(pairs)
+
+        if not workers or workers <= 1 or len(pairs) <= 1:
+            timed = self._collect(map(self._timed_score, pairs), labels)
+        else:
+            workers = min(workers, len(pairs))
+            if "fork" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("fork")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                         initializer=_init_pool_worker, initargs=(self,)) as pool:
+                    timed = self._collect(pool.map(_pool_score_pair, pairs), labels)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    timed = self._collect(pool.map(self._timed_score, pairs), labels)
+
+        for label, (_, seconds) in zip(labels, timed):
+            metrics.record("score.question", seconds, question=label)
+        return [res for res, _ in timed]
+
+    def _collect(self, timed_iter, labels):
+        # Consumed in the job thread (not in pool workers) so each question's
+        # progress event is published as soon as its result arrives
+        timed = []
+        for label, (res, seconds) in zip(labels, timed_iter):
+            timed.append((res, seconds))
+            events.emit("question", question=label, raw_score=res.get("score"),
+                        done=len(timed), total=len(labels))
+        return timed
+
+    def _timed_score(self, pair):
+        start = time.perf_counter()
+        res = self.evaluate_single_answer(*pair)
+        return res, time.perf_counter() - start
+
+    @staticmethod
+    def _planned_noise(ocr_noise, m_key, kind, extra):
+        # OCR confidence noise of the student segment(s) a planned pair uses
+        if not ocr_noise:
+            return None
+        if kind == "exact":
+            return ocr_noise.get(m_key)
+        if kind == "aggregated":
+            values = [ocr_noise[k] for k in extra if ocr_noise.get(k) is not None]
+            return sum(values) / len(values) if values else None
+        return ocr_noise.get(extra)
+
+    def evaluate_exam(self, student_segments, model_segments, question_schema=None, workers=None,
+                      ocr_noise=None, model_features=None):
         """
         Evaluates full exam with 'OR' logic and variable Max Marks using schema.
+        `workers` > 1 scores the matched questions in parallel (see score_answer_pairs).
+        `ocr_noise` maps student keys to the share of their words OCR read with
+        low confidence (see pipeline.score_student).
+        `model_features` ({model text: ModelFeatures}, see model_features_many)
+        is the exam's precomputed model side; without it, it is computed here.
+        Matched student segments are triaged first (see triage_segment); the
+        counts are returned under "triage".
         """
+        from sentence_transformers import util
         results = []
         processed_model_keys = set()
         
@@ -429,14 +601,18 @@ class SemanticScorer:
         # PASS 1: Exact and base-number matches only (safe, reliable)
         # These should always be assigned first before semantic fallback
         # ------------------------------------------------------------------
+        # Matching decisions never depend on the scores, so both passes only
+        # PLAN the (student text, model text) pairs here. The CPU-heavy
+        # evaluate_single_answer calls run afterwards, optionally in a pool,
+        # and are applied back in model-key order so results stay deterministic.
         score_data_map = {}  # m_key -> score_data
         pass1_matched = set()  # model keys that found a match in Pass 1
+        planned = []  # (m_key, student_text, kind, extra) in model-key order
         
         for m_key in model_keys:
             info = model_key_info[m_key]
-            model_ans = model_segments[m_key]
             
-            score_data = {
+            score_data_map[m_key] = {
                 "question": m_key,
                 "_base_key": m_key,   # FIX: preserve clean key before any annotation added
                 "score": 0,
@@ -448,28 +624,17 @@ class SemanticScorer:
             
             # 1. Exact match
             if m_key in student_segments and m_key not in globally_matched_students:
-                res = self.evaluate_single_answer(student_segments[m_key], model_ans)
-                raw_score_normalized = res['score'] / 10.0
-                
-                score_data.update(res)
-                score_data['score'] = round(raw_score_normalized * info["max_marks"], 1)
+                planned.append((m_key, student_segments[m_key], "exact", None))
                 globally_matched_students.add(m_key)
                 pass1_matched.add(m_key)
                 print(f"    [Pass1] Q{m_key} exact-matched to student Q{m_key}")
                 
             # 2. Base match (e.g. Model '1a', Student '1')
             elif info["base_num"] in student_segments and info["base_num"] not in globally_matched_students:
-                res = self.evaluate_single_answer(student_segments[info["base_num"]], model_ans)
-                raw_score_normalized = res['score'] / 10.0
-                
-                score_data.update(res)
-                score_data['question'] = f"{m_key} (checked against Q{info['base_num']})"
-                score_data['score'] = round(raw_score_normalized * info["max_marks"], 1)
+                planned.append((m_key, student_segments[info["base_num"]], "base", info["base_num"]))
                 globally_matched_students.add(info["base_num"])
                 pass1_matched.add(m_key)
                 print(f"    [Pass1] Q{m_key} base-matched to student Q{info['base_num']}")
-            
-            score_data_map[m_key] = score_data
         
         print(f"    [Pass1] Matched {len(pass1_matched)}/{len(model_keys)} model keys via exact/base")
         print(f"    [Pass1] Consumed student keys: {globally_matched_students}")
@@ -479,6 +644,13 @@ class SemanticScorer:
         # Only uses student answers NOT consumed in Pass 1
         # ------------------------------------------------------------------
         unmatched_model_keys = [mk for mk in model_keys if mk not in pass1_matched]
+
+        vocabulary = self.model_vocabulary(model_segments.values())
+
+        def is_candidate(sk):
+            s_text = student_segments[sk]
+            return len(s_text.strip()) >= TRIAGE_MIN_CHARS and \
+                self.triage_segment(s_text, (ocr_noise or {}).get(sk), vocabulary) == "substantive"
         
         if unmatched_model_keys and student_segments:
             unmatched_student_keys = [sk for sk in student_segments if sk not in globally_matched_students]
@@ -487,7 +659,6 @@ class SemanticScorer:
             
             for m_key in unmatched_model_keys:
                 model_ans = model_segments[m_key]
-                info = model_key_info[m_key]
                 score_data = score_data_map[m_key]
                 
                 # Recompute available student keys (some may have been consumed in this pass)
@@ -507,14 +678,7 @@ class SemanticScorer:
                 if student_sub_keys:
                     student_sub_keys.sort()
                     combined_text = " ".join([student_segments[k] for k in student_sub_keys])
-                    
-                    res = self.evaluate_single_answer(combined_text, model_ans)
-                    raw_score_normalized = res['score'] / 10.0
-                    
-                    score_data.update(res)
-                    score_data['question'] = f"{m_key}"
-                    score_data['score'] = round(raw_score_normalized * info["max_marks"], 1)
-                    score_data['feedback'] += f" (aggregated from student Q{', Q'.join(student_sub_keys)})"
+                    planned.append((m_key, combined_text, "aggregated", student_sub_keys))
                     
                     globally_matched_students.update(student_sub_keys)
                     print(f"    [Pass2] Q{m_key} aggregated match to student Q{student_sub_keys}")
@@ -522,14 +686,15 @@ class SemanticScorer:
                 elif available_keys:
                     best_match_key = None
                     best_match_score = -1
+
+                    # Only substantive segments are worth a semantic match; when
+                    # none is left, nothing (not even the model text) is encoded
+                    candidates = [sk for sk in available_keys if is_candidate(sk)]
+                    model_emb = self.window_embedder.encode_text(model_ans[:500]) if candidates else None
                     
-                    model_emb = self.model.encode(model_ans[:500], convert_to_tensor=True)
-                    
-                    for sk in available_keys:
+                    for sk in candidates:
                         s_text = student_segments[sk]
-                        if len(s_text.strip()) < 10:
-                            continue
-                        s_emb = self.model.encode(s_text[:500], convert_to_tensor=True)
+                        s_emb = self.window_embedder.encode_text(s_text[:500])
                         sim = float(util.cos_sim(model_emb, s_emb)[0][0])
                         
                         if sim > best_match_score:
@@ -538,13 +703,7 @@ class SemanticScorer:
                     
                     # Only use if similarity is reasonable (> 0.2)
                     if best_match_key and best_match_score > 0.2:
-                        res = self.evaluate_single_answer(student_segments[best_match_key], model_ans)
-                        raw_score_normalized = res['score'] / 10.0
-                        
-                        score_data.update(res)
-                        score_data['question'] = f"{m_key}"
-                        score_data['score'] = round(raw_score_normalized * info["max_marks"], 1)
-                        score_data['feedback'] += f" (matched to Q{best_match_key})"
+                        planned.append((m_key, student_segments[best_match_key], "semantic", best_match_key))
                         
                         globally_matched_students.add(best_match_key)
                         print(f"    [Pass2] Q{m_key} semantic-matched to student Q{best_match_key} (sim={best_match_score:.2f})")
@@ -556,14 +715,65 @@ class SemanticScorer:
                     score_data['score'] = 0
                     score_data['feedback'] = "Not Attempted"
                     print(f"    [Pass2] Q{m_key} -> Not Attempted (no available student keys)")
-                
-                score_data_map[m_key] = score_data
         elif unmatched_model_keys:
             for m_key in unmatched_model_keys:
                 score_data_map[m_key]['score'] = 0
                 score_data_map[m_key]['feedback'] = "Not Attempted"
                 print(f"    [Pass2] Q{m_key} -> Not Attempted (no student segments at all)")
 
+        # ------------------------------------------------------------------
+        # TRIAGE: empty and noise-only answers get their fixed result here;
+        # only substantive ones reach the embedding model below
+        # ------------------------------------------------------------------
+        planned_noise = [self._planned_noise(ocr_noise, m_key, kind, extra) for m_key, _, kind, extra in planned]
+        triage = [self.triage_segment(s_text, noise, vocabulary) if model_segments[m_key] else "substantive"
+                  for (m_key, s_text, _, _), noise in zip(planned, planned_noise)]
+        triage_stats = {"empty": 0, "noise": 0, "substantive": 0}
+        for (m_key, _, _, _), cls in zip(planned, triage):
+            triage_stats[cls] += 1
+            if cls != "substantive":
+                print(f"    [Triage] Q{m_key} -> {cls}, not scored")
+        triage_stats["not_attempted"] = len(model_keys) - len(planned)
+        print(f"[Scoring] Triage: {triage_stats}")
+        for cls in ("empty", "noise"):
+            if triage_stats[cls]:
+                metrics.count(f"segments_{cls}_total", triage_stats[cls])
+
+        # ------------------------------------------------------------------
+        # SCORING: run the substantive pairs (serially or in a worker pool)
+        # ------------------------------------------------------------------
+        scored = [i for i, cls in enumerate(triage) if cls == "substantive"]
+        # Model-side features of every segment: precomputed per exam, or all
+        # extracted here in one batch before any answer is scored
+        if model_features is None:
+            model_features = self.model_features_many([model_segments[planned[i][0]] for i in scored])
+        pairs = [(planned[i][1], model_segments[planned[i][0]], planned_noise[i],
+                  model_features.get(model_segments[planned[i][0]].replace('\n', ' ')))
+                 for i in scored]
+        # Likewise window + encode every matched student segment in one batch
+        self.window_embedder.prefetch([s.replace('\n', ' ') for s, m, _, _ in pairs if s and m])
+        scored_results = self.score_answer_pairs(pairs, workers=workers,
+                                                 labels=[planned[i][0] for i in scored])
+        planned_results = [dict(TRIAGE_RESULTS.get(cls, {})) for cls in triage]
+        for i, res in zip(scored, scored_results):
+            planned_results[i] = res
+        
+        for (m_key, _, kind, extra), res in zip(planned, planned_results):
+            info = model_key_info[m_key]
+            score_data = score_data_map[m_key]
+            raw_score_normalized = res['score'] / 10.0
+            
+            score_data.update(res)
+            score_data['score'] = round(raw_score_normalized * info["max_marks"], 1)
+            if kind == "base":
+                score_data['question'] = f"{m_key} (checked against Q{extra})"
+            elif kind == "aggregated":
+                score_data['question'] = f"{m_key}"
+                score_data['feedback'] += f" (aggregated from student Q{', Q'.join(extra)})"
+            elif kind == "semantic":
+                score_data['question'] = f"{m_key}"
+                score_data['feedback'] += f" (matched to Q{extra})"
+
         # Add all results to groups
         for m_key in model_keys:
             info = model_key_info[m_key]
@@ -656,6 +866,7 @@ class SemanticScorer:
         return {
             "breakdown": final_results,
             "total_score": round(final_obtained, 1),
-            "max_score": final_max
+            "max_score": final_max,
+            "triage": triage_stats
         }
 
@@ -0,0 +1,194 @@
+"""
+Production server: a pre-fork launcher for app.py.
+
+    python serve.py --workers 4 --port 5000
+    python serve.py --workers 2 --host 0.0.0.0 --no-preload-ocr
+
+`python app.py` is the Flask development server (reloader, one process), and
+running N copies of it costs N copies of the models. serve.py instead loads
+everything heavy once, in the master process -- the app's scorer (with the
+SentenceTransformer) and the EasyOCR reader are created before forking --
+then gc.freeze()s the heap and forks --workers processes that share one
+listening socket. The workers get the model weights copy-on-write: the
+pages stay shared as long as nobody writes them, which inference doesn't.
+Each worker is a threaded WSGI server. Workers that die are restarted, and
+SIGTERM / Ctrl-C stops them all.
+
+Per worker, torch and Tesseract get cpu_count / workers threads (unless
+TESSERACT_POOL_SIZE is set), so N workers don't oversubscribe the cores.
+
+The workers share what the client follows across requests: results are in
+the SQLite result store, and job progress events are appended to a log in
+EVENTS_DIR (see events.py), so /jobs/<id>/events works on whichever worker
+gets the request. Still per worker: /jobs/<id>/profile (only on the worker
+that ran the job), /metrics (scrape each worker, or sum) and the resident
+exam contexts (exam_context.py).
+
+With INFERENCE_SOCKET pointing at a running inference_daemon.py, the master
+loads no models at all: every worker sends its encode and OCR requests to
+the daemon, which batches them across workers (and across other processes
+on the box, e.g. grade.py runs).
+
+Throughput: load_test.py submits evaluations at several concurrency levels
+against a running server and reports completed evaluations per minute and
+p50/p95 latency. Measured with `load_test.py --concurrency 1,2,4 --requests 4`
+(one-page synthetic scripts) on a 1-vCPU container, with real Tesseract OCR
+but EasyOCR and the sentence model replaced by light stand-ins (no model
+downloads there) -- so these show the server's behaviour, not real model
+cost; the first requests include each worker's warm-up:
+
+    workers  concurrency  evals/min   p50 s   p95 s
+       1          1          14.4       3.6     6.7
+       1          2          16.6       7.4     8.3
+       1          4          17.8      13.0    13.5
+       2          1          10.9       7.3     7.3
+       2          2          15.0       8.1     8.2
+       2          4          18.2      12.7    13.2
+
+On one core a second worker can't add throughput (it is the same within
+noise); the point there is that it doesn't cost a second copy of what the
+master loaded: after that run each worker still shared ~550 MB with the
+master (smaps: Shared_Clean + Shared_Dirty; RSS 813 / 1036 MB, PSS 450 /
+673 MB). Re-run load_test.py on the target hardware, with the real models,
+for sizing.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# Seconds a restarted worker waits, so a worker failing at startup doesn't spin
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+class _Stop(Exception):
+    """Raised by the master's SIGTERM / SIGINT handler."""
+
+
+def _preload(preload_ocr):
+    """Import the app and load the sentence model and the OCR reader in the master."""
+    import app as webapp
+    webapp.get_scorer()
+    if preload_ocr:
+        import ocr_service
+        try:
+            ocr_service.get_reader()
+        except Exception as e:
+            print(f"[Serve] EasyOCR not preloaded ({e}); each worker loads it on first use")
+    return webapp
+
+
+def _worker(webapp, sock, host, port, threads_per_worker):
+    from werkzeug.serving import make_server
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = make_server(host, port, webapp.app, threaded=True, fd=sock.fileno())
+    print(f"[Serve] Worker {os.getpid()} serving")
+    server.serve_forever()
+
+
+def _spawn(webapp, sock, host, port, threads_per_worker):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _worker(webapp, sock, host, port, threads_per_worker)
+        except BaseException as e:
+            print(f"[Serve] Worker {os.getpid()} stopped: {e!r}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(host="127.0.0.1", port=5000, workers=2, preload_ocr=True):
+    cpus = os.cpu_count() or 1
+    threads_per_worker = max(1, cpus // workers)
+    os.environ.setdefault("TESSERACT_POOL_SIZE", str(threads_per_worker))
+    # Every worker appends its jobs' events here, every worker can stream them
+    import events
+    own_events_dir = not events.EVENTS_DIR
+    if own_events_dir:
+        events.EVENTS_DIR = tempfile.mkdtemp(prefix="answersheet-events-")
+
+    start = time.time()
+    webapp = _preload(preload_ocr)
+    import metrics
+    print(f"[Serve] Models loaded in {time.time() - start:.1f}s, master RSS "
+          f"{metrics.current_rss_bytes() / 2 ** 20:.0f} MB; forking {workers} worker(s)")
+
+    sock = socket.create_server((host, port), backlog=128)
+    sock.set_inheritable(True)
+    # Objects alive now are never collected in the workers, so the collector
+    # doesn't touch (and un-share) their pages
+    gc.collect()
+    gc.freeze()
+
+    children = set()
+
+    def stop(signum, frame):
+        raise _Stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        children.add(_spawn(webapp, sock, host, port, threads_per_worker))
+    print(f"[Serve] Listening on http://{host}:{sock.getsockname()[1]} with workers {sorted(children)}")
+
+    try:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            children.discard(pid)
+            print(f"[Serve] Worker {pid} exited ({status}), restarting")
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            children.add(_spawn(webapp, sock, host, port, threads_per_worker))
+    except _Stop:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        sock.close()
+        if own_events_dir:
+            import shutil
+            shutil.rmtree(events.EVENTS_DIR, ignore_errors=True)
+        print("[Serve] Stopped")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pre-fork production server for the grading app")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=int(os.environ.get("PORT", "5000")))
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", "2")),
+                    help="worker processes (default: SERVE_WORKERS or 2)")
+    ap.add_argument("--no-preload-ocr", action="store_true",
+                    help="don't load the EasyOCR reader in the master")
+    args = ap.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); on this platform run app.py behind a WSGI server instead")
+    serve(args.host, args.port, max(1, args.workers), preload_ocr=not args.no_preload_ocr)
+
+
+if __name__ == "__main__":
+    main()
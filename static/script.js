@@ -64,7 +64,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // ═══════════════════════════════════════════════
-    //  Form Submission with AJAX + Polling
+    //  Form Submission with AJAX + Progress Events
     // ═══════════════════════════════════════════════
     const form = document.getElementById('upload-form');
     const overlay = document.getElementById('loading-overlay');
@@ -104,7 +104,7 @@ document.addEventListener('DOMContentLoaded', () => {
                             throw new Error(`Server error (${response.status})`);
                         });
                     }
-                    startPolling(startTime);
+                    return response.json().then(data => followJob(data.job_id, startTime));
                 })
                 .catch(error => {
                     if (overlay) overlay.style.display = 'none';
@@ -115,30 +115,82 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    function startPolling(startTime) {
-        const pollInterval = setInterval(() => {
-            const elapsed = Math.floor((Date.now() - startTime) / 1000);
-            const mins = Math.floor(elapsed / 60);
-            const secs = elapsed % 60;
-            const timeStr = mins > 0 ? `${mins}m ${secs}s` : `${secs}s`;
-
-            fetch('/progress')
-                .then(res => res.json())
-                .then(data => {
-                    if (data.status === 'processing' && loadingText) {
-                        loadingText.textContent = `Step ${data.step}/${data.total_steps}: ${data.message} (${timeStr})`;
-                    } else if (data.status === 'done') {
-                        clearInterval(pollInterval);
-                        if (loadingTitle) loadingTitle.textContent = 'Almost done...';
-                        if (loadingText) loadingText.textContent = 'Loading results...';
-                        window.location.href = '/results';
-                    } else if (data.status === 'error') {
-                        clearInterval(pollInterval);
-                        if (overlay) overlay.style.display = 'none';
-                        alert('Evaluation Failed:\n\n' + (data.message || 'Unknown error') + '\n\nPlease check your files and try again.');
-                    }
-                })
-                .catch(() => { /* ignore polling errors */ });
-        }, 2000);
+    function elapsedLabel(startTime) {
+        const elapsed = Math.floor((Date.now() - startTime) / 1000);
+        const mins = Math.floor(elapsed / 60);
+        const secs = elapsed % 60;
+        return mins > 0 ? `${mins}m ${secs}s` : `${secs}s`;
+    }
+
+    // Applies one progress event; returns true once the job has finished
+    function handleEvent(type, data, state) {
+        if (type === 'stage') {
+            state.stage = `Step ${data.step}/${data.total_steps}: ${data.message}`;
+            state.detail = '';
+        } else if (type === 'page') {
+            const doc = data.document ? `${data.document} ` : '';
+            state.detail = `OCR ${doc}page ${data.page}/${data.total} done`;
+        } else if (type === 'question') {
+            state.detail = `Scored Q${data.question} (${data.done}/${data.total})`;
+        } else if (type === 'done') {
+            if (loadingTitle) loadingTitle.textContent = 'Almost done...';
+            if (loadingText) loadingText.textContent = 'Loading results...';
+            window.location.href = `/results/${state.jobId}`;
+            return true;
+        } else if (type === 'failed') {
+            if (overlay) overlay.style.display = 'none';
+            alert('Evaluation Failed:\n\n' + (data.message || 'Unknown error') + '\n\nPlease check your files and try again.');
+            return true;
+        }
+        if (loadingText) {
+            const detail = state.detail ? ` — ${state.detail}` : '';
+            loadingText.textContent = `${state.stage}${detail} (${elapsedLabel(state.startTime)})`;
+        }
+        return false;
+    }
+
+    function followJob(jobId, startTime) {
+        const state = { jobId: jobId, stage: 'Processing...', detail: '', startTime: startTime, lastId: 0 };
+        if (!window.EventSource) {
+            longPoll(jobId, state);
+            return;
+        }
+
+        const source = new EventSource(`/jobs/${jobId}/events`);
+        let failures = 0;
+        ['stage', 'page', 'question', 'done', 'failed'].forEach(type => {
+            source.addEventListener(type, (ev) => {
+                failures = 0;
+                state.lastId = parseInt(ev.lastEventId, 10) || state.lastId;
+                if (handleEvent(type, JSON.parse(ev.data), state)) source.close();
+            });
+        });
+        // EventSource reconnects on its own (resuming via Last-Event-ID);
+        // fall back to long-polling if the stream keeps failing (e.g. a proxy buffers it)
+        source.onerror = () => {
+            failures += 1;
+            if (failures >= 3) {
+                source.close();
+                longPoll(jobId, state);
+            }
+        };
+    }
+
+    function longPoll(jobId, state) {
+        fetch(`/jobs/${jobId}/events/poll?after=${state.lastId}&timeout=25`)
+            .then(res => res.json())
+            .then(data => {
+                if (data.error) {
+                    handleEvent('failed', { message: data.error }, state);
+                    return;
+                }
+                let finished = false;
+                (data.events || []).forEach(ev => {
+                    state.lastId = ev.id;
+                    if (!finished) finished = handleEvent(ev.type, ev.data, state);
+                });
+                if (!finished) longPoll(jobId, state);
+            })
+            .catch(() => setTimeout(() => longPoll(jobId, state), 2000));
     }
 });
@@ -0,0 +1,248 @@
+"""
+Synthetic answer booklets for benchmarks and regression runs.
+
+Generates, from a fixed seed:
+  * a student booklet (multi-page PDF) with handwriting-like jittered text,
+    red-ink teacher marks and university page headers (matching
+    pdf_parser.PAGE_HEADER_PATTERNS),
+  * the matching model answer PDF,
+  * a question paper PDF with "<q> | <text> <marks> |CO<n>" rows, sub-parts
+    (7a/7b) and an OR alternative,
+  * the ground-truth text per question (so stages can be benchmarked without OCR).
+
+Run: python synthetic_sheets.py --questions 8 --out bench_data
+"""
+import argparse
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+PAGE_SIZE = (1240, 1754)  # A4 at 150 DPI, the DPI ocr_service rasterizes PDFs at
+MARGIN = 90
+LINE_HEIGHT = 46
+
+# Fonts tried in order; handwriting-like faces first (Windows / common Linux names)
+FONT_CANDIDATES = ["segoepr.ttf", "comic.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf"]
+
+PAGE_HEADERS = [
+    "Muthoot Institute of Technology & Science    Main Sheet",
+    "Muthoot Institute of Technology & Science    Additional Sheet",
+]
+
+# Model answers; students get noisy paraphrases of these
+TOPICS = [
+    "Decision tree pruning removes branches that provide little power to classify instances. Pruning reduces the complexity of the classifier and reduces overfitting.",
+    "Supervised learning trains a model on labeled data. The algorithm learns from input output pairs and predicts labels for new data such as regression and classification.",
+    "Overfitting occurs when a model learns the training data too well including noise and outliers, resulting in poor generalization to unseen data.",
+    "Binary search works on a sorted array by comparing the target with the middle element and halving the interval. Best case is O(1) and worst case is O(log n).",
+    "A stack is a linear data structure that follows last in first out order. Push adds an element to the top and pop removes the top element.",
+    "Dijkstra's algorithm finds the shortest path from a source vertex to all vertices in a graph with non negative edge weights using a priority queue.",
+    "Normalization in databases organizes tables to reduce redundancy. First normal form removes repeating groups and second normal form removes partial dependencies.",
+    "A process is a program in execution with its own address space. A thread is a lightweight unit of execution that shares the address space of its process.",
+    "Gradient descent updates model parameters in the direction of the negative gradient of the loss function, scaled by the learning rate, until convergence.",
+    "Hashing maps keys to array indices using a hash function. Collisions are handled by chaining with linked lists or by open addressing with probing.",
+    "TCP is a connection oriented protocol that guarantees reliable ordered delivery using acknowledgements and retransmission, while UDP is connectionless.",
+    "Photosynthesis is the process by which green plants use sunlight, water and carbon dioxide to make glucose and release oxygen.",
+]
+
+SYNONYMS = {
+    "removes": "cuts", "reduces": "lowers", "model": "model", "data": "data",
+    "algorithm": "algoritm", "interval": "range", "element": "elemnt",
+    "structure": "structre", "organizes": "arranges", "guarantees": "ensures",
+}
+
+
+def _load_font(size):
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def build_exam(num_questions, seed=0):
+    """
+    Returns (questions, marks) for an exam with `num_questions` answer keys.
+    Q7 (when present) is split into 7a/7b and paired with Q8 as an OR group.
+    """
+    rng = random.Random(seed)
+    keys = []
+    for n in range(1, num_questions + 1):
+        if n == 7:
+            keys.extend(["7a", "7b"])
+        else:
+            keys.append(str(n))
+    questions = {}
+    for i, key in enumerate(keys):
+        questions[key] = TOPICS[(i + seed) % len(TOPICS)]
+    marks = {k: rng.choice([3, 5, 8]) if not k.startswith("7") else 4 for k in keys}
+    return questions, marks
+
+
+def student_version(text, rng, noise=0.15):
+    """Paraphrase + OCR/handwriting-style typos of a model answer."""
+    words = []
+    for w in text.split():
+        core = w.strip(".,()")
+        if core.lower() in SYNONYMS and rng.random() < 0.5:
+            w = w.replace(core, SYNONYMS[core.lower()])
+        if len(w) > 4 and rng.random() < noise:
+            i = rng.randrange(1, len(w) - 1)
+            w = w[:i] + rng.choice("aeiourn") + w[i + 1:]
+        if rng.random() < noise / 3:
+            continue  # dropped word
+        words.append(w)
+    return " ".join(words)
+
+
+def exam_text(questions):
+    """Plain-text transcript in answer-booklet order, with sub-parts and OR pairing."""
+    lines = []
+    for key, text in questions.items():
+        if key.endswith("a"):
+            lines.append(f"{key[:-1]}. a) {text}")
+        elif key.endswith("b"):
+            lines.append(f"b) {text}")
+        else:
+            lines.append(f"{key}. {text}")
+    return "\n".join(lines)
+
+
+def question_paper_text(questions, marks, seed=0):
+    rng = random.Random(seed)
+    total = sum(m for k, m in marks.items() if k != "8")
+    lines = ["APJ ABDUL KALAM TECHNOLOGICAL UNIVERSITY", f"Max. Marks: {total}", ""]
+    for key in questions:
+        prompt = "Explain " + questions[key].split(" ")[0].lower() + " " + " ".join(questions[key].split(" ")[1:6])
+        if key.endswith("a"):
+            lines.append(f"{key[:-1]}. a) | {prompt} {marks[key]} |CO{rng.randint(1, 5)}")
+        elif key.endswith("b"):
+            lines.append(f"b) | {prompt} {marks[key]} |CO{rng.randint(1, 5)}")
+        else:
+            lines.append(f"{key}. | {prompt} {marks[key]} |CO{rng.randint(1, 5)}")
+        if key == "7b" and "8" in questions:
+            lines.append("OR")
+    return "\n".join(lines)
+
+
+def _wrap(text, draw, font, width):
+    lines = []
+    for para in text.split("\n"):
+        current = ""
+        for word in para.split():
+            trial = (current + " " + word).strip()
+            if draw.textlength(trial, font=font) > width and current:
+                lines.append(current)
+                current = word
+            else:
+                current = trial
+        lines.append(current)
+    return lines
+
+
+def render_pages(text, seed=0, handwriting=True, red_ink=True, headers=True, font_size=30):
+    """Render a transcript into a list of RGB page images."""
+    rng = random.Random(seed)
+    font = _load_font(font_size)
+    probe = ImageDraw.Draw(Image.new("RGB", (10, 10)))
+    lines = _wrap(text, probe, font, PAGE_SIZE[0] - 2 * MARGIN)
+    per_page = (PAGE_SIZE[1] - 2 * MARGIN - (LINE_HEIGHT * 2 if headers else 0)) // LINE_HEIGHT
+
+    pages = []
+    for start in range(0, max(len(lines), 1), per_page):
+        page_no = len(pages)
+        img = Image.new("RGB", PAGE_SIZE, (250, 249, 244))
+        draw = ImageDraw.Draw(img)
+        y = MARGIN
+        if headers:
+            draw.text((MARGIN, y), PAGE_HEADERS[0 if page_no == 0 else 1], fill=(40, 40, 40), font=font)
+            y += LINE_HEIGHT * 2
+        ink = (20, 30, 90)  # blue-black pen
+        for line in lines[start:start + per_page]:
+            x = MARGIN + (rng.randint(-6, 10) if handwriting else 0)
+            for word in line.split():
+                dy = rng.randint(-3, 3) if handwriting else 0
+                draw.text((x, y + dy), word, fill=ink, font=font)
+                x += draw.textlength(word + " ", font=font) + (rng.randint(-2, 6) if handwriting else 0)
+            y += LINE_HEIGHT
+        if red_ink:
+            _draw_red_marks(draw, rng, y)
+        if handwriting:
+            img = img.rotate(rng.uniform(-1.2, 1.2), resample=Image.BICUBIC, fillcolor=(250, 249, 244))
+            img = img.filter(ImageFilter.GaussianBlur(radius=0.6))
+        pages.append(img)
+    return pages
+
+
+def _draw_red_marks(draw, rng, text_bottom):
+    red = (210, 25, 30)
+    for _ in range(rng.randint(2, 5)):
+        x = rng.randint(PAGE_SIZE[0] - MARGIN - 60, PAGE_SIZE[0] - 30)
+        y = rng.randint(MARGIN, max(MARGIN + 1, text_bottom))
+        draw.line([(x, y), (x + 12, y + 16), (x + 40, y - 20)], fill=red, width=4)  # tick
+    cx, cy = rng.randint(MARGIN, PAGE_SIZE[0] // 2), rng.randint(MARGIN, max(MARGIN + 1, text_bottom))
+    draw.ellipse([cx, cy, cx + 160, cy + 50], outline=red, width=3)
+    draw.text((PAGE_SIZE[0] - MARGIN - 40, PAGE_SIZE[1] - MARGIN), f"{rng.randint(3, 9)}/10", fill=red, font=_load_font(36))
+
+
+def save_pdf(pages, path):
+    pages[0].save(path, "PDF", resolution=150, save_all=True, append_images=pages[1:])
+    return path
+
+
+def generate_booklet_set(out_dir, num_questions=8, seed=0, answer_repeats=1):
+    """
+    Writes student.pdf, model.pdf, question_paper.pdf and truth.json into out_dir.
+    `answer_repeats` lengthens each student answer (more pages per booklet).
+    Returns the paths plus ground truth.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    questions, marks = build_exam(num_questions, seed)
+    student = {k: " ".join(student_version(v, rng) for _ in range(answer_repeats)) for k, v in questions.items()}
+    if "8" in student:
+        del student["8"]  # the student picks 7a/7b from the 7 OR 8 pair
+
+    model_text = exam_text(questions)
+    student_text = exam_text(student)
+    qp_text = question_paper_text(questions, marks, seed)
+
+    paths = {
+        "student": save_pdf(render_pages(student_text, seed=seed), os.path.join(out_dir, "student.pdf")),
+        "model": save_pdf(render_pages(model_text, seed=seed + 1, handwriting=False, red_ink=False),
+                          os.path.join(out_dir, "model.pdf")),
+        "question_paper": save_pdf(render_pages(qp_text, seed=seed + 2, handwriting=False, red_ink=False, headers=False),
+                                   os.path.join(out_dir, "question_paper.pdf")),
+    }
+    truth = {
+        "seed": seed,
+        "num_questions": num_questions,
+        "model_segments": questions,
+        "student_segments": student,
+        "marks": marks,
+        "model_text": model_text,
+        "student_text": student_text,
+        "question_paper_text": qp_text,
+    }
+    with open(os.path.join(out_dir, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump(truth, f, indent=2)
+    paths["truth"] = os.path.join(out_dir, "truth.json")
+    return paths, truth
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Generate synthetic answer booklets")
+    ap.add_argument("--questions", type=int, default=8)
+    ap.add_argument("--repeats", type=int, default=1, help="answer length multiplier (pages)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="bench_data")
+    args = ap.parse_args()
+    paths, _ = generate_booklet_set(args.out, args.questions, args.seed, args.repeats)
+    for name, path in paths.items():
+        print(f"{name}: {path}")
@@ -0,0 +1,299 @@
+"""
+Long-lived Tesseract engines instead of one `tesseract` process per page.
+
+pytesseract.image_to_string writes the image to a temp file, spawns the CLI,
+which loads the traineddata, and reads the text back from stdout -- for every
+page. TesseractPool keeps initialized engine handles and hands them out to
+callers, passing the image as an in-memory buffer:
+
+  * "tesserocr" -- tesserocr.PyTessBaseAPI (C++ API bindings), if installed
+  * "capi"      -- libtesseract's C API through ctypes (TessBaseAPI*), if the
+                   shared library can be found
+  * "cli"       -- pytesseract, i.e. the old behaviour, as the last resort
+
+The first available backend is used (TESSERACT_BACKEND forces one). Handles
+are created lazily, up to `size` (default: CPU count), and reused. Recognition
+runs without the GIL in both native backends, so map() OCRs several images
+on threads in parallel.
+
+Each handle is single threaded; OMP_THREAD_LIMIT defaults to 1 so parallel
+handles don't oversubscribe the cores with OpenMP threads.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+TESSERACT_BACKEND = os.environ.get("TESSERACT_BACKEND")  # tesserocr | capi | cli (None = auto)
+TESSERACT_LANG = os.environ.get("TESSERACT_LANG", "eng")
+TESSERACT_POOL_SIZE = int(os.environ.get("TESSERACT_POOL_SIZE", "0")) or (os.cpu_count() or 1)
+
+# --oem 3 (default engine) as used by the previous pytesseract calls
+OEM_DEFAULT = 3
+
+
+def _as_gray_bytes(image):
+    """(bytes, width, height, bytes_per_pixel, bytes_per_line) for an 8-bit grey or RGB image."""
+    img = np.ascontiguousarray(np.asarray(image), dtype=np.uint8)
+    if img.ndim == 3 and img.shape[2] == 1:
+        img = np.ascontiguousarray(img[:, :, 0])
+    height, width = img.shape[:2]
+    bpp = 1 if img.ndim == 2 else img.shape[2]
+    return img.tobytes(), width, height, bpp, width * bpp
+
+
+def text_from_tsv(tsv):
+    """
+    Page text from Tesseract's TSV (image_to_data) the way GetUTF8Text lays it
+    out: words of a line joined by spaces, one line per row, a blank line
+    between paragraphs.
+    """
+    out, line, last_line, last_par = [], [], None, None
+    for row in tsv.splitlines():
+        cols = row.split("\t")
+        if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+            continue
+        par, line_key = cols[2:4], cols[2:5]
+        if line_key != last_line and line:
+            out.append(" ".join(line) + "\n" + ("\n" if par != last_par else ""))
+            line = []
+        line.append(cols[11])
+        last_line, last_par = line_key, par
+    if line:
+        out.append(" ".join(line) + "\n")
+    return "".join(out)
+
+
+class TesserocrEngine:
+    name = "tesserocr"
+
+    def __init__(self, lang=TESSERACT_LANG, oem=OEM_DEFAULT):
+        import tesserocr
+        self._api = tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+
+    def recognize(self, image, psm):
+        data, width, height, bpp, bpl = _as_gray_bytes(image)
+        self._api.SetPageSegMode(psm)
+        self._api.SetImageBytes(data, width, height, bpp, bpl)
+        try:
+            return self._api.GetUTF8Text()
+        finally:
+            self._api.Clear()
+
+    def recognize_data(self, image, psm):
+        data, width, height, bpp, bpl = _as_gray_bytes(image)
+        self._api.SetPageSegMode(psm)
+        self._api.SetImageBytes(data, width, height, bpp, bpl)
+        try:
+            # The TSV reuses the recognition GetUTF8Text already ran
+            return self._api.GetUTF8Text(), self._api.GetTSVText(0)
+        finally:
+            self._api.Clear()
+
+    def close(self):
+        self._api.End()
+
+
+_CAPI = None
+
+
+def _load_capi():
+    global _CAPI
+    if _CAPI is None:
+        path = os.environ.get("TESSERACT_LIBRARY") or ctypes.util.find_library("tesseract")
+        if not path:
+            raise OSError("libtesseract not found")
+        lib = ctypes.CDLL(path)
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit2.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+        lib.TessBaseAPIInit2.restype = ctypes.c_int
+        lib.TessBaseAPISetPageSegMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetImage.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPIGetUTF8Text.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.POINTER(ctypes.c_char)
+        lib.TessBaseAPIGetTsvText.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPIGetTsvText.restype = ctypes.POINTER(ctypes.c_char)
+        lib.TessDeleteText.argtypes = [ctypes.POINTER(ctypes.c_char)]
+        lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+        _CAPI = lib
+    return _CAPI
+
+
+class CApiEngine:
+    name = "capi"
+
+    def __init__(self, lang=TESSERACT_LANG, oem=OEM_DEFAULT):
+        self._lib = _load_capi()
+        self._handle = self._lib.TessBaseAPICreate()
+        datapath = os.environ.get("TESSDATA_PREFIX")
+        if self._lib.TessBaseAPIInit2(self._handle, datapath.encode() if datapath else None,
+                                      lang.encode(), oem) != 0:
+            self._lib.TessBaseAPIDelete(self._handle)
+            raise RuntimeError(f"Could not initialize tesseract with language '{lang}'")
+
+    def _text(self, text_ptr):
+        if not text_ptr:
+            return ""
+        try:
+            return ctypes.string_at(text_ptr).decode("utf-8", errors="replace")
+        finally:
+            self._lib.TessDeleteText(text_ptr)
+
+    def recognize(self, image, psm):
+        data, width, height, bpp, bpl = _as_gray_bytes(image)
+        lib = self._lib
+        lib.TessBaseAPISetPageSegMode(self._handle, psm)
+        lib.TessBaseAPISetImage(self._handle, data, width, height, bpp, bpl)
+        try:
+            return self._text(lib.TessBaseAPIGetUTF8Text(self._handle))
+        finally:
+            lib.TessBaseAPIClear(self._handle)
+
+    def recognize_data(self, image, psm):
+        data, width, height, bpp, bpl = _as_gray_bytes(image)
+        lib = self._lib
+        lib.TessBaseAPISetPageSegMode(self._handle, psm)
+        lib.TessBaseAPISetImage(self._handle, data, width, height, bpp, bpl)
+        try:
+            text = self._text(lib.TessBaseAPIGetUTF8Text(self._handle))
+            return text, self._text(lib.TessBaseAPIGetTsvText(self._handle, 0))
+        finally:
+            lib.TessBaseAPIClear(self._handle)
+
+    def close(self):
+        self._lib.TessBaseAPIEnd(self._handle)
+        self._lib.TessBaseAPIDelete(self._handle)
+
+
+class CliEngine:
+    """pytesseract fallback (one process per call, as before)."""
+    name = "cli"
+
+    def __init__(self, lang=TESSERACT_LANG, oem=OEM_DEFAULT):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.oem = oem
+
+    def recognize(self, image, psm):
+        return self._pytesseract.image_to_string(image, lang=self.lang, config=f"--psm {psm} --oem {self.oem}")
+
+    def recognize_data(self, image, psm):
+        # One tesseract process; the text is rebuilt from the TSV's word rows
+        tsv = self._pytesseract.image_to_data(image, lang=self.lang, config=f"--psm {psm} --oem {self.oem}")
+        return text_from_tsv(tsv), tsv
+
+    def close(self):
+        pass
+
+
+BACKENDS = {"tesserocr": TesserocrEngine, "capi": CApiEngine, "cli": CliEngine}
+
+
+def _pick_backend(preferred=None):
+    """First backend that can create an engine; returns (engine class, first engine)."""
+    names = [preferred] if preferred else list(BACKENDS)
+    errors = []
+    for name in names:
+        try:
+            return BACKENDS[name], BACKENDS[name]()
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise RuntimeError("No tesseract backend available (" + "; ".join(errors) + ")")
+
+
+class TesseractPool:
+    def __init__(self, size=TESSERACT_POOL_SIZE, backend=TESSERACT_BACKEND):
+        self.size = max(1, size)
+        self.engine_cls, first = _pick_backend(backend)
+        self.backend = self.engine_cls.name
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._idle.put(first)
+        self._created = 1
+        self._lock = threading.Lock()
+        self._executor = None
+        print(f"[Tesseract] Using '{self.backend}' backend, up to {self.size} engine(s)")
+
+    @contextmanager
+    def engine(self):
+        """Borrow an idle engine, creating one if the pool isn't full yet, else wait."""
+        try:
+            eng = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    eng = self.engine_cls()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                eng = self._idle.get()
+        try:
+            yield eng
+        finally:
+            self._idle.put(eng)
+
+    def image_to_string(self, image, psm=4):
+        with self.engine() as eng:
+            return eng.recognize(image, psm)
+
+    def image_to_data(self, image, psm=4):
+        """(text, TSV with per-word boxes and confidences) from a single recognition."""
+        with self.engine() as eng:
+            return eng.recognize_data(image, psm)
+
+    def map(self, images, psm=4):
+        """OCR several images concurrently (one engine per thread); results in input order."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.size)
+        return list(self._executor.map(lambda img: self.image_to_string(img, psm), images))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """Process-wide pool; a forked child builds its own instead of reusing the parent's handles."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.pid != os.getpid():
+            _POOL = TesseractPool()
+        return _POOL
+
+
+def image_to_string(image, psm=4):
+    """Drop-in for pytesseract.image_to_string(image, config='--psm <psm> --oem 3')."""
+    return get_pool().image_to_string(image, psm)
+
+
+def image_to_data(image, psm=4):
+    """(text, TSV) -- the text as image_to_string returns it plus Tesseract's word table."""
+    return get_pool().image_to_data(image, psm)
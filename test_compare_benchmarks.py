@@ -0,0 +1,72 @@
+"""
+Benchmark regression gate: a slowdown over budget fails, a new run that lost
+stages, fixtures or recorded errors fails unless --allow-missing, and a budget
+file only overrides the per-stage limits it names (the "default" stays).
+Run: python test_compare_benchmarks.py
+"""
+import json
+import os
+import tempfile
+
+import compare_benchmarks
+
+
+def _report(results=(), scores=None, errors=()):
+    return {"meta": {"commit": "test", "timestamp": "now"},
+            "results": [{"stage": stage, "size": size, "p50_s": p50, "peak_rss_mb": 100.0}
+                        for stage, size, p50 in results],
+            "scores": scores or {}, "errors": list(errors)}
+
+
+BASE = _report([("ocr", "small", 1.0), ("score", "small", 0.5)], {"fixture/1": 4.0, "fixture/total": 9.0})
+BUDGET = {"latency": {"default": 0.15}, "rss": {"default": 0.10}, "score_drift": 0.5, "total_drift": 1.0}
+
+
+def _run(base, new, *flags):
+    with tempfile.TemporaryDirectory() as d:
+        paths = []
+        for name, report in (("base.json", base), ("new.json", new)):
+            paths.append(os.path.join(d, name))
+            with open(paths[-1], "w") as f:
+                json.dump(report, f)
+        return compare_benchmarks.main(paths + list(flags))
+
+
+def test_gate():
+    _, violations = compare_benchmarks.compare_reports(BASE, BASE, BUDGET)
+    assert violations == []
+    slow = _report([("ocr", "small", 1.5), ("score", "small", 0.5)], {"fixture/1": 4.0, "fixture/total": 9.0})
+    _, violations = compare_benchmarks.compare_reports(BASE, slow, BUDGET)
+    assert [(v["kind"], v["stage"]) for v in violations] == [("latency", "ocr")], violations
+
+    # A broken run: no results, no scores, one pipeline error
+    broken = _report(errors=[{"stage": "ocr", "size": "small", "error": "pdfinfo not found"}])
+    _, violations = compare_benchmarks.compare_reports(BASE, broken, BUDGET)
+    assert sorted(v["kind"] for v in violations) == ["error"] + ["missing"] * 4, violations
+    _, violations = compare_benchmarks.compare_reports(BASE, broken, BUDGET, allow_missing=True)
+    assert violations == []
+    assert _run(BASE, broken) == 1
+    assert _run(BASE, broken, "--allow-missing") == 0
+    assert _run(BASE, BASE) == 0
+
+
+def test_budget_merge():
+    merged = compare_benchmarks.merge_budget(BUDGET, {"latency": {"ocr": 0.3}, "score_drift": 0.2})
+    assert merged["latency"] == {"default": 0.15, "ocr": 0.3} and merged["score_drift"] == 0.2
+    assert BUDGET["latency"] == {"default": 0.15}
+
+    # "score" stays gated by the default after the file overrides "ocr"
+    slow = _report([("ocr", "small", 1.2), ("score", "small", 1.0)], {"fixture/1": 4.0, "fixture/total": 9.0})
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "budget.json")
+        with open(path, "w") as f:
+            json.dump({"latency": {"ocr": 0.3}}, f)
+        assert _run(BASE, slow, "--budget", path) == 1
+    _, violations = compare_benchmarks.compare_reports(BASE, slow, merged)
+    assert [v["stage"] for v in violations] == ["score"], violations
+
+
+if __name__ == "__main__":
+    test_gate()
+    test_budget_merge()
+    print("\nVerification Passed!")
@@ -0,0 +1,82 @@
+"""
+ConceptExtractor's phrase embedding cache: cached and new phrases come back
+in order, and once the cache passes CONCEPT_CACHE_MAX the least recently
+used phrases are evicted without losing any phrase of the current call, also
+while several job threads share one extractor.
+Stand-in encoder, so no model is needed.
+Run: python test_concepts.py
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import concepts
+from concepts import ConceptExtractor
+
+
+class StandInEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        self.encoded.extend(sentences)
+        return np.asarray([[len(s), sum(map(ord, s)) % 97, 1.0] for s in sentences], dtype=np.float32)
+
+
+class SlowEncoder(StandInEncoder):
+    """Yields the GIL while encoding, as a real model does."""
+
+    def encode(self, sentences, **kwargs):
+        time.sleep(0.001)
+        return super().encode(sentences, **kwargs)
+
+
+def _expected(phrases):
+    vecs = StandInEncoder().encode(phrases)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_cache_overflow():
+    saved = concepts.CONCEPT_CACHE_MAX
+    concepts.CONCEPT_CACHE_MAX = 4
+    try:
+        encoder = StandInEncoder()
+        extractor = ConceptExtractor(encoder, stop_words=set())
+        first = ["cell", "membrane", "osmosis"]
+        assert np.allclose(extractor.embed(first), _expected(first))
+        # Two cached phrases plus three new ones: more than the cap in one call
+        second = ["cell", "osmosis", "diffusion", "gradient", "water"]
+        assert np.allclose(extractor.embed(second), _expected(second))
+        assert len(extractor._embeddings) == 4
+        assert "membrane" not in extractor._embeddings      # least recently used
+        # Recently used phrases stay cached and aren't encoded again
+        encoder.encoded.clear()
+        third = ["water", "gradient", "diffusion", "osmosis"]
+        assert np.allclose(extractor.embed(third), _expected(third))
+        assert encoder.encoded == []
+        # Full extraction keeps working with a cache far smaller than one document
+        assert extractor.extract("Osmosis moves water across a semi permeable membrane", top_n=3)
+    finally:
+        concepts.CONCEPT_CACHE_MAX = saved
+
+
+def test_concurrent_embed():
+    saved = concepts.CONCEPT_CACHE_MAX
+    concepts.CONCEPT_CACHE_MAX = 8
+    try:
+        extractor = ConceptExtractor(SlowEncoder(), stop_words=set())
+        batches = [[f"phrase {(i * 7 + j) % 40}" for j in range(6)] for i in range(400)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outs = list(pool.map(extractor.embed, batches))
+        for batch, out in zip(batches, outs):
+            assert np.allclose(out, _expected(batch))
+        assert len(extractor._embeddings) <= 8
+    finally:
+        concepts.CONCEPT_CACHE_MAX = saved
+
+
+if __name__ == "__main__":
+    test_cache_overflow()
+    test_concurrent_embed()
+    print("\nVerification Passed!")
@@ -0,0 +1,67 @@
+"""
+Resident exam contexts: the cache expires and bounds its References, the
+per-exam SpellingIndex corrects like correct_spelling, and scoring against a
+prepared Reference (precomputed ModelFeatures) gives the same result as
+scoring from the model text alone.
+Run: python test_exam_context.py
+"""
+import time
+
+import pipeline
+from exam_context import ExamContextCache
+from scoring import SemanticScorer
+from text_utils import SpellingIndex, correct_spelling
+
+
+def test_cache():
+    cache = ExamContextCache(ttl=0.2, max_contexts=2)
+    cache.put("a", "ref-a")
+    cache.put("b", "ref-b")
+    assert cache.get("a") == "ref-a"
+    cache.put("c", "ref-c")                  # "b" is the least recently used
+    assert cache.get("b") is None and len(cache) == 2
+    time.sleep(0.25)
+    assert cache.get("a") is None and len(cache) == 0
+
+    off = ExamContextCache(max_contexts=0)
+    off.put("a", "ref-a")
+    assert off.get("a") is None
+
+
+def test_spelling_index():
+    vocab = {"photosynthesis", "chlorophyll", "sunlight"}
+    text = "photosynthsis uses chlorophyl and sunlite to make fod, photosynthsis again"
+    index = SpellingIndex(custom_dictionary=vocab)
+    corrected = index.correct(text)
+    print(f"Corrected: {corrected}")
+    assert corrected == correct_spelling(text, custom_dictionary=vocab)
+    assert "photosynthesis" in corrected and "chlorophyll" in corrected
+    assert index._corrections["photosynthsis"] == "photosynthesis"
+    assert index.correct("") == ""
+
+
+def test_prepared_reference_scores_the_same():
+    scorer = SemanticScorer()
+    model_raw = ("1. Photosynthesis is the process by which green plants make food using sunlight.\n"
+                 "2. Binary search halves a sorted array each step and runs in O(log n) time.")
+    student_raw = "1. Photosynthesis is how plants make food using sunlight.\n2. binary search checks the middle"
+
+    reference = pipeline.build_reference(model_raw, {}).prepare_scoring(scorer)
+    assert sorted(reference.features) == sorted(reference.model_segments.values())
+    features = reference.features
+    assert reference.prepare_scoring(scorer).features is features   # computed once
+
+    segments = pipeline.parse_student(student_raw, reference)
+    prepared = pipeline.score_student(scorer, segments, reference)
+    plain = scorer.evaluate_exam(segments, reference.model_segments, question_schema=reference.q_schema)
+    print(f"Prepared total {prepared['total_score']}, plain total {plain['total_score']}")
+    assert prepared["total_score"] == plain["total_score"]
+    for a, b in zip(prepared["breakdown"], plain["breakdown"]):
+        assert a["score"] == b["score"] and a.get("details") == b.get("details"), (a, b)
+
+
+if __name__ == "__main__":
+    test_cache()
+    test_spelling_index()
+    test_prepared_reference_scores_the_same()
+    print("\nVerification Passed!")
@@ -0,0 +1,66 @@
+"""
+Cold start: `import app` stays under IMPORT_BUDGET_MS (measured with
+python -X importtime in a fresh interpreter) and loads none of the heavy
+libraries -- they are imported on first use -- and the parser / text
+utilities import nothing outside the standard library.
+Run: python test_import_time.py
+"""
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Budget for `import app` (cumulative, ms); measured 140-250 ms on a 1-vCPU box
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "1000"))
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "easyocr", "cv2",
+                 "sklearn", "pytesseract", "pdf2image")
+PARSER_MODULES = ("pdf_parser", "text_utils", "question_paper")
+
+
+def _run(code, *flags):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=HERE, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_time_ms(module):
+    """Cumulative import time of `module` in a fresh interpreter, per -X importtime."""
+    out = _run(f"import {module}", "-X", "importtime")
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000.0
+    raise AssertionError(f"no importtime line for {module}:\n{out.stderr[-2000:]}")
+
+
+def loaded_after(imports):
+    """Top-level packages newly imported by `imports` in a fresh interpreter."""
+    code = ("import sys; before = set(sys.modules); " + imports +
+            "; print(' '.join(sorted({m.split('.')[0] for m in set(sys.modules) - before})))")
+    return set(_run(code).stdout.splitlines()[-1].split())
+
+
+def test_app_import_budget():
+    ms = import_time_ms("app")
+    print(f"import app: {ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    assert ms < IMPORT_BUDGET_MS
+
+
+def test_app_import_is_light():
+    heavy = loaded_after("import app") & set(HEAVY_MODULES)
+    assert not heavy, f"import app loaded {sorted(heavy)}"
+
+
+def test_parsers_import_stdlib_only():
+    loaded = loaded_after("import " + ", ".join(PARSER_MODULES))
+    foreign = loaded - set(sys.stdlib_module_names) - set(PARSER_MODULES)
+    assert not foreign, f"parser modules loaded {sorted(foreign)}"
+
+
+if __name__ == "__main__":
+    test_app_import_budget()
+    test_app_import_is_light()
+    test_parsers_import_stdlib_only()
+    print("\nVerification Passed!")
@@ -0,0 +1,103 @@
+"""
+Inference daemon: the client stubs return what the models return in-process
+(embeddings as numpy arrays or tensors, EasyOCR lines per page), concurrent
+clients' requests are coalesced into shared batches, a passed OCR deadline
+comes back as Preempted, and without a daemon the stubs aren't used.
+Stand-in models, so no weights are needed.
+Run: python test_inference_daemon.py
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+import inference_daemon
+from easyocr_batch import Preempted, _check_deadline
+
+
+class StandInEncoder:
+    """Deterministic 16-d embedding per text; slow enough for requests to queue up."""
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        time.sleep(0.05)
+        rows = [np.random.default_rng(sum(t.encode("utf-8"))).standard_normal(16) for t in sentences]
+        return np.asarray(rows, dtype=np.float32)
+
+
+class StandInReader:
+    """One recognized line per page, describing the page."""
+
+    def readtext_items(self, pages, deadline=None):
+        _check_deadline(deadline)
+        return [[([[0, 0], [p.shape[1], 0], [p.shape[1], p.shape[0]], [0, p.shape[0]]],
+                  f"page {int(p.mean())}", np.float64(0.9))] for p in pages]
+
+
+def _start(path):
+    server = inference_daemon.make_server(path, inference_daemon.InferenceService(StandInEncoder(), StandInReader()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_daemon_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inference.sock")
+        server = _start(path)
+        try:
+            assert os.stat(path).st_mode & 0o777 == 0o600
+            client = inference_daemon.connect(path)
+            assert client.info["encoder"] and client.info["ocr"] and client.info["dimension"] == 16
+
+            encoder = inference_daemon.RemoteEncoder(client)
+            texts = ["photosynthesis makes glucose", "chlorophyll absorbs light", ""]
+            local = StandInEncoder().encode(texts)
+            assert np.array_equal(encoder.encode(texts, convert_to_numpy=True), local)
+            tensor = encoder.encode(texts[0], convert_to_tensor=True)
+            assert isinstance(tensor, torch.Tensor) and torch.equal(tensor, torch.from_numpy(local[0]))
+            assert encoder.encode([]).shape == (0, 16)
+
+            reader = inference_daemon.RemoteReader(client)
+            pages = [np.full((40, 60), 7, dtype=np.uint8), np.full((30, 20, 3), 200, dtype=np.uint8)]
+            items = reader.readtext_items(pages)
+            assert [[(b, t, c) for b, t, c in page] for page in StandInReader().readtext_items(pages)] == items
+            assert reader.readtext(pages[0], detail=0) == ["page 7"]
+            try:
+                reader.readtext_items(pages, deadline=time.monotonic() - 1)
+                assert False, "expected Preempted"
+            except Preempted:
+                pass
+
+            # Concurrent clients (one connection per thread) share batches
+            before = server.service.encoder.stats()
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                outs = list(pool.map(lambda t: encoder.encode([t]), [f"answer {i}" for i in range(16)]))
+            for i, out in enumerate(outs):
+                assert np.array_equal(out, StandInEncoder().encode([f"answer {i}"]))
+            after = server.service.encoder.stats()
+            requests, batches = after["requests"] - before["requests"], after["batches"] - before["batches"]
+            print(f"16 encode requests ran as {batches} batches")
+            assert requests == 16 and batches < requests
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def test_no_daemon():
+    with tempfile.TemporaryDirectory() as tmp:
+        assert inference_daemon.connect(os.path.join(tmp, "missing.sock"), quiet=True) is None
+    saved = inference_daemon.INFERENCE_SOCKET, inference_daemon._CLIENT
+    try:
+        inference_daemon.INFERENCE_SOCKET, inference_daemon._CLIENT = None, None
+        assert inference_daemon.remote_encoder() is None and inference_daemon.remote_reader() is None
+    finally:
+        inference_daemon.INFERENCE_SOCKET, inference_daemon._CLIENT = saved
+
+
+if __name__ == "__main__":
+    test_daemon_round_trip()
+    test_no_daemon()
+    print("\nVerification Passed!")
@@ -0,0 +1,83 @@
+"""
+JobEvents: readers block until new events arrive, resume after an id, and are
+released when the job finishes. emit() outside a job is a no-op. With a
+shared log directory another process can follow the job from its log.
+Run: python test_job_events.py
+"""
+import multiprocessing
+import tempfile
+import threading
+import time
+
+import events
+
+
+def test_job_events():
+    job = events.JobEvents("job-1")
+    events.emit("stage", step=1)  # unbound thread: ignored
+    assert job.last_id == 0
+
+    got = []
+    reader = threading.Thread(target=lambda: got.append(job.wait(0, timeout=5)))
+    reader.start()
+    time.sleep(0.05)
+
+    def worker():
+        events.bind(job)
+        events.emit("stage", step=3, message="OCR")
+        events.emit("page", document="student", page=1, total=2)
+        events.bind(None)
+
+    threading.Thread(target=worker).start()
+    reader.join(2)
+    batch, finished = got[0]
+    assert batch and batch[0]["type"] == "stage" and not finished, got
+
+    job.publish("done", total_score=7)
+    batch, finished = job.wait(1, timeout=0.1)
+    assert [e["type"] for e in batch] == ["page", "done"] and finished, batch
+
+    # A finished job never blocks
+    start = time.time()
+    batch, finished = job.wait(job.last_id, timeout=5)
+    assert batch == [] and finished and time.time() - start < 1
+    print(f"Events: {[(e['id'], e['type']) for e in job.since(0)]}")
+
+
+def _run_job(log_dir):
+    # Another worker process running the job
+    job = events.JobEvents("job2", log_dir=log_dir)
+    job.publish("stage", step=1, message="Saving uploaded files...")
+    time.sleep(0.3)
+    job.publish("page", document="student", page=1, total=1)
+    job.publish("done", total_score=4.5)
+
+
+def test_shared_log():
+    with tempfile.TemporaryDirectory() as log_dir:
+        assert events.open_log("job2", log_dir) is None
+        assert events.open_log("../etc", log_dir) is None
+        ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        runner = ctx.Process(target=_run_job, args=(log_dir,))
+        runner.start()
+        deadline = time.time() + 5
+        log = None
+        while log is None and time.time() < deadline:
+            log = events.open_log("job2", log_dir)
+            time.sleep(0.02)
+        assert log is not None
+
+        seen, after, finished = [], 0, False
+        while not finished:
+            batch, finished = log.wait(after, timeout=5)
+            seen += [e["type"] for e in batch]
+            after = batch[-1]["id"] if batch else after
+        runner.join(5)
+        assert seen == ["stage", "page", "done"] and log.last_id == 3, seen
+        assert [e["id"] for e in log.since(1)] == [2, 3]
+
+
+if __name__ == "__main__":
+    test_job_events()
+    test_shared_log()
+    print("\nVerification Passed!")
@@ -0,0 +1,140 @@
+"""
+Low-memory mode: spooled page text joins to the same transcript as the
+in-memory path, low-memory page preparation matches prepare_page, a lean
+document keeps none of its pages' words (same statistics, a fraction of the
+retained memory), PDFs are rasterized one page per call, the memory ceiling
+empties the registered caches, and RSS-tracking jobs report a peak per stage.
+Run: python test_low_memory.py
+"""
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import pdf2image
+
+import low_memory
+import metrics
+import ocr_service
+import page_sources
+from synthetic_sheets import build_exam, exam_text, render_pages
+
+
+def test_text_spool():
+    texts = ["page one\n---PAGE_BREAK---\n", "", "página dos\n---PAGE_BREAK---\n"]
+    with low_memory.TextSpool(spill=False) as kept, low_memory.TextSpool(spill=True) as spilled:
+        for t in texts:
+            kept.add(t)
+            spilled.add(t)
+        assert kept.text() == spilled.text() == "".join(texts)
+
+
+def test_lean_preparation():
+    questions, _ = build_exam(6, seed=4)
+    page = render_pages(exam_text(questions), seed=4, handwriting=True, red_ink=True)[0]
+    expected = cv2.cvtColor(ocr_service.prepare_page(page, page=1), cv2.COLOR_RGB2GRAY)
+    lean = ocr_service._prepare_lean(page, 1)
+    assert lean.ndim == 2 and np.array_equal(lean, expected)
+
+
+def _extract_retained(path, lean):
+    """(document, bytes the document still holds once the page caches are emptied)."""
+    ocr_service.PAGE_CACHE.clear()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        # A budget this small reads every page with Tesseract only (no EasyOCR model needed)
+        doc = ocr_service.extract_document(path, budget=0.001, low_memory_mode=lean)
+        ocr_service.PAGE_CACHE.clear()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return doc, retained
+
+
+def test_lean_document_drops_pages():
+    questions, _ = build_exam(4, seed=4)
+    page = render_pages(exam_text(questions), seed=4, handwriting=False, red_ink=False)[0]
+    fd, path = tempfile.mkstemp(suffix=".tif")
+    os.close(fd)
+    try:
+        page.save(path, save_all=True, append_images=[page, page, page])
+        full, full_bytes = _extract_retained(path, lean=False)
+        lean, lean_bytes = _extract_retained(path, lean=True)
+    finally:
+        os.remove(path)
+    print(f"Retained by the document: {full_bytes} bytes (full), {lean_bytes} bytes (lean)")
+    assert len(full.pages) == 4 and full.word_count() > 0
+    assert lean.pages == [] and len(lean) == 4
+    assert lean.text == full.text
+    assert lean.word_count() == full.word_count()
+    assert abs(lean.mean_confidence() - full.mean_confidence()) < 1e-6
+    assert lean.token_confidence() == full.token_confidence()
+    assert lean_bytes < full_bytes / 2
+
+
+def test_lean_pdf_rasterizes_one_page_at_a_time():
+    calls = []
+    saved = pdf2image.pdfinfo_from_path, pdf2image.convert_from_path
+    pdf2image.pdfinfo_from_path = lambda path, **kw: {"Pages": 5}
+    pdf2image.convert_from_path = lambda path, first_page, last_page, **kw: (
+        calls.append((first_page, last_page)) or [np.zeros((2, 2))] * (last_page - first_page + 1))
+    try:
+        assert len(list(page_sources.open_pages("booklet.pdf", chunk_pages=1))) == 5
+        assert calls == [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)]
+        calls.clear()
+        list(page_sources.open_pages("booklet.pdf"))
+        assert len(calls) < 5
+    finally:
+        pdf2image.pdfinfo_from_path, pdf2image.convert_from_path = saved
+
+
+def test_ceiling_relieves_caches():
+    cleared = []
+    low_memory.on_pressure(lambda: cleared.append(True))
+    saved = low_memory.MEMORY_CEILING_MB
+    try:
+        low_memory.MEMORY_CEILING_MB = 0
+        assert not low_memory.relieve()
+        low_memory.MEMORY_CEILING_MB = 1          # any process is above 1 MB
+        assert low_memory.enabled() and low_memory.relieve("in test ")
+        assert cleared and len(ocr_service.PAGE_CACHE._items) == 0
+    finally:
+        low_memory.MEMORY_CEILING_MB = saved
+        low_memory._free_callbacks.pop()
+
+
+def test_peak_rss_per_stage():
+    profile = metrics.start_job("rss", track_rss=True)
+    try:
+        with metrics.timer("outer"):
+            with metrics.timer("inner"):
+                block = np.ones(32 * 2 ** 20, dtype=np.uint8)   # 32 MB touched
+                time.sleep(0.15)
+                del block
+    finally:
+        metrics.end_job()
+    peaks = profile.to_dict()["peak_rss_mb"]
+    print(f"Peak RSS per stage: {peaks}")
+    assert set(peaks) == {"outer", "inner"}
+    assert peaks["outer"] >= peaks["inner"] > 32
+
+    untracked = metrics.start_job("plain")
+    with metrics.timer("stage"):
+        pass
+    metrics.end_job()
+    assert untracked.to_dict()["peak_rss_mb"] == {}
+
+
+if __name__ == "__main__":
+    test_text_spool()
+    test_lean_preparation()
+    test_lean_document_drops_pages()
+    test_lean_pdf_rasterizes_one_page_at_a_time()
+    test_ceiling_relieves_caches()
+    test_peak_rss_per_stage()
+    print("\nVerification Passed!")
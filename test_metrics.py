@@ -0,0 +1,42 @@
+"""
+Encoder instrumentation: InstrumentedEncoder records calls, texts and an
+estimated token count per encode() without running the model's tokenizer a
+second time, into both the registry and the job profile.
+Run: python test_metrics.py
+"""
+import numpy as np
+
+import metrics
+
+
+class StandInModel:
+    max_seq_length = 8
+
+    class tokenizer:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("the tokenizer must not run outside encode()")
+
+    def encode(self, sentences, **kwargs):
+        texts = [sentences] if isinstance(sentences, str) else sentences
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+def test_encode_counters():
+    encoder = metrics.InstrumentedEncoder(StandInModel())
+    profile = metrics.start_job("metrics-test")
+    try:
+        out = encoder.encode(["Newton's first law.", "one two three four five six seven eight nine ten"])
+        encoder.encode("O(1)")
+    finally:
+        metrics.end_job()
+    assert out.shape == (2, 4)
+    # "Newton ' s first law ." = 6, the long text is capped at 8, "O ( 1 )" = 4
+    assert profile.encode["calls"] == 2 and profile.encode["texts"] == 3, profile.encode
+    assert profile.encode["tokens"] == 6 + 8 + 4, profile.encode
+    assert encoder.max_seq_length == 8
+    print(f"Encode profile: {profile.encode}")
+
+
+if __name__ == "__main__":
+    test_encode_counters()
+    print("\nVerification Passed!")
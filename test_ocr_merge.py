@@ -0,0 +1,70 @@
+"""
+Dual-engine merge: aligned lines keep the better engine's reading, EasyOCR
+fragments of one written line are compared as a whole, lines only one engine
+found are kept, and each question marker appears once -- by position with
+word boxes and by text alignment without them.
+Run: python test_ocr_merge.py
+"""
+from ocr_merge import align_lines, merge_pages
+from ocr_result import PageOCR
+
+# Tesseract: line 1 misread with low confidence, line 2 read well
+TESS_TSV = "\n".join([
+    "5\t1\t1\t1\t1\t1\t10\t10\t20\t30\t40.0\t1.",
+    "5\t1\t1\t1\t1\t2\t40\t10\t90\t30\t35.0\tBinarv",
+    "5\t1\t1\t1\t1\t3\t140\t10\t80\t30\t30.0\tseerch",
+    "5\t1\t1\t1\t1\t4\t230\t10\t50\t30\t45.0\ttree",
+    "5\t1\t1\t1\t2\t1\t10\t60\t20\t30\t95.0\t2.",
+    "5\t1\t1\t1\t2\t2\t40\t60\t90\t30\t96.0\tStack",
+    "5\t1\t1\t1\t2\t3\t140\t60\t60\t30\t94.0\tpush",
+    "5\t1\t1\t1\t2\t4\t210\t60\t50\t30\t93.0\tpop",
+])
+
+# EasyOCR: line 1 as two confident fragments, line 2 garbled, plus a line Tesseract missed
+EASY_ITEMS = [
+    ([[10, 12], [130, 12], [130, 38], [10, 38]], "1. Binary", 0.9),
+    ([[140, 11], [280, 11], [280, 39], [140, 39]], "search tree", 0.85),
+    ([[10, 61], [260, 61], [260, 89], [10, 89]], "2. Stuck pnsh pop", 0.4),
+    ([[10, 120], [200, 120], [200, 150], [10, 150]], "3. Queue enqueue", 0.8),
+]
+
+EXPECTED = "1. Binary search tree\n2. Stack push pop\n3. Queue enqueue"
+
+
+def test_merge_by_position():
+    tess = PageOCR.from_tesseract_tsv(TESS_TSV, text="...", page=1)
+    easy = PageOCR.from_easyocr(EASY_ITEMS, text="...", page=1)
+    merged = merge_pages(easy, tess, page=1)
+    print(f"By position:\n{merged.text}")
+    assert merged.text == EXPECTED, merged.text
+    assert merged.text.count("1.") == 1 and merged.text.count("2.") == 1
+    assert len(merged) == 4 + 4 + 3
+    assert merged.page == 1
+
+
+def test_merge_by_sequence():
+    tess = PageOCR.from_tesseract_tsv(TESS_TSV, page=1)
+    easy = PageOCR.from_easyocr(EASY_ITEMS, page=1)
+    # Same words without boxes: only the text order is left to align on
+    no_boxes = [PageOCR(p.words(), None, p.conf, p.engine, p.line, p.block, page=1) for p in (easy, tess)]
+    merged = merge_pages(*no_boxes, page=1)
+    print(f"By sequence:\n{merged.text}")
+    assert merged.text.count("2.") == 1, merged.text
+    assert "3. Queue enqueue" in merged.text and "Stack push pop" in merged.text
+
+
+def test_align_lines():
+    a = ["alpha beta gamma", "delta epsilon", "zeta"]
+    b = ["alpha beta gamna", "something else", "delta epsilom"]
+    pairs = align_lines(a, b)
+    assert (0, 0) in pairs and (1, 2) in pairs, pairs
+    assert sorted(i for i, _ in pairs if i is not None) == [0, 1, 2]
+    assert sorted(j for _, j in pairs if j is not None) == [0, 1, 2]
+    assert align_lines([], ["x"]) == [(None, 0)]
+
+
+if __name__ == "__main__":
+    test_merge_by_position()
+    test_merge_by_sequence()
+    test_align_lines()
+    print("\nVerification Passed!")
@@ -0,0 +1,75 @@
+"""
+Structured OCR results: Tesseract TSV and EasyOCR lines become array-backed
+PageOCR words with boxes, confidences, engine and line/paragraph ids, and an
+OCRDocument reports the share of low-confidence words in a piece of text.
+Run: python test_ocr_result.py
+"""
+from ocr_result import EASYOCR, TESSERACT, OCRDocument, PageOCR
+
+TSV = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "1\t1\t0\t0\t0\t0\t0\t0\t1240\t1754\t-1\t",
+    "4\t1\t1\t1\t1\t0\t100\t190\t500\t30\t-1\t",
+    "5\t1\t1\t1\t1\t1\t100\t190\t22\t23\t93.27\t1.",
+    "5\t1\t1\t1\t1\t2\t142\t183\t122\t24\t91.23\tDecision",
+    "5\t1\t1\t1\t1\t3\t279\t190\t59\t21\t12.5\ttree",
+    "5\t1\t1\t1\t2\t1\t100\t230\t80\t23\t88.0\tpruning",
+    "5\t1\t2\t1\t1\t1\t100\t400\t70\t23\t95.0\tStack",
+    "5\t1\t2\t1\t1\t2\t180\t400\t10\t23\t95.0\t ",
+])
+
+EASY_ITEMS = [
+    ([[10, 10], [210, 10], [210, 40], [10, 40]], "binary search tree", 0.9),
+    ([[10, 50], [110, 50], [110, 80], [10, 80]], "heap", 0.2),
+]
+
+
+def test_tesseract_tsv():
+    page = PageOCR.from_tesseract_tsv(TSV, text="1. Decision tree\npruning\n\nStack\n", page=1)
+    assert page.words() == ["1.", "Decision", "tree", "pruning", "Stack"], page.words()
+    assert page.boxes[1].tolist() == [142, 183, 264, 207]
+    assert abs(float(page.conf[0]) - 0.9327) < 1e-4
+    assert page.engine.tolist() == [TESSERACT] * 5
+    assert page.line.tolist() == [0, 0, 0, 1, 2]
+    assert page.block.tolist() == [0, 0, 0, 0, 1]
+    lines = page.lines()
+    assert [l[1] for l in lines] == ["1. Decision tree", "pruning", "Stack"], lines
+    assert lines[0][3] == (100, 183, 338, 213)
+    assert page.readable_words()[0] == 4
+    print(f"Tesseract: {len(page)} words, {len(lines)} lines, mean conf {page.mean_confidence():.2f}")
+
+
+def test_easyocr_and_concat():
+    easy = PageOCR.from_easyocr(EASY_ITEMS, block_ids=[0, 0], text="binary search tree heap", page=1)
+    assert easy.words() == ["binary", "search", "tree", "heap"]
+    assert easy.line.tolist() == [0, 0, 0, 1] and easy.block.tolist() == [0, 0, 0, 0]
+    assert easy.boxes[0].tolist()[:2] == [10, 10] and easy.boxes[2].tolist()[2] == 210
+    assert easy.engine.tolist() == [EASYOCR] * 4
+    count, weighted = easy.readable_words()
+    assert count == 4 and abs(weighted - (3 * 0.9 + 0.2)) < 1e-5
+
+    tess = PageOCR.from_tesseract_tsv(TSV, page=1)
+    both = PageOCR.concat([easy, tess], text="merged", page=1)
+    assert len(both) == len(easy) + len(tess)
+    assert both.line.tolist()[4:] == [2, 2, 2, 3, 4], both.line.tolist()
+    assert both.block.tolist()[4:] == [1, 1, 1, 1, 2]
+    assert both.mean_confidence("easyocr") == easy.mean_confidence()
+    assert len(PageOCR.concat([PageOCR(), PageOCR()])) == 0
+    print(f"Merged page: {len(both)} words from both engines")
+
+
+def test_low_confidence_ratio():
+    doc = OCRDocument([PageOCR.from_easyocr(EASY_ITEMS), PageOCR.from_tesseract_tsv(TSV)], text="...")
+    # "tree": 0.9 from EasyOCR beats Tesseract's 0.125; "heap" only at 0.2
+    assert doc.token_confidence()["tree"] > 0.8
+    assert doc.low_confidence_ratio("Binary, search tree!") == 0.0
+    assert doc.low_confidence_ratio("binary heap") == 0.5
+    assert doc.low_confidence_ratio("corrected words only") is None
+    print(f"Document: {doc.word_count()} words, mean conf {doc.mean_confidence():.2f}")
+
+
+if __name__ == "__main__":
+    test_tesseract_tsv()
+    test_easyocr_and_concat()
+    test_low_confidence_ratio()
+    print("\nVerification Passed!")
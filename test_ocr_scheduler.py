@@ -0,0 +1,123 @@
+"""
+OCR scheduler: throughput estimates learn from measurements, the engine plan
+fits the budget (all pages dual-engine when there is room, the later pages of
+a batch Tesseract-only when there isn't, with the reason recorded),
+BatchedReader gives up once its deadline passes, and a cold EasyOCR model
+load counts neither towards its measured rate nor against its deadline.
+Run: python test_ocr_scheduler.py
+"""
+import time
+
+import numpy as np
+
+import ocr_service
+from easyocr_batch import BatchedReader, Preempted
+from ocr_result import PageOCR
+from ocr_scheduler import EngineRates, OCRScheduler
+
+
+def rates():
+    return EngineRates(priors={"easyocr": 1.0, "tesseract": 0.1})
+
+
+def test_rates():
+    r = rates()
+    assert r.estimate("easyocr", 2.0) == 2.0
+    r.observe("easyocr", 6.0, 2.0)      # blended with the prior: 0.3 * 3.0 + 0.7 * 1.0
+    assert abs(r.estimate("easyocr", 1.0) - 1.6) < 1e-9
+    r.observe("easyocr", 1.0, 1.0)
+    assert abs(r.estimate("easyocr", 1.0) - 1.42) < 1e-9
+    assert r.to_dict()["easyocr"]["samples"] == 2 and r.to_dict()["tesseract"]["samples"] == 0
+
+
+def test_plan():
+    batch = {1: 1.0, 2: 1.0, 3: 1.0, 4: 1.0}
+
+    roomy = OCRScheduler(4, budget=60, rates=rates())
+    assert roomy.plan(batch) == [1, 2, 3, 4] and not roomy.degraded
+
+    # 3s: Tesseract for 4 pages is reserved (0.4s), ~2.3s left is room for two EasyOCR pages
+    tight = OCRScheduler(4, budget=3, rates=rates())
+    assert tight.plan(batch) == [1, 2], tight.degraded
+    assert tight.degraded == {3: "budget", 4: "budget"}
+    deadline = tight.easyocr_deadline(batch, [1, 2])
+    assert time.monotonic() < deadline <= tight.deadline - 0.4 + 1e-6
+
+    # The budget is shared over the whole document, not spent on the first batch:
+    # ~5.5s of EasyOCR time for 8 pages leaves room for two of the first four
+    long_doc = OCRScheduler(8, budget=7, rates=rates())
+    assert long_doc.plan(batch) == [1, 2]
+
+    spent = OCRScheduler(2, budget=0, rates=rates())
+    assert spent.plan({1: 1.0, 2: 1.0}) == []
+    report = spent.report()
+    print(f"Report: {report}")
+    assert report["over_budget"] and [d["page"] for d in report["degraded"]] == [1, 2]
+
+
+class SlowDetectReader:
+    """Just enough of easyocr.Reader for BatchedReader.detect: every detector pass takes 0.1s."""
+    character = lang_char = "abc"
+
+    def __init__(self):
+        self.calls = 0
+
+    def detect(self, batch, reformat=False):
+        self.calls += 1
+        time.sleep(0.1)
+        n = len(batch) if batch.ndim == 4 else 1
+        return [[] for _ in range(n)], [[] for _ in range(n)]
+
+
+def test_preemption():
+    pages = [np.full((32, 32), 255, dtype=np.uint8) for _ in range(4)]
+    reader = SlowDetectReader()
+    batched = BatchedReader(reader, detect_batch_size=1)
+    try:
+        batched.readtext_items(pages, deadline=time.monotonic() + 0.15)
+        raise AssertionError("expected Preempted")
+    except Preempted as e:
+        print(f"Preempted after {reader.calls} detector pass(es): {e}")
+    assert reader.calls == 2
+
+    reader = SlowDetectReader()
+    assert BatchedReader(reader, detect_batch_size=4).readtext_items(pages) == [[], [], [], []]
+    assert reader.calls == 1
+
+
+def test_cold_reader_load():
+    calls = {}
+
+    def cold_reader():
+        if "loaded" not in calls:
+            time.sleep(0.5)  # model load
+            calls["loaded"] = time.monotonic()
+
+    def easyocr_pages(images, pages, deadline=None):
+        cold_reader()  # as the real one does via get_batched_reader()
+        calls["easyocr"] = (time.monotonic(), deadline)
+        return [PageOCR(page=p) for p in pages]
+
+    saved = ocr_service.get_batched_reader, ocr_service.easyocr_pages, ocr_service.ocr_page_dual_engine
+    ocr_service.get_batched_reader, ocr_service.easyocr_pages = cold_reader, easyocr_pages
+    ocr_service.ocr_page_dual_engine = lambda img, page=None, easy=None: easy
+    try:
+        scheduler = OCRScheduler(2, budget=60, rates=rates())
+        pages = {1: np.zeros((1000, 1000), np.uint8), 2: np.zeros((1000, 1000), np.uint8)}
+        ocr_service.ocr_batch(pages, scheduler)
+    finally:
+        ocr_service.get_batched_reader, ocr_service.easyocr_pages, ocr_service.ocr_page_dual_engine = saved
+    started, deadline = calls["easyocr"]
+    assert calls["loaded"] <= started
+    # The deadline was set after the load: the full 2 x 1.0 s/MP x 2 MP x PREEMPT_FACTOR is ahead
+    assert deadline - started > 3.9, deadline - started
+    # The load isn't part of the EasyOCR rate (the prior 1.0 only moves down towards ~0)
+    assert scheduler.rates.estimate("easyocr", 1.0) < 0.75, scheduler.rates.to_dict()
+
+
+if __name__ == "__main__":
+    test_rates()
+    test_plan()
+    test_preemption()
+    test_cold_reader_load()
+    print("\nVerification Passed!")
@@ -0,0 +1,94 @@
+"""
+Shared page buffers: a page pickles as a handle of a few dozen bytes, a forked
+worker reads it zero-copy and returns its result in shared memory, buffers are
+reference counted (also when held by a PageCache) and recycled, and the
+worker-side page preparation matches prepare_page.
+Run: python test_page_buffers.py
+"""
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import ocr_service
+import page_buffers
+from page_normalize import PageCache
+from synthetic_sheets import build_exam, exam_text, render_pages
+
+
+def _invert(buf):
+    # Worker: read the page where it is, write the result into a new segment
+    with page_buffers.attached(buf) as src:
+        out = page_buffers.export(src.shape, src.dtype, fill=lambda view: np.subtract(255, src, out=view))
+        del src
+    return out
+
+
+def test_pool():
+    pool = page_buffers.PageBufferPool(max_free_bytes=8000)
+    page = np.random.default_rng(0).integers(0, 255, (60, 40, 3), dtype=np.uint8)
+    buf = pool.put(page)
+    assert np.array_equal(buf.array(), page)
+    assert len(pickle.dumps(buf)) < 200 < page.nbytes
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            out = pool.adopt(ex.submit(_invert, buf).result())
+        assert np.array_equal(out.array(), 255 - page)
+        out.release()
+
+    # Reference counted: the segment survives until the last release, then is reused
+    buf.retain()
+    buf.release()
+    assert pool.in_use() == 1
+    name = buf.name
+    buf.release()
+    assert pool.in_use() == 0
+    again = pool.put(page[:50])
+    assert again.name == name and pool.stats["reused"] >= 1
+    again.release()
+
+    # Free segments beyond max_free_bytes are unlinked, oldest first
+    unlinked = pool.stats["unlinked"]
+    pool.put(np.zeros((100, 100), dtype=np.uint8)).release()
+    assert pool.stats["unlinked"] == unlinked + 2 and pool.in_use() == 0
+    pool.close()
+
+
+def test_cache_references():
+    pool = page_buffers.PageBufferPool()
+    cache = PageCache(max_pages=1, retain=page_buffers.PageBuffer.retain, release=page_buffers.PageBuffer.release)
+    a = pool.put(np.zeros((4, 4), dtype=np.uint8))
+    cache.put("a", a)                        # the cache takes over the reference
+    hit = cache.get("a")                     # and hands out a new one
+    cache.put("b", pool.put(np.ones((4, 4), dtype=np.uint8)))   # evicts "a"
+    assert pool.in_use() == 2                # "a" (still held by `hit`) and "b"
+    hit.release()
+    assert pool.in_use() == 1
+    cache.clear()
+    assert pool.in_use() == 0
+    pool.close()
+
+
+def test_shared_preparation():
+    questions, _ = build_exam(8, seed=3)
+    page = render_pages(exam_text(questions), seed=3, handwriting=True, red_ink=True)[0]
+    expected = cv2.cvtColor(ocr_service.prepare_page(page, page=1), cv2.COLOR_RGB2GRAY)
+
+    pool = page_buffers.get_pool()
+    src = pool.put(page)
+    out = pool.adopt(ocr_service._prepare_shared(src, 1))
+    src.release()
+    print(f"Prepared page {out.shape} via shared memory; pool stats {pool.stats}")
+    assert np.array_equal(out.array(), expected)
+    out.release()
+
+
+if __name__ == "__main__":
+    test_pool()
+    test_cache_references()
+    test_shared_preparation()
+    print("\nVerification Passed!")
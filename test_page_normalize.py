@@ -0,0 +1,77 @@
+"""
+Page normalization: a known skew is measured and undone, dark scanner borders
+are cropped away, an oversized photo is scaled to the target text height while
+a 150 DPI page keeps its size, and prepared pages are cached. Also checks that
+red ink removal works on the RGB pages the pipeline passes in (blue pen kept).
+Run: python test_page_normalize.py
+"""
+import cv2
+import numpy as np
+from PIL import Image
+
+import page_normalize
+from ocr_service import remove_red_ink
+from synthetic_sheets import build_exam, exam_text, render_pages
+
+
+def clean_page():
+    questions, _ = build_exam(8, seed=3)
+    return render_pages(exam_text(questions), seed=3, handwriting=False, red_ink=False)[0]
+
+
+def test_skew():
+    page = clean_page()
+    for angle in (-3.0, 1.5):
+        rotated = page.rotate(angle, resample=Image.BICUBIC, fillcolor=(255, 255, 255))
+        norm = page_normalize.normalize_page(rotated)
+        print(f"Rotated {angle:+.1f} deg -> measured {norm.angle:+.2f}")
+        assert abs(norm.angle + angle) <= 0.2, norm.to_dict()
+    assert page_normalize.normalize_page(page).angle == 0.0
+
+
+def test_border_and_scale():
+    page = np.array(clean_page())
+    norm = page_normalize.normalize_page(page)
+    assert norm.scale == 1.0, norm.to_dict()
+    target = norm.text_height
+
+    # 2.5x "phone photo" in a dark frame
+    photo = cv2.resize(page, None, fx=2.5, fy=2.5, interpolation=cv2.INTER_CUBIC)
+    photo = cv2.copyMakeBorder(photo, 120, 120, 160, 160, cv2.BORDER_CONSTANT, value=(25, 25, 25))
+    norm = page_normalize.normalize_page(photo)
+    print(f"Photo: {norm.to_dict()}")
+    x0, y0, x1, y1 = norm.crop
+    assert x0 >= 160 and y0 >= 120 and x1 <= photo.shape[1] - 160 and y1 <= photo.shape[0] - 120
+    assert abs(norm.scale - 1 / 2.5) < 0.1, norm.scale
+    assert max(norm.image.shape[:2]) <= page_normalize.MAX_PAGE_SIDE
+    # No dark frame left in the normalized page
+    assert norm.image[:5].mean() > 200 and norm.image[:, :5].mean() > 200
+    renorm = page_normalize.normalize_page(norm.image)
+    assert abs(renorm.text_height - target) <= target * page_normalize.RESCALE_TOLERANCE, renorm.to_dict()
+
+
+def test_page_cache():
+    cache = page_normalize.PageCache(max_pages=2)
+    a, b, c = (np.full((4, 4, 3), v, dtype=np.uint8) for v in (1, 2, 3))
+    for img in (a, b, c):
+        cache.put(cache.key(img), img)
+    assert cache.get(cache.key(a)) is None, "oldest page should be evicted"
+    assert cache.get(cache.key(c)) is c
+    assert cache.key(a) != cache.key(a.reshape(4, 12, 1))
+
+
+def test_red_ink_rgb():
+    img = np.full((60, 200, 3), 255, dtype=np.uint8)
+    cv2.line(img, (10, 20), (190, 20), (20, 40, 160), 3)   # blue pen (RGB)
+    cv2.line(img, (10, 45), (190, 45), (220, 30, 30), 3)   # red marks (RGB)
+    cleaned = remove_red_ink(img)
+    assert cleaned[20, 100].tolist() == [20, 40, 160], "blue ink must be kept"
+    assert cleaned[45, 100].tolist() == [255, 255, 255], "red ink must be removed"
+
+
+if __name__ == "__main__":
+    test_skew()
+    test_border_and_scale()
+    test_page_cache()
+    test_red_ink_rgb()
+    print("\nVerification Passed!")
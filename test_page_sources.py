@@ -0,0 +1,111 @@
+"""
+Page sources: multi-frame TIFFs, ZIP and tar archives and directories of page
+images all yield RGB pages lazily in natural page order (page2 before page10),
+len() matches the pages yielded, EXIF orientation is applied and oversized
+inputs are refused.
+Run: python test_page_sources.py
+"""
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from PIL import Image
+
+import page_sources
+
+# Page n is a solid grey of level LEVELS[n - 1], so order can be read back
+LEVELS = [10, 60, 110, 160, 210]
+NAMES = ["page1.png", "page2.jpg", "page3.png", "page10.png", "page11.png"]
+
+
+def make_page(level, size=(40, 30), mode="L"):
+    return Image.new(mode, size, level)
+
+
+def levels(source):
+    return [page.getpixel((5, 5))[0] for page in source]
+
+
+def encoded(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, fmt)
+    return buf.getvalue()
+
+
+def test_sources():
+    tmp = tempfile.mkdtemp()
+    try:
+        pages = [make_page(v) for v in LEVELS]
+        pages[0].save(os.path.join(tmp, "booklet.tif"), save_all=True, append_images=pages[1:])
+
+        # Archive members in scrambled order; natural order must restore 1, 2, 3, 10, 11
+        scrambled = [3, 0, 4, 1, 2]
+        with zipfile.ZipFile(os.path.join(tmp, "booklet.zip"), "w") as zf:
+            zf.writestr("__MACOSX/._page1.png", b"junk")
+            zf.writestr("scan/notes.txt", b"not a page")
+            for i in scrambled:
+                fmt = "JPEG" if NAMES[i].endswith(".jpg") else "PNG"
+                zf.writestr("scan/" + NAMES[i], encoded(pages[i].convert("RGB"), fmt))
+        with tarfile.open(os.path.join(tmp, "booklet.upload.gz"), "w:gz") as tf:
+            for i in scrambled:
+                data = encoded(pages[i], "PNG")
+                info = tarfile.TarInfo(NAMES[i].replace(".jpg", ".png"))
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        os.mkdir(os.path.join(tmp, "dir"))
+        for i in scrambled:
+            pages[i].save(os.path.join(tmp, "dir", NAMES[i].replace(".jpg", ".png")))
+
+        for name, kind in [("booklet.tif", "image"), ("booklet.zip", "zip"),
+                           ("booklet.upload.gz", "tar"), ("dir", "directory")]:
+            with page_sources.open_pages(os.path.join(tmp, name)) as source:
+                got = levels(source)
+                print(f"{name:<18} {source.kind:<9} {len(source)} pages: {got}")
+                assert source.kind == kind
+                assert len(source) == len(LEVELS)
+                # JPEG is lossy: allow a little drift on page 2
+                assert all(abs(g - v) <= 3 for g, v in zip(got, LEVELS)), got
+
+        # A multi-frame TIFF inside an archive contributes all of its frames
+        # Fresh images: PIL keeps a previous save's encoder settings on the image
+        fresh = [make_page(v) for v in LEVELS]
+        fresh[1].save(os.path.join(tmp, "b.tif"), save_all=True, append_images=fresh[2:4])
+        with zipfile.ZipFile(os.path.join(tmp, "mixed.zip"), "w") as zf:
+            zf.write(os.path.join(tmp, "b.tif"), "b.tif")
+            zf.writestr("a.png", encoded(fresh[0], "PNG"))
+        with page_sources.open_pages(os.path.join(tmp, "mixed.zip")) as source:
+            assert len(source) == 4 and levels(source) == LEVELS[:4]
+
+        old_limit = page_sources.MAX_INPUT_PAGES
+        page_sources.MAX_INPUT_PAGES = 3
+        try:
+            page_sources.open_pages(os.path.join(tmp, "booklet.tif"))
+            raise AssertionError("expected the page limit to be enforced")
+        except ValueError as e:
+            print(f"Refused: {e}")
+        finally:
+            page_sources.MAX_INPUT_PAGES = old_limit
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_exif_orientation():
+    tmp = tempfile.mkdtemp()
+    try:
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotate 90 degrees clockwise when displayed
+        make_page(100, size=(40, 30), mode="RGB").save(os.path.join(tmp, "photo.jpg"), exif=exif)
+        with page_sources.open_pages(os.path.join(tmp, "photo.jpg")) as source:
+            (page,) = list(source)
+        assert page.mode == "RGB" and page.size == (30, 40), (page.mode, page.size)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    test_sources()
+    test_exif_orientation()
+    print("\nVerification Passed!")
@@ -0,0 +1,63 @@
+"""
+Parallel scoring must give exactly the same exam result as serial scoring,
+including Pass 2 matches and OR-group selection, also while two jobs run
+their worker pools at the same time.
+Run: python test_parallel_scoring.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from scoring import SemanticScorer
+
+
+def test_parallel_matches_serial():
+    scorer = SemanticScorer()
+
+    schema = {
+        "1": {"max_marks": 5, "type": "mandatory", "group": "1"},
+        "2": {"max_marks": 10, "type": "mandatory", "group": "2"},
+        "3": {"max_marks": 15, "type": "optional", "group": "group_3_4"},
+        "4": {"max_marks": 15, "type": "optional", "group": "group_3_4"},
+        "5": {"max_marks": 5, "type": "mandatory", "group": "5"},
+    }
+    model_segments = {
+        "1": "Photosynthesis is the process by which green plants make food.",
+        "2": "Newton's laws of motion are three physical laws that lay the foundation for classical mechanics.",
+        "3": "Mitochondria is the powerhouse of the cell.",
+        "4": "The nucleus controls the activities of the cell.",
+        "5": "Binary search halves a sorted array each step and runs in O(log n) time.",
+    }
+    # Q5 is written under the wrong number so it needs a Pass 2 semantic match
+    student_segments = {
+        "1": "Photosynthesis is how plants make food using sunlight.",
+        "2": "Gravity is a force.",
+        "3": "Powerhouse of cell.",
+        "4": "Nucleus is the brain of the cell controlling everything.",
+        "9": "binary search checks the middle of the sorted array and halves it, log n time",
+    }
+
+    serial = scorer.evaluate_exam(dict(student_segments), model_segments, question_schema=schema)
+    parallel = scorer.evaluate_exam(dict(student_segments), model_segments, question_schema=schema, workers=4)
+
+    assert serial == parallel, "Parallel scoring diverged from serial scoring"
+    print(f"Serial: {serial['total_score']}/{serial['max_score']}  Parallel: {parallel['total_score']}/{parallel['max_score']}")
+
+
+def test_concurrent_jobs():
+    # Each job's pool gets its own scorer; one job finishing must not break another's workers
+    model_segments = {str(i): f"Answer {i}: binary search halves a sorted array, step {i}." for i in range(1, 7)}
+    student_segments = {str(i): f"binary search halves the array each step {i}" for i in range(1, 7)}
+    scorers = [SemanticScorer(), SemanticScorer()]
+    serial = scorers[0].evaluate_exam(dict(student_segments), model_segments)
+
+    def job(i):
+        return scorers[i % 2].evaluate_exam(dict(student_segments), model_segments, workers=2)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(job, range(8)))
+    assert all(r == serial for r in results), "Concurrent parallel jobs diverged from serial scoring"
+
+
+if __name__ == "__main__":
+    test_parallel_matches_serial()
+    test_concurrent_jobs()
+    print("\nVerification Passed!")
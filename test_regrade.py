@@ -0,0 +1,77 @@
+"""
+Re-grading a stored job: the stored OCR noise ratios and the exam's prepared
+model features are passed to the scorer like on the upload path, and a
+scoring failure marks the new job as failed instead of leaving it processing.
+Stand-in scorer, so no model is needed.
+Run: python test_regrade.py
+"""
+import os
+import tempfile
+
+TMP = tempfile.mkdtemp()
+os.environ["RESULTS_DB"] = os.path.join(TMP, "results.db")
+
+import app
+import pipeline
+import result_store
+from exam_context import CONTEXTS
+
+
+class StandInScorer:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def model_features_many(self, texts):
+        return {t: f"features of {t}" for t in texts}
+
+    def evaluate_exam(self, student_segments, model_segments, question_schema=None, workers=None,
+                      ocr_noise=None, model_features=None):
+        if self.fail:
+            raise RuntimeError("scorer exploded")
+        self.calls.append({"ocr_noise": ocr_noise, "model_features": model_features})
+        return {"total_score": 1.0, "max_score": 2.0, "breakdown": []}
+
+
+def _stored_job(job_id):
+    store = app.store
+    store.start_job(job_id, student_id="roll1", model_hash="m" * 64, question_hash="q" * 64)
+    store.save_documents(job_id, segments={"student": {"1": "glucose", "2": "xq#"}, "model": {"1": "a", "2": "b"}},
+                         ocr_noise={"student": {"1": 0.0, "2": 0.9}})
+    store.finish_job(job_id, {"total_score": 0, "max_score": 2, "breakdown": []}, {"1": {"max_marks": 1}})
+
+
+def test_regrade_passes_noise_and_features():
+    _stored_job("orig")
+    client = app.app.test_client()
+
+    app._scorer = StandInScorer()
+    r = client.post("/jobs/orig/regrade")
+    assert r.status_code == 200, r.data
+    call = app._scorer.calls[-1]
+    assert call["ocr_noise"] == {"1": 0.0, "2": 0.9}, call
+    assert call["model_features"] == {"a": "features of a", "b": "features of b"}, call
+    assert app.store.segment_noise(r.json["job_id"], "student") == {"1": 0.0, "2": 0.9}
+
+    # The resident context of the exam is reused when it matches the stored segments
+    key = result_store.exam_id_for("m" * 64, "q" * 64)
+    resident = pipeline.Reference({"1": "a", "2": "b"}, {"1": {"max_marks": 1}}, set())
+    resident.features = {"a": "resident a", "b": "resident b"}
+    CONTEXTS.put(key, resident)
+    r = client.post("/jobs/orig/regrade")
+    assert r.status_code == 200 and app._scorer.calls[-1]["model_features"] is resident.features
+
+
+def test_regrade_failure_fails_job():
+    _stored_job("orig2")
+    app._scorer = StandInScorer(fail=True)
+    r = app.app.test_client().post("/jobs/orig2/regrade")
+    assert r.status_code == 500 and "scorer exploded" in r.json["error"], r.data
+    job = app.store.get_job(r.json["job_id"])
+    assert job["status"] == "error" and job["regrade_of"] == "orig2", job
+
+
+if __name__ == "__main__":
+    test_regrade_passes_noise_and_features()
+    test_regrade_failure_fails_job()
+    print("\nVerification Passed!")
@@ -0,0 +1,104 @@
+"""
+Result store: jobs, per-page OCR text and segments (with their OCR noise)
+round-trip through SQLite, databases from before the noise column are
+migrated, lookups by student / exam / model hash use the indexes, CSV columns
+are plain question ids, and retention prunes old jobs together with their
+pages and segments.
+Run: python test_result_store.py
+"""
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+import result_store
+
+
+def test_result_store():
+    with tempfile.TemporaryDirectory() as d:
+        store = result_store.ResultStore(os.path.join(d, "results.db"))
+        exam = {"total_score": 7.5, "max_score": 10,
+                "breakdown": [{"question": "1", "score": 5.0}, {"question": "2", "score": 2.5}]}
+
+        store.start_job("j1", student_id="roll1", model_hash="m" * 64, student_hash="s1")
+        store.save_documents("j1", ocr_text={"student": "1. first page\n---PAGE_BREAK---\n2. second\n---PAGE_BREAK---\n"},
+                             segments={"student": {"1": "first page", "2": "second"}, "model": {"1": "a", "2": "b"}})
+        store.finish_job("j1", exam, {"1": {"max_marks": 5}})
+        store.start_job("j2", student_id="roll2", model_hash="m" * 64)
+        store.fail_job("j2", "OCR failed")
+
+        job = store.get_job("j1")
+        assert job["status"] == "done" and job["total_score"] == 7.5
+        assert job["exam_id"] == result_store.exam_id_for("m" * 64), job["exam_id"]
+        assert store.get_result("j1") == exam
+        assert store.get_schema("j1") == {"1": {"max_marks": 5}}
+        assert store.pages("j1") == {"student": ["1. first page", "2. second"]}, store.pages("j1")
+        assert list(store.segments("j1", "student")) == ["1", "2"]
+        assert [j["job_id"] for j in store.list_jobs(exam_id=job["exam_id"])] == ["j2", "j1"]
+        assert [j["job_id"] for j in store.list_jobs(student_id="roll1")] == ["j1"]
+        assert [j["job_id"] for j in store.list_jobs(status="error")] == ["j2"]
+        assert store.latest_job_id() == "j1"
+
+        plan = " ".join(r[3] for r in store._conn().execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM jobs WHERE student_id=? ORDER BY created_at DESC", ("roll1",)))
+        assert "idx_jobs_student" in plan, plan
+
+        out = io.StringIO()
+        store.export_csv(out, store.list_jobs())
+        lines = out.getvalue().splitlines()
+        assert lines[0].startswith("job_id,student_id") and "Q1,Q2" in lines[0] and len(lines) == 3, lines
+
+        # Retention: age limit and count limit, children removed too
+        store._conn().execute("UPDATE jobs SET created_at=? WHERE job_id='j2'", (time.time() - 400 * 86400,))
+        store._conn().commit()
+        assert store.prune(max_jobs=10, retention_days=180) == 1
+        assert store.get_job("j2") is None and store.get_job("j1") is not None
+        store.start_job("j3", student_id="roll3")
+        assert store.prune(max_jobs=1) == 1
+        assert store.get_job("j1") is None and store.pages("j1") == {} and store.segments("j1", "student") == {}
+        store.close()
+
+
+def test_segment_noise_and_migration():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "results.db")
+        old = sqlite3.connect(path)
+        old.executescript(result_store.SCHEMA.replace("    ocr_noise REAL,\n", ""))
+        old.execute("INSERT INTO segments VALUES ('old', 'student', '1', 'kept')")
+        old.commit()
+        old.close()
+
+        store = result_store.ResultStore(path)
+        assert store.segments("old", "student") == {"1": "kept"} and store.segment_noise("old", "student") == {}
+        store.save_documents("j1", segments={"student": {"1": "a", "2": "b"}, "model": {"1": "x", "2": "y"}},
+                             ocr_noise={"student": {"1": 0.25}})
+        assert store.segment_noise("j1", "student") == {"1": 0.25}
+        assert store.segment_noise("j1", "model") == {}
+        store.close()
+
+
+def test_export_csv_annotated_questions():
+    with tempfile.TemporaryDirectory() as d:
+        store = result_store.ResultStore(os.path.join(d, "results.db"))
+        store.start_job("j1")
+        store.finish_job("j1", {"total_score": 3, "max_score": 10, "breakdown": [
+            {"question": "1a (checked against Q1)", "_base_key": "1a", "score": 3.0}]})
+        store.start_job("j2")
+        store.finish_job("j2", {"total_score": 4, "max_score": 10, "breakdown": [
+            {"question": "1a", "score": 4.0}]})
+        out = io.StringIO()
+        store.export_csv(out, store.list_jobs())
+        lines = out.getvalue().splitlines()
+        header = lines[0].split(",")
+        assert [h for h in header if h.startswith("Q")] == ["Q1a"], header
+        assert lines[1].split(",")[header.index("Q1a")] == "4.0", lines
+        assert lines[2].split(",")[header.index("Q1a")] == "3.0", lines
+        store.close()
+
+
+if __name__ == "__main__":
+    test_result_store()
+    test_segment_noise_and_migration()
+    test_export_csv_annotated_questions()
+    print("\nVerification Passed!")
@@ -0,0 +1,98 @@
+"""
+Segment triage: empty and noise-only student answers get their fixed result
+without being embedded (also OCR garbage with stray clean letters when OCR
+reports low confidence), short but valid answers are still scored, Pass 2
+encodes nothing when no substantive segment is left, and the triage counts
+are reported with the exam.
+Run: python test_segment_triage.py
+"""
+from scoring import SemanticScorer, TRIAGE_RESULTS
+
+SHORT_ANSWERS = {"1": "CPU", "2": "O(1)", "3": "42", "4": "x = 5", "5": "DNS, ARP", "6": "9.8 m/s2"}
+GARBAGE = ["~ Il ,' lI| r ; !i", "Il lI ii x", "| l1 ,. Il ~"]
+
+
+def test_triage_segment():
+    scorer = SemanticScorer()
+    assert scorer.triage_segment("") == "empty"
+    assert scorer.triage_segment("  -- . \n") == "empty"
+    assert scorer.triage_segment("a1 ;") == "noise"
+    assert scorer.triage_segment("## 12ab -- 3c4 ~~ 77x") == "noise"
+    assert scorer.triage_segment("Plants make food.") == "substantive"
+    for short in SHORT_ANSWERS.values():
+        assert scorer.triage_segment(short) == "substantive", short
+        assert scorer.triage_segment(short, ocr_noise=0.9) == "substantive", short
+    # Low OCR confidence alone does not discard an answer with content words
+    assert scorer.triage_segment("photosynthesis uses sunlight", ocr_noise=0.9) == "substantive"
+    # OCR garbage with stray clean letters is noise once OCR reports low confidence
+    for garbage in GARBAGE:
+        assert scorer.triage_segment(garbage, ocr_noise=0.9) == "noise", garbage
+        assert scorer.triage_segment(garbage.lower(), ocr_noise=0.9) == "noise", garbage
+    # ... unless its short words are words of the exam's model answer
+    assert scorer.triage_segment("~ io ;", ocr_noise=0.9) == "noise"
+    assert scorer.triage_segment("~ io ;", ocr_noise=0.9, vocabulary={"io"}) == "substantive"
+
+
+def test_trivial_answers_skip_the_model():
+    scorer = SemanticScorer()
+    model_segments = {
+        "1": "Photosynthesis is the process by which green plants make food using sunlight.",
+        "2": "Newton's laws of motion are three physical laws of classical mechanics.",
+        "3": "Mitochondria is the powerhouse of the cell.",
+        "4": "Binary search halves a sorted array each step and runs in O(log n) time.",
+    }
+    student_segments = {
+        "1": "Photosynthesis is how plants make food using sunlight.",
+        "2": "   ",
+        "3": "## 12ab -- 3c4 ~~ 77x",
+        "9": "ok",
+    }
+    result = scorer.evaluate_exam(dict(student_segments), model_segments)
+    print(f"Triage: {result['triage']}")
+    assert result["triage"] == {"empty": 1, "noise": 1, "substantive": 1, "not_attempted": 1}
+
+    # Garbage that OCR read with low confidence is not embedded either
+    garbage = dict(student_segments, **{"3": GARBAGE[0]})
+    noisy = scorer.evaluate_exam(garbage, model_segments, ocr_noise={"1": 0.0, "3": 0.9})
+    assert noisy["triage"] == result["triage"], noisy["triage"]
+    assert GARBAGE[0] not in scorer.window_embedder._windows
+
+    by_q = {r["question"]: r for r in result["breakdown"]}
+    assert by_q["1"]["score"] > 0
+    assert by_q["2"]["score"] == 0 and by_q["2"]["feedback"] == TRIAGE_RESULTS["empty"]["feedback"]
+    assert by_q["3"]["score"] == 0 and by_q["3"]["feedback"] == TRIAGE_RESULTS["noise"]["feedback"]
+    assert by_q["4"]["feedback"] == "Not Attempted"
+
+    # Only the substantive answer was windowed/encoded; Pass 2 had no candidate
+    # for Q4, so its model text was not encoded either
+    assert list(scorer.window_embedder._windows) == [student_segments["1"]]
+    assert not scorer.window_embedder._texts
+
+
+def test_short_answers_are_scored():
+    scorer = SemanticScorer()
+    model_segments = {
+        "1": "CPU",
+        "2": "Binary search runs in O(1) time at best and O(log n) in the worst case.",
+        "3": "42",
+        "4": "x = 5",
+        "5": "DNS, ARP",
+        "6": "9.8 m/s2",
+    }
+    result = scorer.evaluate_exam(dict(SHORT_ANSWERS), model_segments)
+    print(f"Short answers: {[(r['question'], r['score']) for r in result['breakdown']]}")
+    assert result["triage"] == {"empty": 0, "noise": 0, "substantive": 6, "not_attempted": 0}
+    triaged = {r["feedback"] for r in TRIAGE_RESULTS.values()}
+    by_q = {r["question"]: r for r in result["breakdown"]}
+    for q in SHORT_ANSWERS:
+        assert by_q[q]["feedback"] not in triaged, q
+    # Answers identical to the model answer get marks
+    for q in ("1", "4", "5"):
+        assert by_q[q]["score"] > 0, q
+
+
+if __name__ == "__main__":
+    test_triage_segment()
+    test_trivial_answers_skip_the_model()
+    test_short_answers_are_scored()
+    print("\nVerification Passed!")
@@ -0,0 +1,98 @@
+"""
+Tesseract pool: the chosen backend reuses its engines, map() returns results in
+input order and matches one-by-one calls. Needs tesseract (tesserocr, libtesseract
+or the CLI) with English traineddata; otherwise it reports SKIP. The CLI backend
+gets text and word data from one tesseract run (text rebuilt from the TSV).
+Run: python test_tesseract_pool.py
+"""
+import cv2
+import numpy as np
+
+import tesseract_pool
+
+
+def make_line(text):
+    img = np.full((80, 900), 255, dtype=np.uint8)
+    cv2.putText(img, text, (10, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 0, 3)
+    return img
+
+
+def test_pool():
+    try:
+        pool = tesseract_pool.TesseractPool(size=2)
+        first = pool.image_to_string(make_line("binary search tree"), psm=7)
+    except Exception as e:
+        print(f"SKIP: no usable tesseract backend ({e})")
+        return
+
+    images = [make_line(t) for t in ["binary search tree", "stack push pop", "hash table chaining"]]
+    one_by_one = [pool.image_to_string(img, psm=7) for img in images]
+    mapped = pool.map(images, psm=7)
+    print(f"Backend: {pool.backend}, engines created: {pool._created}")
+    print(f"OCR: {[t.strip() for t in mapped]}")
+    assert mapped == one_by_one, "map() must match one-by-one results in order"
+    assert first == one_by_one[0], "Reused engine must give the same text"
+    assert pool._created <= pool.size
+    assert "search" in first.lower(), first
+    pool.close()
+
+
+TSV = "\n".join("\t".join(map(str, row)) for row in [
+    ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+     "left", "top", "width", "height", "conf", "text"),
+    (1, 1, 0, 0, 0, 0, 0, 0, 900, 300, -1, ""),
+    (5, 1, 1, 1, 1, 1, 10, 10, 60, 20, 91, "1."),
+    (5, 1, 1, 1, 1, 2, 80, 10, 90, 20, 88, "Binary"),
+    (5, 1, 1, 1, 2, 1, 10, 40, 90, 20, 90, "search"),
+    (5, 1, 1, 1, 2, 2, 110, 40, 20, 20, 95, " "),
+    (5, 1, 1, 2, 1, 1, 10, 90, 60, 20, 80, "2."),
+    (5, 1, 2, 1, 1, 1, 10, 150, 60, 20, 70, "Stack"),
+])
+
+
+class CountingPytesseract:
+    def __init__(self):
+        self.calls = []
+
+    def image_to_string(self, image, lang=None, config=""):
+        self.calls.append("image_to_string")
+        return "1. Binary\nsearch\n\n2.\n\nStack\n"
+
+    def image_to_data(self, image, lang=None, config=""):
+        self.calls.append("image_to_data")
+        return TSV
+
+
+def test_text_from_tsv():
+    assert tesseract_pool.text_from_tsv(TSV) == "1. Binary\nsearch\n\n2.\n\nStack\n"
+    assert tesseract_pool.text_from_tsv("") == ""
+
+
+def test_cli_runs_tesseract_once():
+    engine = tesseract_pool.CliEngine.__new__(tesseract_pool.CliEngine)
+    engine._pytesseract, engine.lang, engine.oem = CountingPytesseract(), "eng", 3
+    text, tsv = engine.recognize_data(make_line("stack"), psm=4)
+    assert engine._pytesseract.calls == ["image_to_data"], engine._pytesseract.calls
+    assert tsv == TSV and text == tesseract_pool.text_from_tsv(TSV)
+
+
+def test_text_matches_native():
+    try:
+        engine = tesseract_pool.BACKENDS["tesserocr"]()
+    except Exception as e:
+        print(f"SKIP: tesserocr not available ({e})")
+        return
+    img = np.full((260, 900), 255, dtype=np.uint8)
+    for y, line in ((55, "binary search tree"), (105, "stack push pop"), (215, "hash table chaining")):
+        cv2.putText(img, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 0, 3)
+    text, tsv = engine.recognize_data(img, psm=4)
+    engine.close()
+    assert tesseract_pool.text_from_tsv(tsv).strip() == text.strip(), (text, tsv)
+
+
+if __name__ == "__main__":
+    test_pool()
+    test_text_from_tsv()
+    test_cli_runs_tesseract_once()
+    test_text_matches_native()
+    print("\nVerification Passed!")
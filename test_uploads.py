@@ -0,0 +1,75 @@
+"""
+Streaming uploads: unique file names, hashes computed while streaming, per-file
+size limit, and no files left behind by rejected or finished requests.
+Run: python test_uploads.py
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import Flask, jsonify, request
+
+import uploads
+
+
+def make_app(folder):
+    app = Flask(__name__)
+    app.request_class = uploads.UploadRequest
+    claimed = []
+
+    @app.route("/up", methods=["POST"])
+    def up():
+        if "model_file" not in request.files:
+            return jsonify({"error": "missing"}), 400
+        batch = [uploads.claim_upload(request.files[name]) for name in ("student_file", "model_file")]
+        claimed.extend(batch)
+        return jsonify([u.to_dict() for u in batch])
+
+    return app, claimed
+
+
+def test_streaming_uploads():
+    with tempfile.TemporaryDirectory() as folder:
+        uploads.UPLOAD_FOLDER = folder
+        app, claimed = make_app(folder)
+        client = app.test_client()
+        student, model = b"student-scan" * 1000, b"model-answer"
+
+        # Same filename twice must not collide
+        r = client.post("/up", data={"student_file": (io.BytesIO(student), "scan.pdf"),
+                                     "model_file": (io.BytesIO(model), "scan.pdf")},
+                        content_type="multipart/form-data")
+        assert r.status_code == 200, r.data
+        assert r.json[0]["sha256"] == hashlib.sha256(student).hexdigest()
+        assert r.json[1]["size"] == len(model)
+        assert claimed[0].path != claimed[1].path and claimed[0].path.endswith(".pdf")
+        with open(claimed[0].path, "rb") as f:
+            assert f.read() == student
+        print(f"Claimed: {[os.path.basename(u.path) for u in claimed]}")
+
+        # Unclaimed files of a rejected request are removed when it closes
+        client.post("/up", data={"student_file": (io.BytesIO(student), "a.pdf")},
+                    content_type="multipart/form-data")
+        assert len(os.listdir(folder)) == 2, os.listdir(folder)
+
+        # Oversized file is cut off while streaming
+        old_limit = uploads.MAX_UPLOAD_BYTES
+        uploads.MAX_UPLOAD_BYTES = 4096
+        try:
+            r = client.post("/up", data={"student_file": (io.BytesIO(student), "a.pdf"),
+                                         "model_file": (io.BytesIO(model), "m.pdf")},
+                            content_type="multipart/form-data")
+            assert r.status_code == 413, r.status_code
+        finally:
+            uploads.MAX_UPLOAD_BYTES = old_limit
+        assert len(os.listdir(folder)) == 2, os.listdir(folder)
+
+        # The job releases its files when done
+        uploads.release(claimed)
+        assert os.listdir(folder) == []
+    print("\nVerification Passed!")
+
+
+if __name__ == "__main__":
+    test_streaming_uploads()
@@ -0,0 +1,144 @@
+"""
+Window embedding modes: SemanticScorer takes the mode from WINDOW_MODE or its
+window_mode argument, and evaluate_exam in "token" mode pools a long answer's
+windows from one encoder pass while short answers score as in "sentence" mode.
+One WindowEmbedder shared by several job threads never loses an entry to
+another thread's eviction. Stand-in model (word-hash token embeddings), so no
+weights are needed.
+Run: python test_window_modes.py
+"""
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import scoring
+import window_embeddings
+from scoring import SemanticScorer
+
+DIM = 32
+
+
+class StandInTokenizer:
+    pad_token_id, cls_token_id, sep_token_id = 0, 1, 2
+
+    def __call__(self, texts, add_special_tokens=False):
+        # Each word splits into 4-character pieces, like sub-word tokens
+        return {"input_ids": [[3 + zlib.crc32(w[i:i + 4].lower().encode()) % 5000 for i in range(0, len(w), 4)]
+                              for w in texts]}
+
+
+class StandInModel:
+    """Token embedding = a fixed random vector per id; sentence embedding = their mean."""
+    max_seq_length = 128
+    device = "cpu"
+
+    def __init__(self):
+        self.tokenizer = StandInTokenizer()
+        self.table = torch.randn(5003, DIM, generator=torch.Generator().manual_seed(0))
+        self.forward_calls = 0
+
+    def __call__(self, features):
+        self.forward_calls += 1
+        tokens = self.table[features["input_ids"]]
+        mask = features["attention_mask"].unsqueeze(-1).float()
+        pooled = (tokens * mask).sum(1) / mask.sum(1).clamp(min=1)
+        return {"token_embeddings": tokens, "sentence_embedding": torch.nn.functional.normalize(pooled, dim=1)}
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        rows = []
+        for text in texts:
+            ids = [i for w in text.split() for i in self.tokenizer([w])["input_ids"][0]][:self.max_seq_length - 2]
+            vec = self.table[ids].mean(0) if ids else torch.zeros(DIM)
+            rows.append(torch.nn.functional.normalize(vec, dim=0))
+        out = torch.stack(rows) if rows else torch.zeros((0, DIM))
+        out = out if convert_to_tensor else out.numpy()
+        return out[0] if single else out
+
+
+def test_mode_setting():
+    saved = scoring.MODEL, scoring.WINDOW_MODE
+    try:
+        scoring.MODEL = StandInModel()
+        assert SemanticScorer().window_embedder.mode == "sentence"
+        assert SemanticScorer(window_mode="token").window_embedder.mode == "token"
+        scoring.WINDOW_MODE = "token"
+        assert SemanticScorer().window_embedder.mode == "token"
+        try:
+            SemanticScorer(window_mode="tokens")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    finally:
+        scoring.MODEL, scoring.WINDOW_MODE = saved
+
+
+def test_evaluate_exam_token_mode():
+    saved = scoring.MODEL
+    try:
+        model = scoring.MODEL = StandInModel()
+        schema = {"1": {"max_marks": 5, "type": "mandatory", "group": "1"},
+                  "2": {"max_marks": 10, "type": "mandatory", "group": "2"}}
+        model_segments = {"1": "Photosynthesis is the process by which green plants make food.",
+                          "2": "Binary search halves a sorted array each step and runs in logarithmic time."}
+        filler = ("the student wrote a long essay about algorithms and data structures covering arrays lists "
+                  "trees graphs and hashing in some detail ") * 20
+        student_segments = {"1": "Photosynthesis is how plants make food using sunlight.",
+                            "2": filler + "binary search halves the sorted array each step in logarithmic time"}
+        assert len(student_segments["2"].split()) >= 300
+
+        sentence = SemanticScorer(window_mode="sentence").evaluate_exam(
+            dict(student_segments), model_segments, question_schema=schema)
+        assert model.forward_calls == 0
+        token = SemanticScorer(window_mode="token").evaluate_exam(
+            dict(student_segments), model_segments, question_schema=schema)
+        assert model.forward_calls == 1, model.forward_calls
+
+        by_q = lambda res: {b["question"]: b for b in res["breakdown"]}
+        s, t = by_q(sentence), by_q(token)
+        assert s.keys() == t.keys() and token["max_score"] == sentence["max_score"]
+        assert t["1"]["score"] == s["1"]["score"], (s["1"], t["1"])
+        assert 0 <= t["2"]["score"] <= 10
+        print(f"Sentence mode: {sentence['total_score']}/{sentence['max_score']}  "
+              f"Token mode: {token['total_score']}/{token['max_score']}")
+    finally:
+        scoring.MODEL = saved
+
+
+def test_shared_embedder():
+    saved = window_embeddings.CACHE_MAX_ENTRIES
+    window_embeddings.CACHE_MAX_ENTRIES = 2
+    try:
+        model = StandInModel()
+        embedder = window_embeddings.WindowEmbedder(model)
+        texts = [f"answer {i}" for i in range(50)]
+        expected = {t: model.encode(t, convert_to_tensor=True) for t in texts}
+
+        def work(k):
+            for i in range(500):
+                text = texts[(i * 7 + k * 13) % len(texts)]
+                windows, _, full = embedder.embed(text)
+                assert windows == [text] and torch.equal(full, expected[text])
+                assert torch.equal(embedder.encode_text(text), expected[text])
+            return k
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads between any two cache steps
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                assert list(pool.map(work, range(8))) == list(range(8))
+        finally:
+            sys.setswitchinterval(interval)
+        assert len(embedder._windows) <= 2 and len(embedder._texts) <= 2
+    finally:
+        window_embeddings.CACHE_MAX_ENTRIES = saved
+
+
+if __name__ == "__main__":
+    test_mode_setting()
+    test_evaluate_exam_token_mode()
+    test_shared_embedder()
+    print("\nVerification Passed!")
@@ -37,38 +37,92 @@ def correct_spelling(text, custom_dictionary=None, cutoff=0.75):
     Only corrects words that are very close to a dictionary term.
     Uses high cutoff (0.75) to avoid aggressively corrupting words.
     """
-    if not text:
-        return ""
+    return SpellingIndex(custom_dictionary, cutoff).correct(text)
+
 
-    if custom_dictionary is None:
-        dictionary = COMMON_TERMS
-    else:
-        dictionary = COMMON_TERMS + list(custom_dictionary)
+class SpellingIndex:
+    """
+    correct_spelling for one dictionary, built once (e.g. per exam, from the
+    model vocabulary) and reused for every student: the dictionary list and
+    its lookup set are kept, and each distinct word's correction is memoized.
+    """
 
-    words = text.split()
-    corrected_words = []
+    def __init__(self, custom_dictionary=None, cutoff=0.75):
+        if custom_dictionary is None:
+            self.dictionary = COMMON_TERMS
+        else:
+            self.dictionary = COMMON_TERMS + list(custom_dictionary)
+        self.known = set(self.dictionary)
+        self.cutoff = cutoff
+        self._corrections = {}
 
-    for word in words:
+    def correct_word(self, word):
         # Skip very short words (they are usually correct or common words)
-        if len(word) <= 3:
-            corrected_words.append(word)
-            continue
-        
-        # Skip words that are already in the dictionary (exact match)
-        if word in dictionary:
-            corrected_words.append(word)
-            continue
-            
-        # Find close matches with high cutoff to avoid aggressive replacement
-        matches = get_close_matches(word, dictionary, n=1, cutoff=cutoff)
-        if matches:
-            match = matches[0]
+        # and words that are already in the dictionary (exact match)
+        if len(word) <= 3 or word in self.known:
+            return word
+        corrected = self._corrections.get(word)
+        if corrected is None:
+            corrected = word
+            # Find close matches with high cutoff to avoid aggressive replacement
+            matches = get_close_matches(word, self.dictionary, n=1, cutoff=self.cutoff)
             # Guard: don't replace if length difference is too big (likely wrong match)
-            if abs(len(match) - len(word)) <= 3:
-                corrected_words.append(match)
-            else:
-                corrected_words.append(word)
-        else:
-            corrected_words.append(word)
-    
-    return " ".join(corrected_words)
+            if matches and abs(len(matches[0]) - len(word)) <= 3:
+                corrected = matches[0]
+            self._corrections[word] = corrected
+        return corrected
+
+    def correct(self, text):
+        if not text:
+            return ""
+        return " ".join(self.correct_word(word) for word in text.split())
+
+
+class SegmentAnalysis:
+    """
+    Token index for one student segment, built once and shared by every
+    scorer helper (noise ratio, keyword extraction, fuzzy matching, literal
+    checks) instead of each of them re-splitting and re-lowercasing the text.
+    """
+
+    def __init__(self, text, stop_words=()):
+        self.text = text
+        self.lower_text = text.lower()
+
+        # Whitespace tokens (as text.split()) and their lowercase forms
+        self.tokens = text.split()
+        self.lower_tokens = self.lower_text.split()
+        self.token_set = set(self.lower_tokens)
+        self.word_count = len(self.tokens)
+
+        # Character classes over the whole segment
+        self.alpha_chars = sum(c.isalpha() for c in text)
+        self.digit_chars = sum(c.isdigit() for c in text)
+        self.space_chars = sum(c.isspace() for c in text)
+        self.other_chars = len(text) - self.alpha_chars - self.digit_chars - self.space_chars
+
+        # OCR noise: words that are purely non-alpha ("---", "##") or digit-heavy ("42ab")
+        noise_words = 0
+        for w in self.tokens:
+            alpha = sum(c.isalpha() for c in w)
+            digit = sum(c.isdigit() for c in w)
+            if len(w) >= 2 and alpha == 0:
+                noise_words += 1
+            elif digit > 0 and alpha > 0 and digit >= alpha:
+                noise_words += 1
+        self.noise_ratio = noise_words / max(self.word_count, 1) if self.tokens else 0.0
+
+        # Content keywords (punctuation stripped, > 3 chars, not stop words)
+        clean = re.sub(r'[^\w\s]', '', self.lower_text)
+        self.keywords = [w for w in clean.split() if len(w) > 3 and w not in stop_words]
+        self.keyword_set = set(self.keywords)
+
+        # Keywords bucketed by length for fuzzy matching (only +/-2 lengths are compared)
+        self.length_buckets = {}
+        for w in self.keywords:
+            self.length_buckets.setdefault(len(w), []).append(w)
+
+
+def analyze_segment(text, stop_words=()):
+    """Build the SegmentAnalysis for a piece of (student) text."""
+    return SegmentAnalysis(text or "", stop_words)
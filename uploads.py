@@ -0,0 +1,176 @@
+"""
+Streaming upload handling for /evaluate.
+
+Werkzeug's multipart parser writes each uploaded file to the stream returned by
+Request._get_file_stream, chunk by chunk, while it reads the request body.
+UploadRequest returns a HashingFile there, so every upload lands directly in a
+uniquely named file under UPLOAD_FOLDER with its SHA-256 and size computed on
+the way in -- no in-memory spooling and no second copy via FileStorage.save().
+
+Limits are enforced while streaming: MAX_CONTENT_LENGTH rejects oversized
+requests from the Content-Length header before the body is read, and
+MAX_UPLOAD_BYTES aborts a single file as soon as it grows past the limit.
+
+Files belong to a job: the route claims them (claim_upload) and the job
+deletes them when it finishes (release). Anything a request wrote but never
+claimed (aborted uploads, validation errors) is removed when the request
+closes, and sweep_stale() clears leftovers from a crashed process at startup.
+"""
+import hashlib
+import os
+import time
+import uuid
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+UPLOAD_FOLDER = "uploads"
+
+# Per-file and per-request limits (bytes)
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+MAX_CONTENT_LENGTH = 3 * MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Chunk size for the fallback copy in claim_upload
+CHUNK_SIZE = 1024 * 1024
+
+# Uploads older than this are treated as orphans by sweep_stale()
+STALE_AFTER_SECONDS = 6 * 3600
+
+
+class HashingFile:
+    """Writable/readable file that hashes and size-checks everything written to it."""
+
+    def __init__(self, folder, filename):
+        ext = os.path.splitext(secure_filename(filename or ""))[1].lower()
+        self.path = os.path.join(folder, uuid.uuid4().hex + ext)
+        self.size = 0
+        self.claimed = False
+        self._sha = hashlib.sha256()
+        self._file = open(self.path, "w+b")
+
+    @property
+    def sha256(self):
+        return self._sha.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit.")
+        self._sha.update(data)
+        return self._file.write(data)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class UploadRequest(Request):
+    """Flask request class that streams file uploads into HashingFiles."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = HashingFile(UPLOAD_FOLDER, filename)
+        if not hasattr(self, "_hashing_files"):
+            self._hashing_files = []
+        self._hashing_files.append(stream)
+        return stream
+
+    def close(self):
+        super().close()
+        for stream in getattr(self, "_hashing_files", []):
+            if not stream.claimed:
+                stream.discard()
+
+
+class Upload:
+    """An uploaded file on disk, owned by one job."""
+
+    def __init__(self, path, filename, sha256, size):
+        self.path = path
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+
+    def to_dict(self):
+        return {"filename": self.filename, "sha256": self.sha256, "size": self.size}
+
+
+def claim_upload(storage):
+    """
+    Takes ownership of a FileStorage's file and returns an Upload.
+    Streams written by UploadRequest are already on disk and hashed; any other
+    stream (e.g. a plain Request) is copied in chunks, hashed on the way.
+    """
+    stream = storage.stream
+    if isinstance(stream, HashingFile):
+        stream.flush()
+        stream.close()
+        stream.claimed = True
+        return Upload(stream.path, storage.filename, stream.sha256, stream.size)
+
+    target = HashingFile(UPLOAD_FOLDER, storage.filename)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            target.write(chunk)
+    except Exception:
+        target.discard()
+        raise
+    target.close()
+    target.claimed = True
+    return Upload(target.path, storage.filename, target.sha256, target.size)
+
+
+def release(uploads):
+    """Deletes a job's uploaded files."""
+    for upload in uploads:
+        if upload is None:
+            continue
+        try:
+            os.remove(upload.path)
+        except OSError:
+            pass
+
+
+def sweep_stale(folder=UPLOAD_FOLDER, max_age=STALE_AFTER_SECONDS):
+    """Removes uploads left behind by jobs that never finished (e.g. a crash)."""
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        print(f"[Uploads] Removed {removed} stale upload(s) from {folder}")
+    return removed
@@ -0,0 +1,73 @@
+"""
+Checks that ConceptExtractor returns the same top-n concepts as the previous
+CountVectorizer-based extract_key_concepts, and times both.
+Run: python verify_concept_extractor.py
+"""
+import time
+from scoring import SemanticScorer
+from concepts import ConceptExtractor
+
+MODEL_SEGMENTS = [
+    "Decision tree pruning is a technique to reduce the size of decision trees by removing sections that provide little power to classify instances. Pruning reduces the complexity of the final classifier and hence improves predictive accuracy by the reduction of overfitting.",
+    "Supervised learning is a type of machine learning where the model is trained on labeled data. The algorithm learns from the training data and makes predictions. Examples include linear regression, decision trees, and neural networks.",
+    "Overfitting occurs when a model learns the training data too well, including noise and outliers, resulting in poor generalization to new data.",
+    "Binary Search Time Complexity: Best Case O(1) when target found at middle position. Worst Case O(log n) when element at end.",
+    "Photosynthesis is the process by which green plants make food.",
+]
+
+
+def reference_extract_key_concepts(scorer, text, top_n=10):
+    """The original per-call CountVectorizer implementation, kept here as the reference."""
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    try:
+        count = CountVectorizer(ngram_range=(1, 3), stop_words=list(scorer.stop_words)).fit([text])
+        candidates = count.get_feature_names_out()
+    except ValueError:
+        return []
+    if len(candidates) == 0:
+        return []
+
+    doc_embedding = scorer.model.encode([text], convert_to_tensor=True)
+    candidate_embeddings = scorer.model.encode(candidates, convert_to_tensor=True)
+    distances = cosine_similarity(doc_embedding.cpu().numpy(), candidate_embeddings.cpu().numpy())
+    indices = distances.argsort()[0][-top_n:]
+    return [str(candidates[i]) for i in indices][::-1]
+
+
+def verify_concept_extractor(top_n=8, rounds=5):
+    scorer = SemanticScorer()
+
+    start = time.time()
+    for _ in range(rounds):
+        reference = [reference_extract_key_concepts(scorer, t, top_n) for t in MODEL_SEGMENTS]
+    ref_time = (time.time() - start) / rounds
+
+    # Fresh extractor each round so the timing includes encoding, not just cache hits
+    start = time.time()
+    for _ in range(rounds):
+        extractor = ConceptExtractor(scorer.model, scorer.stop_words)
+        fast = extractor.extract_many(MODEL_SEGMENTS, top_n=top_n)
+    fast_time = (time.time() - start) / rounds
+
+    mismatches = 0
+    for i, (ref, new) in enumerate(zip(reference, fast)):
+        same = ref == new
+        mismatches += 0 if same else 1
+        print(f"  Segment {i + 1}: {'[PASS]' if same else '[FAIL]'} {new[:4]}...")
+        if not same:
+            print(f"    reference: {ref}")
+
+    print(f"\nCountVectorizer path: {ref_time * 1000:.1f} ms per exam")
+    print(f"ConceptExtractor:     {fast_time * 1000:.1f} ms per exam ({ref_time / max(fast_time, 1e-9):.1f}x)")
+
+    diverse = scorer.extract_key_concepts(MODEL_SEGMENTS[0], top_n=top_n, diversity=0.5)
+    print(f"MMR (diversity=0.5):  {diverse}")
+
+    assert mismatches == 0, f"{mismatches} segment(s) differ from the reference top-{top_n}"
+    print("\nVerification Passed!")
+
+
+if __name__ == "__main__":
+    verify_concept_extractor()
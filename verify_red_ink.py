@@ -18,8 +18,8 @@ def test_red_ink_removal():
     # Save original
     cv2.imwrite("test_red_input.png", img)
     
-    # 2. Process
-    cleaned = remove_red_ink(img)
+    # 2. Process (remove_red_ink works on RGB, like the PIL pages of the pipeline)
+    cleaned = cv2.cvtColor(remove_red_ink(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)), cv2.COLOR_RGB2BGR)
     cv2.imwrite("test_red_output.png", cleaned)
     
     # 3. Verify
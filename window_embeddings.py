@@ -0,0 +1,195 @@
+import threading
+from collections import OrderedDict
+
+# Sliding windows used to find the best-matching stretch of a long answer
+WINDOW_SIZE = 6
+STEP_SIZE = 3
+# Answers up to this many words are scored as one block (windowing hurts short noisy text)
+SHORT_ANSWER_WORDS = 30
+# In "token" mode, answers at least this long are pooled from one forward pass
+TOKEN_MODE_MIN_WORDS = 300
+# Student segments / texts kept in the LRU caches
+CACHE_MAX_ENTRIES = 512
+# Window embedding modes (see WindowEmbedder)
+MODES = ("sentence", "token")
+
+
+def build_windows(student_text, words=None):
+    """Overlapping WINDOW_SIZE-word windows with step STEP_SIZE (or the whole text if short)."""
+    if words is None:
+        words = student_text.split()
+    windows = []
+    if len(words) <= WINDOW_SIZE or len(words) <= SHORT_ANSWER_WORDS:
+        windows.append(student_text)
+    else:
+        for i in range(0, len(words) - WINDOW_SIZE + 1, STEP_SIZE):
+            windows.append(" ".join(words[i:i + WINDOW_SIZE]))
+        if len(words) % STEP_SIZE != 0:
+            windows.append(" ".join(words[-WINDOW_SIZE:]))
+    return windows or [student_text]
+
+
+def _window_spans(n_words):
+    """Word index ranges matching build_windows() for a long answer."""
+    spans = [(i, i + WINDOW_SIZE) for i in range(0, n_words - WINDOW_SIZE + 1, STEP_SIZE)]
+    if n_words % STEP_SIZE != 0:
+        spans.append((n_words - WINDOW_SIZE, n_words))
+    return spans
+
+
+class WindowEmbedder:
+    """
+    Caches window embeddings per student segment so the same answer is only
+    windowed and encoded once, no matter how many model keys it is compared
+    against (Pass 1, Pass 2 candidates, re-grades).
+
+    Modes:
+      "sentence" -- every window is encoded as its own sentence (exact, default).
+      "token"    -- for answers >= TOKEN_MODE_MIN_WORDS words, run the encoder once
+                    over the whole answer (in max_seq_length chunks) and mean-pool
+                    each window from the contextual token embeddings. Much less
+                    encoder work for long answers; window scores are close to but
+                    not identical with the sentence mode.
+    """
+
+    def __init__(self, model, mode="sentence"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown window mode {mode!r} (expected one of {', '.join(MODES)})")
+        self.model = model
+        self.mode = mode
+        self._windows = OrderedDict()  # student_text -> (windows, window_embs, full_emb)
+        self._texts = OrderedDict()    # text -> embedding
+        self._lock = threading.Lock()  # the scorer (and these caches) is shared by job threads
+
+    def _lookup(self, cache, key):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _remember(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > CACHE_MAX_ENTRIES:
+                cache.popitem(last=False)
+
+    def encode_text(self, text):
+        """Cached single-text embedding (tensor)."""
+        emb = self._lookup(self._texts, text)
+        if emb is None:
+            emb = self.model.encode(text, convert_to_tensor=True)
+            self._remember(self._texts, text, emb)
+        return emb
+
+    def embed(self, student_text):
+        """
+        Returns (windows, window_embeddings, full_text_embedding) for a student
+        segment. Embeddings are tensors, as expected by util.semantic_search.
+        """
+        cached = self._lookup(self._windows, student_text)
+        if cached is not None:
+            return cached
+        # The computed value itself: the cache may already have evicted it
+        return self._compute([student_text])[student_text]
+
+    def prefetch(self, student_texts):
+        """Window and encode several student segments in as few encoder calls as possible."""
+        with self._lock:
+            pending = [t for t in dict.fromkeys(student_texts) if t not in self._windows]
+        self._compute(pending)
+
+    def _compute(self, texts):
+        """Windows and embeddings of `texts` ({text: entry}), cached as they are computed."""
+        entries = {}
+        batch_texts = []
+        batch_owner = []
+        for text in texts:
+            words = text.split()
+            if self.mode == "token" and len(words) >= TOKEN_MODE_MIN_WORDS and self._supports_token_mode():
+                entries[text] = self._embed_token_mode(text, words)
+                self._remember(self._windows, text, entries[text])
+                continue
+            windows = build_windows(text, words)
+            batch_texts.extend(windows)
+            batch_owner.append((text, windows))
+
+        if not batch_owner:
+            return entries
+
+        # Full texts ride along in the same batch; short answers have a single
+        # window equal to the full text, so that embedding is simply reused.
+        extra = [text for text, windows in batch_owner if windows != [text]]
+        embs = self.model.encode(batch_texts + extra, convert_to_tensor=True)
+
+        pos = 0
+        extra_pos = len(batch_texts)
+        for text, windows in batch_owner:
+            window_embs = embs[pos:pos + len(windows)]
+            pos += len(windows)
+            if windows == [text]:
+                full_emb = window_embs[0]
+            else:
+                full_emb = embs[extra_pos]
+                extra_pos += 1
+            entries[text] = (windows, window_embs, full_emb)
+            self._remember(self._windows, text, entries[text])
+        return entries
+
+    def _supports_token_mode(self):
+        return hasattr(self.model, "tokenizer") and hasattr(self.model, "max_seq_length") and callable(self.model)
+
+    def _embed_token_mode(self, text, words):
+        """One encoder pass over the whole answer; windows are pooled from its token embeddings."""
+        import torch
+
+        tokenizer = self.model.tokenizer
+        word_ids = tokenizer(words, add_special_tokens=False)["input_ids"]
+        # Token index range of every word in the flattened token stream
+        flat_ids = []
+        word_spans = []
+        for ids in word_ids:
+            word_spans.append((len(flat_ids), len(flat_ids) + len(ids)))
+            flat_ids.extend(ids)
+
+        chunk_len = self.model.max_seq_length - 2  # room for [CLS] / [SEP]
+        chunks = [flat_ids[i:i + chunk_len] for i in range(0, len(flat_ids), chunk_len)] or [[]]
+        longest = max(len(c) for c in chunks) + 2
+        input_ids = torch.full((len(chunks), longest), tokenizer.pad_token_id, dtype=torch.long)
+        attention = torch.zeros((len(chunks), longest), dtype=torch.long)
+        for row, chunk in enumerate(chunks):
+            seq = [tokenizer.cls_token_id] + chunk + [tokenizer.sep_token_id]
+            input_ids[row, :len(seq)] = torch.tensor(seq, dtype=torch.long)
+            attention[row, :len(seq)] = 1
+
+        features = {
+            "input_ids": input_ids.to(self.model.device),
+            "attention_mask": attention.to(self.model.device),
+            "token_type_ids": torch.zeros_like(input_ids).to(self.model.device),
+        }
+        with torch.no_grad():
+            out = self.model(features)
+
+        # The first chunk is exactly the (truncated) sequence a plain encode()
+        # would see, so its pooled embedding is the usual full-text embedding.
+        full_emb = out["sentence_embedding"][0]
+
+        # Flatten the token embeddings of all chunks (dropping [CLS]/[SEP]/padding)
+        token_embs = torch.cat([
+            out["token_embeddings"][row, 1:1 + len(chunk)] for row, chunk in enumerate(chunks)
+        ])
+
+        windows = []
+        pooled = []
+        for start, end in _window_spans(len(words)):
+            tok_start, tok_end = word_spans[start][0], word_spans[end - 1][1]
+            if tok_end <= tok_start:
+                continue
+            windows.append(" ".join(words[start:end]))
+            pooled.append(token_embs[tok_start:tok_end].mean(dim=0))
+
+        if not pooled:
+            return [text], full_emb.unsqueeze(0), full_emb
+        window_embs = torch.nn.functional.normalize(torch.stack(pooled), dim=1)
+        return windows, window_embs, full_emb